@@ -0,0 +1,279 @@
+import io
+import mmap
+import os
+import struct
+import wave
+
+from metrics import stage_metrics
+
+
+class PCMAudio:
+    """Uncompressed audio held in memory"""
+
+    def __init__(self, data, sample_rate, channels=1, sample_width=2):
+        self.data = data
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.sample_width = sample_width
+
+    @property
+    def params(self):
+        return (self.channels, self.sample_width, self.sample_rate)
+
+    @property
+    def frame_count(self):
+        return len(self.data) // (self.channels * self.sample_width)
+
+    @property
+    def duration(self):
+        return self.frame_count / self.sample_rate if self.sample_rate else 0.0
+
+    @classmethod
+    def from_wav_bytes(cls, data):
+        with wave.open(io.BytesIO(data), 'rb') as src:
+            return cls(src.readframes(src.getnframes()), src.getframerate(),
+                       src.getnchannels(), src.getsampwidth())
+
+    def write_wav(self, fp):
+        """Write as WAV to a path or binary file object"""
+        with wave.open(fp, 'wb') as out:
+            out.setnchannels(self.channels)
+            out.setsampwidth(self.sample_width)
+            out.setframerate(self.sample_rate)
+            out.writeframes(self.data)
+
+    def to_wav_bytes(self):
+        buffer = io.BytesIO()
+        self.write_wav(buffer)
+        return buffer.getvalue()
+
+
+def sniff_format(data):
+    """Container format of an encoded artifact: 'wav' or 'mp3'"""
+    return 'wav' if data[:4] == b'RIFF' and data[8:12] == b'WAVE' else 'mp3'
+
+
+def decode_artifact(data):
+    """Decode one encoded artifact (WAV or MP3 bytes) to PCM"""
+    with stage_metrics.stage('decode', len(data)) as stage:
+        fmt = sniff_format(data)
+        if fmt == 'wav':
+            pcm = PCMAudio.from_wav_bytes(data)
+        else:
+            from pydub import AudioSegment
+
+            segment = AudioSegment.from_file(io.BytesIO(data), format=fmt)
+            pcm = PCMAudio(segment.raw_data, segment.frame_rate, segment.channels, segment.sample_width)
+        stage.bytes_out = len(pcm.data)
+    return pcm
+
+
+def join_encoded(parts):
+    """Join encoded pieces of one utterance into a single artifact.
+
+    MP3 frames concatenate as they are; WAV pieces are merged into one WAV.
+    """
+    if len(parts) == 1:
+        return parts[0]
+    if all(sniff_format(part) == 'wav' for part in parts):
+        return concatenate([PCMAudio.from_wav_bytes(part) for part in parts]).to_wav_bytes()
+    return b''.join(parts)
+
+
+def concatenate(pcms):
+    """Join PCM buffers with identical formats into one PCMAudio"""
+    if not pcms:
+        raise Exception("No audio to concatenate")
+    params = pcms[0].params
+    for pcm in pcms:
+        if pcm.params != params:
+            raise Exception(f"Chunk audio format mismatch: {pcm.params} != {params}")
+    first = pcms[0]
+    return PCMAudio(b''.join(pcm.data for pcm in pcms), first.sample_rate, first.channels, first.sample_width)
+
+
+class ArtifactDecoder:
+    """Decodes ordered artifacts as they arrive, handing PCM to on_pcm.
+
+    Consecutive MP3 artifacts are joined before decoding (MP3 frames
+    concatenate cleanly), up to run_bytes per decoder run, so a gTTS
+    document costs a few decoder runs instead of one per chunk without the
+    whole document's MP3 being held at once. Call flush() after the last.
+    """
+
+    def __init__(self, on_pcm, run_bytes=1 << 20):
+        self.on_pcm = on_pcm
+        self.run_bytes = run_bytes
+        self._mp3_run = []
+        self._mp3_bytes = 0
+
+    def feed(self, data):
+        if sniff_format(data) == 'mp3':
+            self._mp3_run.append(data)
+            self._mp3_bytes += len(data)
+            if self._mp3_bytes >= self.run_bytes:
+                self.flush()
+            return
+        self.flush()
+        self.on_pcm(decode_artifact(data))
+
+    def flush(self):
+        if self._mp3_run:
+            data = b''.join(self._mp3_run)
+            self._mp3_run = []
+            self._mp3_bytes = 0
+            self.on_pcm(decode_artifact(data))
+
+
+def decode_artifacts(artifacts):
+    """Decode ordered artifacts into one PCMAudio"""
+    pcms = []
+    decoder = ArtifactDecoder(pcms.append)
+    for data in artifacts:
+        decoder.feed(data)
+    decoder.flush()
+    return concatenate(pcms)
+
+
+def wav_layout(buffer):
+    """((channels, sample_width, sample_rate), data offset, data size) of a
+    WAV held in a bytes-like buffer, found by walking its RIFF chunks"""
+    if len(buffer) < 12 or bytes(buffer[:4]) != b'RIFF' or bytes(buffer[8:12]) != b'WAVE':
+        raise Exception("Not a WAV file")
+    params = None
+    position = 12
+    while position + 8 <= len(buffer):
+        chunk_id = bytes(buffer[position:position + 4])
+        size = struct.unpack_from('<I', buffer, position + 4)[0]
+        body = position + 8
+        if chunk_id == b'fmt ':
+            channels, sample_rate = struct.unpack_from('<HI', buffer, body + 2)
+            bits = struct.unpack_from('<H', buffer, body + 14)[0]
+            params = (channels, bits // 8, sample_rate)
+        elif chunk_id == b'data':
+            if params is None:
+                raise Exception("WAV data before its format")
+            # An unfinished writer may leave the size at 0 or too large
+            return params, body, min(size, len(buffer) - body) or len(buffer) - body
+        position = body + size + (size & 1)
+    raise Exception("WAV file has no data")
+
+
+class MappedAudio(PCMAudio):
+    """PCMAudio over a memory-mapped WAV file.
+
+    data is a read-only memoryview into the mapping, so playback and export
+    read the file through the page cache and the document never has to fit
+    in memory. close() releases the mapping once no views are left.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        params, offset, size = wav_layout(self._map)
+        channels, sample_width, sample_rate = params
+        frame_bytes = channels * sample_width
+        super().__init__(memoryview(self._map)[offset:offset + size - size % frame_bytes],
+                         sample_rate, channels, sample_width)
+
+    def close(self):
+        try:
+            self.data.release()
+            self._map.close()
+        except BufferError:
+            # Views handed out are still alive; the mapping goes with them
+            pass
+
+
+class WavAssembler:
+    """Writes chunk PCM into one memory-mapped WAV file.
+
+    The file is preallocated (reserve_bytes, grown by doubling when a chunk
+    does not fit) and each chunk is copied straight into the mapping, so
+    assembling a document is linear in its length and never holds more than
+    the chunk being appended. finish() writes the header and trims the file.
+    """
+
+    HEADER_BYTES = 44
+    # Written pages are flushed and dropped from the mapping every so often,
+    # so they do not stay in the process's resident set
+    RELEASE_BYTES = 16 << 20
+
+    def __init__(self, path, reserve_bytes=1 << 20):
+        self.path = path
+        self.params = None
+        self._file = open(path, 'w+b')
+        self._capacity = 0
+        self._map = None
+        self._end = self.HEADER_BYTES
+        self._released = 0
+        self._grow(self.HEADER_BYTES + max(0, reserve_bytes))
+
+    def _grow(self, size):
+        if size <= self._capacity:
+            return
+        size = max(size, 2 * self._capacity)
+        # Remapped rather than resized: Windows cannot extend a mapped file
+        if self._map is not None:
+            self._map.close()
+        self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), size)
+        self._capacity = size
+
+    def append(self, pcm):
+        if self.params is None:
+            self.params = pcm.params
+        elif pcm.params != self.params:
+            raise Exception(f"Chunk audio format mismatch: {pcm.params} != {self.params}")
+        data = memoryview(pcm.data).cast('B')
+        with stage_metrics.stage('write', len(data)):
+            self._grow(self._end + len(data))
+            self._map[self._end:self._end + len(data)] = data
+            self._end += len(data)
+            if self._end - self._released >= self.RELEASE_BYTES:
+                self._release()
+
+    def _release(self):
+        end = self._end - self._end % mmap.ALLOCATIONGRANULARITY
+        self._map.flush(self._released, end - self._released)
+        if hasattr(mmap, 'MADV_DONTNEED'):
+            self._map.madvise(mmap.MADV_DONTNEED, self._released, end - self._released)
+        self._released = end
+
+    @property
+    def frame_count(self):
+        if self.params is None:
+            return 0
+        channels, sample_width, _ = self.params
+        return (self._end - self.HEADER_BYTES) // (channels * sample_width)
+
+    def finish(self):
+        """Write the header, trim the file and return its path"""
+        if self.params is None:
+            self.close()
+            raise Exception("No audio to concatenate")
+        channels, sample_width, sample_rate = self.params
+        size = self._end - self.HEADER_BYTES
+        self._map[:self.HEADER_BYTES] = struct.pack(
+            '<4sI4s4sIHHIIHH4sI', b'RIFF', 36 + size, b'WAVE', b'fmt ', 16, 1, channels, sample_rate,
+            sample_rate * channels * sample_width, channels * sample_width, 8 * sample_width, b'data', size,
+        )
+        with stage_metrics.stage('write'):
+            self._map.flush()
+            self._map.close()
+            self._map = None
+            self._file.truncate(self._end)
+            self._file.close()
+        return self.path
+
+    def close(self):
+        """Abandon the file"""
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
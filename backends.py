@@ -0,0 +1,260 @@
+import array
+import hashlib
+import math
+import os
+import tempfile
+import threading
+
+from audio import PCMAudio
+from synthesis import SUPPORTED_LANGUAGES
+
+
+class TTSBackend:
+    """Base class for speech engines.
+
+    Backends declare what they can do through class attributes so callers can
+    route work without knowing the engine:
+
+    languages          language codes served; empty means any language
+    supports_rate      honours the speech rate (words per minute)
+    supports_voices    honours a voice id
+    supports_streaming can render a document chunk by chunk for streaming
+    thread_safe        chunks may be rendered concurrently; otherwise all
+                       calls must come from one thread (see lane)
+    """
+
+    name = None
+    languages = ()
+    supports_rate = False
+    supports_voices = False
+    supports_streaming = True
+    thread_safe = False
+
+    def supports_language(self, lang_code):
+        return not self.languages or lang_code in self.languages
+
+    @property
+    def lane(self):
+        """JobManager lane for engines that must stay on one thread"""
+        return None if self.thread_safe else self.name
+
+    def max_workers(self, requested):
+        return requested if self.thread_safe else 1
+
+    def configure(self, voice_id=None, rate=None):
+        """Bind engine settings ahead of rendering; stateless engines ignore it"""
+
+    def render(self, text, lang_code, voice_id=None, rate=None):
+        """Render text and return encoded audio bytes (WAV, or MP3 as served)"""
+        raise NotImplementedError
+
+    def chunk_synthesizer(self, lang_code, voice_id=None, rate=None):
+        """Return a text -> encoded bytes callable for the chunking pipeline"""
+        def synthesize_chunk(text):
+            return self.render(text, lang_code, voice_id, rate)
+        return synthesize_chunk
+
+    def capabilities(self):
+        return {
+            'name': self.name,
+            'languages': list(self.languages),
+            'rate': self.supports_rate,
+            'voices': self.supports_voices,
+            'streaming': self.supports_streaming,
+            'thread_safe': self.thread_safe,
+        }
+
+
+class Pyttsx3Backend(TTSBackend):
+    """Offline system voices (SAPI5, NSSpeechSynthesizer, eSpeak) via pyttsx3.
+
+    One engine can only be driven from one thread. Given a pool (an
+    EnginePool), renders go to its worker processes instead, which makes the
+    instance safe to call concurrently. The registered instance renders
+    in-process; each VoicifyCore creates a pooled one of its own.
+    """
+
+    name = 'pyttsx3'
+    languages = ('en',)
+    supports_rate = True
+    supports_voices = True
+    thread_safe = False
+
+    def __init__(self, pool=None):
+        self._engine = None
+        self._config = None
+        self.pool = pool
+        self.thread_safe = pool is not None
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            import pyttsx3
+            self._engine = pyttsx3.init()
+        return self._engine
+
+    def voices(self):
+        """Installed system voices; starts the engine on first use"""
+        return list(self.engine.getProperty('voices') or [])
+
+    def configure(self, voice_id=None, rate=None):
+        engine = self.engine
+        # Setting properties is not free, so only changes are applied
+        if self._config == (voice_id, rate):
+            return engine
+        if voice_id is not None:
+            engine.setProperty('voice', voice_id)
+        if rate is not None:
+            engine.setProperty('rate', rate)
+        self._config = (voice_id, rate)
+        return engine
+
+    def render(self, text, lang_code, voice_id=None, rate=None):
+        if self.pool is not None:
+            return self.pool.render(text, lang_code, voice_id, rate)
+        engine = self.configure(voice_id, rate)
+        # The engine can only write files, so round-trip through one
+        fd, output_wav = tempfile.mkstemp(suffix='.wav', prefix='tts_')
+        os.close(fd)
+        try:
+            engine.save_to_file(text, output_wav)
+            engine.runAndWait()
+            with open(output_wav, 'rb') as file:
+                data = file.read()
+        finally:
+            os.remove(output_wav)
+        if not data:
+            raise Exception("Failed to generate audio file")
+        return data
+
+
+class GTTSBackend(TTSBackend):
+    """Google Translate text-to-speech; needs network access.
+
+    Requests go through one shared GTTSClient per process, so concurrent
+    chunks reuse keep-alive connections and share its retry and rate-limit
+    state. Returns the MP3 exactly as served: it is what gets cached, and
+    decoding is left to the caller so a document is decoded once, not per
+    chunk.
+    """
+
+    name = 'gtts'
+    languages = tuple(SUPPORTED_LANGUAGES.values())
+    thread_safe = True
+
+    def __init__(self):
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                from gtts_client import GTTSClient
+                self._client = GTTSClient()
+            return self._client
+
+    def render(self, text, lang_code, voice_id=None, rate=None):
+        try:
+            data = self.client.synthesize(text, lang_code)
+        except Exception as e:
+            raise Exception(f"gTTS error: {str(e)}")
+        if not data:
+            raise Exception("gTTS error: empty response")
+        return data
+
+
+class StubBackend(TTSBackend):
+    """Deterministic offline backend for tests and throughput benchmarks.
+
+    Each character becomes a short sine tone whose pitch depends on the
+    character, so the same text always yields byte-identical PCM and output
+    length scales with text length and rate. No network, no system voices.
+    """
+
+    name = 'stub'
+    supports_rate = True
+    supports_voices = True
+    thread_safe = True
+
+    sample_rate = 16000
+    base_rate = 150
+    char_seconds = 0.03
+
+    def __init__(self):
+        self._tones = {}
+        self._lock = threading.Lock()
+
+    def _tone(self, frequency, samples):
+        key = (frequency, samples)
+        with self._lock:
+            tone = self._tones.get(key)
+            if tone is None:
+                step = 2 * math.pi * frequency / self.sample_rate
+                tone = array.array('h', (int(8000 * math.sin(step * i)) for i in range(samples))).tobytes()
+                self._tones[key] = tone
+        return tone
+
+    def render_pcm(self, text, lang_code="en", voice_id=None, rate=None):
+        """Return 16-bit mono PCM for text"""
+        rate = rate or self.base_rate
+        samples = max(1, int(self.sample_rate * self.char_seconds * self.base_rate / rate))
+        # Voice and language shift the pitch so different settings differ
+        seed = hashlib.sha256(f"{lang_code}|{voice_id}".encode('utf-8')).digest()[0]
+        return b''.join(
+            self._tone(120 + ((ord(char) + seed) % 48) * 10 if not char.isspace() else 0, samples)
+            for char in text
+        )
+
+    def render(self, text, lang_code, voice_id=None, rate=None):
+        return PCMAudio(self.render_pcm(text, lang_code, voice_id, rate), self.sample_rate).to_wav_bytes()
+
+
+_backends = {}
+
+
+def register_backend(backend):
+    _backends[backend.name] = backend
+    return backend
+
+
+def get_backend(name):
+    try:
+        return _backends[name]
+    except KeyError:
+        raise Exception(f"Unknown TTS backend: {name}")
+
+
+def available_backends():
+    return dict(_backends)
+
+
+def backend_for_language(lang_code, preferred=None, system_languages=()):
+    """Pick a backend for lang_code.
+
+    preferred (or the VOICIFY_BACKEND environment variable) wins when it
+    serves the language; otherwise offline pyttsx3 handles English, and the
+    languages in system_languages, and gTTS everything else.
+    """
+    def serves(backend):
+        return backend.supports_language(lang_code) or (backend.name == 'pyttsx3' and lang_code in system_languages)
+
+    preferred = preferred or os.environ.get('VOICIFY_BACKEND')
+    if preferred:
+        backend = get_backend(preferred)
+        if not serves(backend):
+            raise Exception(f"Backend {preferred} does not support language {lang_code}")
+        return backend
+    for name in ('pyttsx3', 'gtts'):
+        backend = _backends.get(name)
+        if backend is not None and serves(backend):
+            return backend
+    for backend in _backends.values():
+        if serves(backend):
+            return backend
+    raise Exception(f"No TTS backend available for language {lang_code}")
+
+
+register_backend(Pyttsx3Backend())
+register_backend(GTTSBackend())
+register_backend(StubBackend())
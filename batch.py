@@ -0,0 +1,277 @@
+"""Headless batch conversion of text and PDF files.
+
+    python batch.py INPUT OUTPUT_DIR [--language es] [--workers 4]
+
+INPUT is a directory (every .txt and .pdf in it is converted) or a manifest
+file listing one input path per line. Outputs that are newer than their input
+and were made with the same settings (recorded next to each output in a
+.voicify.json file) are skipped unless --force is given, and a JSON summary
+with per-file timings is written to OUTPUT_DIR/summary.json (or --summary).
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from audio import MappedAudio
+from backends import available_backends, backend_for_language
+from cache import AudioCache
+from export import EXPORT_PROFILES, export_audio
+from jobs import Job
+from metrics import FIELDS, stage_metrics
+from ocr import tesseract_language
+from dsp import POST_STEPS, plan_post, post_steps
+from normalize import PageNormalizer
+from pdf_extract import PageCache, iter_pdf_pages
+from synthesis import SUPPORTED_LANGUAGES, synthesize_pages
+from workspace import scratch_path
+
+INPUT_EXTENSIONS = ('.txt', '.pdf')
+# Next to each output: the settings it was converted with
+SETTINGS_SUFFIX = '.voicify.json'
+
+
+def collect_inputs(source):
+    """Return input paths from a directory or a manifest file"""
+    if os.path.isdir(source):
+        return sorted(
+            os.path.join(source, name) for name in os.listdir(source)
+            if name.lower().endswith(INPUT_EXTENSIONS)
+        )
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source, encoding='utf-8') as manifest:
+        lines = [line.strip() for line in manifest]
+    return [
+        line if os.path.isabs(line) else os.path.join(base, line)
+        for line in lines if line and not line.startswith('#')
+    ]
+
+
+def output_path_for(input_path, output_dir, extension='.wav'):
+    stem = os.path.splitext(os.path.basename(input_path))[0]
+    return os.path.join(output_dir, f"{stem}{extension}")
+
+
+def settings_key(**settings):
+    """Identity of the conversion settings that shape an output"""
+    payload = json.dumps(settings, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def read_settings_key(output_path):
+    try:
+        with open(output_path + SETTINGS_SUFFIX, encoding='utf-8') as file:
+            return json.load(file).get('settings')
+    except (OSError, ValueError):
+        return None
+
+
+def write_settings_key(output_path, key):
+    with open(output_path + SETTINGS_SUFFIX, 'w', encoding='utf-8') as file:
+        json.dump({'settings': key}, file)
+
+
+def is_up_to_date(input_path, output_path, key=None):
+    """Whether output_path is newer than its input and, given a settings
+    key, was converted with those settings"""
+    return (os.path.exists(output_path)
+            and os.path.getmtime(output_path) >= os.path.getmtime(input_path)
+            and (key is None or read_settings_key(output_path) == key))
+
+
+def read_pages(input_path, page_cache=None, pdf_workers=1, ocr_lang=None):
+    """Yield (index, text) pages; a text file is a single page"""
+    if input_path.lower().endswith('.pdf'):
+        yield from iter_pdf_pages(input_path, page_cache, pdf_workers, ocr_lang=ocr_lang)
+        return
+    with open(input_path, encoding='utf-8') as file:
+        yield 0, file.read()
+
+
+def convert_file(input_path, output_path, lang_code="en", voice_id=None, rate=150,
+                 cache_dir=None, chunk_workers=4, backend_name=None, profile='wav', pdf_workers=1,
+                 ocr=False, normalize=True, post=(), settings=None):
+    """Convert one text or PDF file to audio and return its timing record.
+
+    Synthesis starts on the first page while later PDF pages are still being
+    extracted, so extract_seconds overlaps synthesize_seconds. Unless
+    normalize is off, headers, page numbers and other boilerplate are
+    removed first; the record's 'normalization' says how much. 'stages'
+    has the per-stage counters of metrics.StageMetrics for this file.
+    post names optional dsp.POST_STEPS to apply. settings, a settings_key(),
+    is recorded next to the output once it is written.
+    """
+    record = {'input': input_path, 'output': output_path}
+    started = time.perf_counter()
+    # Worker processes convert several files; only this one's share counts
+    before = stage_metrics.snapshot()
+    try:
+        # Each worker process holds its own backend instances (and engines)
+        backend = backend_for_language(lang_code, backend_name)
+        record['backend'] = backend.name
+        if not backend.supports_voices:
+            voice_id = None
+        # Without a rate of its own, the backend's speech is time-stretched
+        post = plan_post(None if backend.supports_rate else rate, post)
+        if not backend.supports_rate:
+            rate = None
+
+        cache = AudioCache(cache_dir) if cache_dir else None
+        page_cache = PageCache(os.path.join(cache_dir, 'pages')) if cache_dir else None
+        ocr_lang = tesseract_language(lang_code) if ocr else None
+        record['characters'] = 0
+
+        def counted(pages):
+            for index, text in pages:
+                record['characters'] += len(text)
+                yield index, text
+
+        # Extraction runs as pages are pulled; this counts the wait for each
+        pages = counted(stage_metrics.timed('extract', read_pages(input_path, page_cache, pdf_workers, ocr_lang),
+                                            size=lambda page: len(page[1].encode('utf-8'))))
+        normalizer = None
+        if normalize:
+            normalizer = PageNormalizer(lang_code)
+            pages = normalizer.normalize(pages)
+        synth_started = time.perf_counter()
+        # Assembled on disk as chunks finish, so a long book never sits in memory
+        assembled = synthesize_pages(Job(0), pages, backend, lang_code, voice_id, rate, cache, chunk_workers,
+                                     post=post, output=scratch_path(output_path) + '.pcm.wav')
+        record['synthesize_seconds'] = time.perf_counter() - synth_started
+        record['extract_seconds'] = stage_metrics.since(before)['extract']['seconds']
+        if normalizer is not None:
+            record['normalization'] = normalizer.stats()
+
+        try:
+            write_started = time.perf_counter()
+            export_audio(assembled, output_path, profile)
+            record['write_seconds'] = time.perf_counter() - write_started
+            audio = MappedAudio(assembled)
+            record['audio_seconds'] = audio.duration
+            audio.close()
+        finally:
+            os.remove(assembled)
+        if settings is not None:
+            write_settings_key(output_path, settings)
+        record['status'] = 'converted'
+    except Exception as e:
+        record['status'] = 'failed'
+        record['error'] = str(e)
+    record['seconds'] = time.perf_counter() - started
+    record['stages'] = {name: counters for name, counters in stage_metrics.since(before).items() if counters['calls']}
+    return record
+
+
+def run_batch(inputs, output_dir, lang_code="en", voice_id=None, rate=150, workers=None,
+              force=False, cache_dir=None, chunk_workers=4, backend_name=None, profile='wav',
+              pdf_workers=1, ocr=False, normalize=True, post=()):
+    """Convert inputs on a process pool and return the summary dict"""
+    os.makedirs(output_dir, exist_ok=True)
+    started = time.perf_counter()
+    # A change to any of these makes existing outputs stale
+    settings = settings_key(
+        language=lang_code, backend=backend_for_language(lang_code, backend_name).name, voice_id=voice_id,
+        rate=rate, profile=profile, ocr=ocr, normalize=normalize, post=list(post),
+    )
+    records = []
+    pending = []
+    for input_path in inputs:
+        output_path = output_path_for(input_path, output_dir, EXPORT_PROFILES[profile].extension)
+        if not os.path.exists(input_path):
+            records.append({'input': input_path, 'output': output_path,
+                            'status': 'failed', 'error': 'Input not found', 'seconds': 0.0})
+        elif not force and is_up_to_date(input_path, output_path, settings):
+            records.append({'input': input_path, 'output': output_path,
+                            'status': 'skipped', 'seconds': 0.0})
+        else:
+            pending.append((input_path, output_path))
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(convert_file, input_path, output_path, lang_code, voice_id,
+                                rate, cache_dir, chunk_workers, backend_name, profile, pdf_workers,
+                                ocr, normalize, post, settings)
+                for input_path, output_path in pending
+            ]
+            for future in as_completed(futures):
+                records.append(future.result())
+
+    records.sort(key=lambda record: record['input'])
+    counts = {}
+    stages = {}
+    for record in records:
+        counts[record['status']] = counts.get(record['status'], 0) + 1
+        for name, counters in record.get('stages', {}).items():
+            totals = stages.setdefault(name, dict.fromkeys(FIELDS, 0))
+            for field in FIELDS:
+                totals[field] += counters[field]
+    return {
+        'language': lang_code,
+        'total_seconds': time.perf_counter() - started,
+        'counts': counts,
+        'stages': stages,
+        'files': records,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert text and PDF files to speech without a GUI.")
+    parser.add_argument('input', help="directory of .txt/.pdf files, or a manifest with one path per line")
+    parser.add_argument('output_dir', help="directory for the generated audio files")
+    parser.add_argument('--language', default='en',
+                        help="language code or name, e.g. en, es, 'Spanish' (default: en)")
+    parser.add_argument('--backend', default=None, choices=sorted(available_backends()),
+                        help="TTS backend (default: pyttsx3 for English, gtts otherwise)")
+    parser.add_argument('--format', default='wav', choices=sorted(EXPORT_PROFILES),
+                        help="output format profile (default: wav)")
+    parser.add_argument('--voice-id', default=None, help="pyttsx3 voice id for English")
+    parser.add_argument('--rate', type=int, default=150, help="speech rate in words per minute (default: 150); needs NumPy for gTTS languages")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument('--chunk-workers', type=int, default=4, help="concurrent gTTS requests per file")
+    parser.add_argument('--pdf-workers', type=int, default=1,
+                        help="processes extracting pages of each PDF (default: 1, inline)")
+    parser.add_argument('--ocr', action='store_true',
+                        help="OCR PDF pages that have no text layer (needs Tesseract)")
+    parser.add_argument('--raw', action='store_true',
+                        help="synthesize text as extracted, without removing headers, page numbers etc.")
+    parser.add_argument('--postprocess', default=None,
+                        help=f"comma-separated extra post-processing steps: {', '.join(POST_STEPS)} "
+                             "(default: VOICIFY_POSTPROCESS, else none; needs NumPy)")
+    parser.add_argument('--cache-dir', default=None, help="shared audio cache directory")
+    parser.add_argument('--summary', default=None, help="summary JSON path (default: OUTPUT_DIR/summary.json)")
+    parser.add_argument('--force', action='store_true', help="convert even if the output is up to date")
+    args = parser.parse_args(argv)
+
+    lang_code = SUPPORTED_LANGUAGES.get(args.language, args.language)
+    if lang_code not in SUPPORTED_LANGUAGES.values():
+        parser.error(f"unsupported language: {args.language}")
+
+    try:
+        post = post_steps(args.postprocess)
+    except Exception as e:
+        parser.error(str(e))
+
+    inputs = collect_inputs(args.input)
+    summary = run_batch(inputs, args.output_dir, lang_code, args.voice_id, args.rate,
+                        args.workers, args.force, args.cache_dir, args.chunk_workers, args.backend, args.format,
+                        args.pdf_workers, args.ocr, not args.raw, post)
+
+    summary_path = args.summary or os.path.join(args.output_dir, 'summary.json')
+    with open(summary_path, 'w', encoding='utf-8') as file:
+        json.dump(summary, file, indent=2)
+
+    for record in summary['files']:
+        line = f"{record['status']:>9}  {record['seconds']:7.2f}s  {record['input']}"
+        if 'error' in record:
+            line += f"  ({record['error']})"
+        print(line)
+    print(f"Summary written to {summary_path}")
+    return 1 if summary['counts'].get('failed') else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""Throughput of the NumPy post-processing stage, in samples per second.
+
+    python benchmarks/dsp.py [--seconds 60] [--chunk-seconds 4] [--repeat 5] [--output dsp.json]
+
+The input is stub-backend speech cut into chunks the size the synthesis
+pipeline produces, at the stub's 16 kHz. Every stage of dsp.py is timed on
+its own (silence trimming, batch loudness, WSOLA time-stretch at a few
+speeds) and as the whole PostProcessor. Throughput is input samples per
+second of wall time; 'realtime' is how many seconds of audio one second of
+processing handles.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio import PCMAudio  # noqa: E402
+from backends import get_backend  # noqa: E402
+import dsp  # noqa: E402
+
+SENTENCE = "The quick brown fox jumps over the lazy dog while the cat watches. "
+
+
+def make_chunks(seconds, chunk_seconds):
+    backend = get_backend('stub')
+    chunk_chars = max(1, int(chunk_seconds / backend.char_seconds))
+    text = SENTENCE * (1 + int(chunk_chars / len(SENTENCE)))
+    pcm = backend.render_pcm(text[:chunk_chars])
+    count = max(1, int(seconds / chunk_seconds))
+    return [PCMAudio(pcm, backend.sample_rate) for _ in range(count)]
+
+
+def measure(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return statistics.median(times)
+
+
+def run(seconds, chunk_seconds, repeat):
+    pcms = make_chunks(seconds, chunk_seconds)
+    sample_rate = pcms[0].sample_rate
+    samples = sum(pcm.frame_count for pcm in pcms)
+    arrays = [dsp.to_array(pcm) for pcm in pcms]
+
+    stages = {
+        'decode_encode': lambda: [dsp.from_array(dsp.to_array(pcm), pcm) for pcm in pcms],
+        'trim_silence': lambda: [dsp.trim_silence(array, sample_rate) for array in arrays],
+        'loudness_batch': lambda: dsp.loudness_gains(arrays, sample_rate),
+    }
+    for speed in (0.75, 1.25, 1.5):
+        stages[f'time_stretch_{speed}'] = lambda speed=speed: [
+            dsp.time_stretch(array, sample_rate, speed) for array in arrays
+        ]
+    stages['post_processor'] = lambda: dsp.PostProcessor(speed=1.25, loudness_dbfs=-20.0, trim=True).process_batch(pcms)
+
+    results = {}
+    for name, fn in stages.items():
+        elapsed = measure(fn, repeat)
+        results[name] = {
+            'seconds': round(elapsed, 4),
+            'samples_per_second': round(samples / elapsed),
+            'realtime': round(samples / sample_rate / elapsed, 1),
+        }
+    return {
+        'audio_seconds': samples / sample_rate,
+        'chunks': len(pcms),
+        'sample_rate': sample_rate,
+        'repeat': repeat,
+        'stages': results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure post-processing throughput in samples per second.")
+    parser.add_argument('--seconds', type=float, default=60.0, help="seconds of audio to process (default: 60)")
+    parser.add_argument('--chunk-seconds', type=float, default=4.0, help="length of each chunk (default: 4)")
+    parser.add_argument('--repeat', type=int, default=5, help="runs per stage; the median is reported (default: 5)")
+    parser.add_argument('--output', default=None, help="write results JSON here")
+    args = parser.parse_args(argv)
+
+    if not dsp.numpy_available():
+        print("NumPy is not installed; post-processing is disabled")
+        return 1
+    results = run(args.seconds, args.chunk_seconds, args.repeat)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+    for name, result in results['stages'].items():
+        print(f"{name:>18}  {result['samples_per_second'] / 1e6:8.2f} M samples/s  {result['realtime']:8.1f}x realtime")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
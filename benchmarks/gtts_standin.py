@@ -0,0 +1,141 @@
+"""Local stand-in for the Google Translate speech endpoint.
+
+    python benchmarks/gtts_standin.py serve [--port 8765] [--latency 0.05] [--throttle 0.1]
+    python benchmarks/gtts_standin.py bench [--chunks 40] [--throttle 0.1] [--errors 0.05]
+
+`serve` answers batchexecute requests the way the real endpoint does, with
+stub-backend WAV audio instead of MP3. Point the app at it with
+VOICIFY_GTTS_URL=http://127.0.0.1:8765. It can add latency, throttle a
+fraction of requests with 429 + Retry-After, and fail a fraction with 503.
+
+`bench` starts the stand-in in-process and converts a document through the
+gTTS backend. It prints wall time, the client's request and latency stats,
+and how many connections the server saw.
+"""
+import argparse
+import base64
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backends import get_backend  # noqa: E402
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=0.0, throttle=0.0, errors=0.0, retry_after=0.2):
+        super().__init__(('127.0.0.1', port), StandInHandler)
+        self.latency = latency
+        self.throttle = throttle
+        self.errors = errors
+        self.retry_after = retry_after
+        self.connections = 0
+        self.requests = 0
+        self.counter_lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    # Keep-alive, like the real endpoint
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        with self.server.counter_lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0)).decode('utf-8')
+        with self.server.counter_lock:
+            self.server.requests += 1
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        roll = random.random()
+        if roll < self.server.throttle:
+            return self._reply(429, b'', {'Retry-After': str(self.server.retry_after)})
+        if roll < self.server.throttle + self.server.errors:
+            return self._reply(503, b'')
+        try:
+            rpc = json.loads(urllib.parse.parse_qs(body)['f.req'][0])
+            text, lang_code = json.loads(rpc[0][0][1])[:2]
+        except (KeyError, ValueError, IndexError):
+            return self._reply(400, b'')
+        audio = base64.b64encode(get_backend('stub').render(text, lang_code)).decode('ascii')
+        payload = f')]}}\'\n\n120\n[["wrb.fr","jQ1olc","[\\"{audio}\\"]",null,null,null,"generic"]]\n'
+        self._reply(200, payload.encode('utf-8'), {'Content-Type': 'application/json; charset=utf-8'})
+
+    def _reply(self, status, data, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def bench(args):
+    server = StandInServer(latency=args.latency, throttle=args.throttle, errors=args.errors).start()
+    os.environ['VOICIFY_GTTS_URL'] = server.url
+
+    from jobs import Job
+    from synthesis import synthesize_document
+
+    backend = get_backend('gtts')
+    sentence = "The quick brown fox jumps over the lazy dog while the cat watches. "
+    text = "\n\n".join(sentence * 5 for _ in range(args.chunks))
+    started = time.perf_counter()
+    audio = synthesize_document(Job(0), text, backend, 'en', None, None, None, args.workers)
+    elapsed = time.perf_counter() - started
+    result = {
+        'seconds': round(elapsed, 3),
+        'audio_seconds': round(audio.duration, 2),
+        'client': backend.client.stats(),
+        'server': {'requests': server.requests, 'connections': server.connections},
+    }
+    print(json.dumps(result, indent=2))
+    server.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local stand-in for the gTTS endpoint.")
+    parser.add_argument('mode', choices=['serve', 'bench'])
+    parser.add_argument('--port', type=int, default=8765, help="port for serve mode (default: 8765)")
+    parser.add_argument('--latency', type=float, default=0.05, help="seconds added to every response")
+    parser.add_argument('--throttle', type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument('--errors', type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument('--chunks', type=int, default=20, help="paragraphs in the bench document")
+    parser.add_argument('--workers', type=int, default=4, help="concurrent chunks in bench mode")
+    args = parser.parse_args(argv)
+
+    if args.mode == 'bench':
+        bench(args)
+        return 0
+    server = StandInServer(args.port, args.latency, args.throttle, args.errors)
+    print(f"Serving on {server.url}; set VOICIFY_GTTS_URL={server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,136 @@
+"""Load test for the local HTTP service (service.py).
+
+    python benchmarks/service.py [--clients 16] [--requests 8] [--distinct 4] [--max-concurrent 2]
+    python benchmarks/service.py --url http://127.0.0.1:8765 ...
+
+Without --url a service is started on a free port with the offline stub
+backend and a throwaway cache. Each client sends its requests one after
+another on its own keep-alive connection, cycling through --distinct
+texts, so most requests are duplicates: they should be coalesced with a
+running conversion or served from the cache. Prints requests/s, latency
+percentiles and the service's own /metrics counters.
+"""
+import argparse
+import http.client
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SENTENCE = "The quick brown fox jumps over the lazy dog while the cat watches. "
+
+
+def start_service(max_concurrent, max_queue, cache_dir):
+    env = dict(os.environ, VOICIFY_BACKEND='stub', VOICIFY_ENGINE_PROCESSES='0', VOICIFY_CACHE_DIR=cache_dir)
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, 'service.py'), '--port', '0',
+         '--max-concurrent', str(max_concurrent), '--max-queue', str(max_queue)],
+        stdout=subprocess.PIPE, text=True, env=env,
+    )
+    line = process.stdout.readline()
+    if not line.startswith('Serving on '):
+        process.kill()
+        raise Exception(f"Service did not start: {line!r}")
+    return process, line.split()[-1]
+
+
+def get_json(url, path):
+    parts = urlsplit(url)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=60)
+    connection.request('GET', path)
+    payload = json.loads(connection.getresponse().read())
+    connection.close()
+    return payload
+
+
+def client(url, texts, count, offset, latencies, sources, errors):
+    parts = urlsplit(url)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=300)
+    for i in range(count):
+        text = texts[(offset + i) % len(texts)]
+        started = time.perf_counter()
+        try:
+            connection.request('POST', '/synthesize', json.dumps({'text': text, 'language': 'en'}),
+                               {'Content-Type': 'application/json'})
+            response = connection.getresponse()
+            body = response.read()
+            if response.status != 200 or body[:4] != b'RIFF':
+                errors.append(f"{response.status}: {body[:200]!r}")
+                continue
+            sources.append(response.getheader('X-Voicify-Source'))
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(str(e))
+            connection.close()
+            connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=300)
+            continue
+        latencies.append(time.perf_counter() - started)
+    connection.close()
+
+
+def run(url, clients, requests, distinct, sentences):
+    texts = [f"Text number {n}. " + SENTENCE * sentences for n in range(distinct)]
+    latencies, sources, errors = [], [], []
+    threads = [
+        threading.Thread(target=client, args=(url, texts, requests, n, latencies, sources, errors))
+        for n in range(clients)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'clients': clients,
+        'requests': clients * requests,
+        'distinct_texts': distinct,
+        'seconds': round(elapsed, 3),
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+        'latency_p50': round(statistics.median(latencies), 4) if latencies else None,
+        'latency_p95': round(latencies[int(0.95 * (len(latencies) - 1))], 4) if latencies else None,
+        'sources': {source: sources.count(source) for source in set(sources)},
+        'errors': errors[:10],
+        'error_count': len(errors),
+        'service': {name: value for name, value in get_json(url, '/metrics').items() if name != 'stages'},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the local synthesis service.")
+    parser.add_argument('--url', default=None, help="service to test (default: start one with the stub backend)")
+    parser.add_argument('--clients', type=int, default=16, help="concurrent clients (default: 16)")
+    parser.add_argument('--requests', type=int, default=8, help="requests per client (default: 8)")
+    parser.add_argument('--distinct', type=int, default=4, help="distinct texts requested (default: 4)")
+    parser.add_argument('--sentences', type=int, default=40, help="sentences per text (default: 40)")
+    parser.add_argument('--max-concurrent', type=int, default=2, help="for a started service (default: 2)")
+    parser.add_argument('--max-queue', type=int, default=64, help="for a started service (default: 64)")
+    parser.add_argument('--output', default=None, help="write results JSON here")
+    args = parser.parse_args(argv)
+
+    process = None
+    url = args.url
+    with tempfile.TemporaryDirectory() as cache_dir:
+        if url is None:
+            process, url = start_service(args.max_concurrent, args.max_queue, cache_dir)
+        try:
+            results = run(url, args.clients, args.requests, args.distinct, args.sentences)
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+    print(json.dumps(results, indent=2))
+    return 1 if results['error_count'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,168 @@
+"""Cold-start and first-conversion benchmarks.
+
+    python benchmarks/startup.py [--repeat 5] [--output results.json]
+    python benchmarks/startup.py --baseline results.json [--tolerance 0.25]
+
+Every sample runs in a fresh interpreter, with the stub backend, a fresh
+audio cache, the null audio sink and Qt's offscreen platform. It is as cold
+as it gets without rebooting. Benchmarks that need PyQt5 are reported as
+skipped when it is missing. With --baseline, any benchmark whose median is
+more than --tolerance slower than the baseline's is listed and the exit
+status is 1, so CI can fail on regressions.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Each snippet prints the measured seconds as its last line of output;
+# snippets printing nothing are timed as a whole process
+BENCHMARKS = {
+    # Interpreter start-up alone, to tell machine noise from our own cost
+    'interpreter': (False, "pass"),
+    'import_core': (False, """
+import time
+start = time.perf_counter()
+import core
+print(time.perf_counter() - start)
+"""),
+    'import_main': (True, """
+import time
+start = time.perf_counter()
+import main
+print(time.perf_counter() - start)
+"""),
+    'window_construction': (True, """
+import time
+from PyQt5.QtWidgets import QApplication
+import main
+app = QApplication([])
+start = time.perf_counter()
+window = main.TextToSpeechApp()
+print(time.perf_counter() - start)
+"""),
+    'time_to_first_paint': (True, """
+import time
+from PyQt5.QtWidgets import QApplication
+import main
+app = QApplication([])
+start = time.perf_counter()
+window = main.TextToSpeechApp()
+window.show()
+while not window.first_painted and time.perf_counter() - start < 30:
+    app.processEvents()
+print(time.perf_counter() - start)
+"""),
+    'first_conversion': (False, """
+import time
+from core import VoicifyCore
+core = VoicifyCore()
+text = "The quick brown fox jumps over the lazy dog. " * 20
+start = time.perf_counter()
+conversion = core.plan_conversion(text, 'English', 'female', 150)
+job = core.start_conversion(conversion)
+core.finish_conversion(job.id, job.future.result())
+print(time.perf_counter() - start)
+core.job_manager.shutdown(wait=True)
+"""),
+}
+
+
+def has_qt():
+    try:
+        import PyQt5.QtWidgets  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def run_sample(name, code):
+    with tempfile.TemporaryDirectory(prefix='voicify_bench_') as tmp:
+        env = dict(os.environ,
+                   VOICIFY_BACKEND='stub',
+                   VOICIFY_CACHE_DIR=os.path.join(tmp, 'cache'),
+                   VOICIFY_AUDIO_SINK='null',
+                   QT_QPA_PLATFORM='offscreen',
+                   TMPDIR=tmp)
+        env.pop('VOICIFY_STARTUP_REPORT', None)
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, '-c', code], cwd=REPO_DIR, env=env,
+                                capture_output=True, text=True)
+        elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise Exception(f"{name} failed: {result.stderr.strip()}")
+    output = result.stdout.strip().splitlines()
+    return float(output[-1]) if output else elapsed
+
+
+def run_benchmarks(repeat=5, names=None):
+    qt = has_qt()
+    results = {}
+    for name, (needs_qt, code) in BENCHMARKS.items():
+        if names and name not in names:
+            continue
+        if needs_qt and not qt:
+            results[name] = {'skipped': "PyQt5 is not installed"}
+            continue
+        samples = [run_sample(name, code) for _ in range(repeat)]
+        results[name] = {
+            'median': round(statistics.median(samples), 5),
+            'min': round(min(samples), 5),
+            'max': round(max(samples), 5),
+            'samples': len(samples),
+        }
+    return {'python': sys.version.split()[0], 'platform': sys.platform, 'benchmarks': results}
+
+
+def regressions(results, baseline, tolerance):
+    """(name, baseline median, current median) for everything slower than allowed"""
+    slower = []
+    for name, current in results['benchmarks'].items():
+        previous = baseline.get('benchmarks', {}).get(name, {})
+        if 'median' not in current or not previous.get('median'):
+            continue
+        if current['median'] > previous['median'] * (1 + tolerance):
+            slower.append((name, previous['median'], current['median']))
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure import, window construction and first-conversion time.")
+    parser.add_argument('--repeat', type=int, default=5, help="fresh interpreters per benchmark (default: 5)")
+    parser.add_argument('--only', action='append', choices=sorted(BENCHMARKS), help="run only these benchmarks")
+    parser.add_argument('--output', default=None, help="write results JSON here")
+    parser.add_argument('--baseline', default=None, help="results JSON to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="allowed slowdown against the baseline, as a fraction (default: 0.25)")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.repeat, args.only)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+
+    for name, result in results['benchmarks'].items():
+        if 'skipped' in result:
+            print(f"{name:>20}  skipped ({result['skipped']})")
+        else:
+            print(f"{name:>20}  {result['median'] * 1000:9.1f} ms median  {result['min'] * 1000:9.1f} ms min")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            baseline = json.load(file)
+        slower = regressions(results, baseline, args.tolerance)
+        for name, before, after in slower:
+            print(f"REGRESSION {name}: {before * 1000:.1f} ms -> {after * 1000:.1f} ms")
+        if slower:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,204 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+
+from metrics import stage_metrics
+from workspace import pid_alive, scratch_path
+
+
+def cache_key(text, lang_code, voice_id=None, rate=None, backend=None, post=None):
+    """Content address for a synthesized clip; post identifies post-processing"""
+    fields = [text, lang_code, voice_id, rate, backend]
+    if post:
+        fields.append(post)
+    payload = json.dumps(fields, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class AudioCache:
+    """Size-bounded, least-recently-used audio cache on disk.
+
+    Entries are plain files named by their key, so the cache survives
+    restarts; recency is rebuilt from file modification times on startup.
+    Entries hold encoded audio (WAV, or the MP3 a backend returned as-is).
+    Several app instances may share one cache directory; pin() keeps an
+    entry that is in use from being evicted by any of them.
+    """
+
+    def __init__(self, cache_dir, max_bytes=512 * 1024 * 1024, suffix='.audio'):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._size = 0
+        self._pins = {}
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        found = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if not name.endswith(self.suffix) or not os.path.isfile(path):
+                continue
+            stat = os.stat(path)
+            found.append((stat.st_mtime, name[:-len(self.suffix)], stat.st_size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._size += size
+        with self._lock:
+            self._evict()
+
+    def path_for(self, key):
+        return os.path.join(self.cache_dir, key + self.suffix)
+
+    def get(self, key):
+        """Return the cached file path for key, or None on a miss"""
+        with self._lock:
+            path = self.path_for(key)
+            if key in self._entries and os.path.exists(path):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                try:
+                    os.utime(path)
+                except OSError:
+                    pass
+                return path
+            if key in self._entries:
+                # File was removed behind our back
+                self._size -= self._entries.pop(key)
+            self.misses += 1
+            return None
+
+    def get_bytes(self, key):
+        """Return the cached bytes for key, or None on a miss"""
+        path = self.get(key)
+        if path is None:
+            return None
+        try:
+            with open(path, 'rb') as file:
+                return file.read()
+        except OSError:
+            return None
+
+    def put(self, key, source_path, move=True):
+        """Store source_path under key and return the cached path"""
+        path = self.path_for(key)
+        tmp_path = scratch_path(path)
+        if move:
+            shutil.move(source_path, tmp_path)
+        else:
+            shutil.copyfile(source_path, tmp_path)
+        return self._commit(key, tmp_path, path)
+
+    def put_bytes(self, key, data):
+        """Store data under key and return the cached path"""
+        path = self.path_for(key)
+        tmp_path = scratch_path(path)
+        with stage_metrics.stage('write', len(data)), open(tmp_path, 'wb') as file:
+            file.write(data)
+        return self._commit(key, tmp_path, path)
+
+    def _commit(self, key, tmp_path, path):
+        os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+        with self._lock:
+            if key in self._entries:
+                self._size -= self._entries.pop(key)
+            self._entries[key] = size
+            self._size += size
+            self._evict(keep=key)
+        return path
+
+    def _pin_dir(self, key):
+        return self.path_for(key) + '.pins'
+
+    def pin(self, key):
+        """Protect key from eviction until a matching unpin(); pins are counted.
+
+        Pins are also marked on disk (one file per process), so other
+        instances sharing the directory leave the entry alone too.
+        """
+        with self._lock:
+            self._pins[key] = self._pins.get(key, 0) + 1
+            if self._pins[key] == 1:
+                os.makedirs(self._pin_dir(key), exist_ok=True)
+                open(os.path.join(self._pin_dir(key), str(os.getpid())), 'w').close()
+
+    def unpin(self, key):
+        with self._lock:
+            count = self._pins.get(key, 0) - 1
+            if count > 0:
+                self._pins[key] = count
+                return
+            self._pins.pop(key, None)
+            self._remove_pin(key, str(os.getpid()))
+
+    def _remove_pin(self, key, owner):
+        pin_dir = self._pin_dir(key)
+        try:
+            os.remove(os.path.join(pin_dir, owner))
+            os.rmdir(pin_dir)
+        except OSError:
+            # Already gone, or still pinned by another instance
+            pass
+
+    def _pinned(self, key):
+        if self._pins.get(key):
+            return True
+        pin_dir = self._pin_dir(key)
+        if not os.path.isdir(pin_dir):
+            return False
+        for owner in os.listdir(pin_dir):
+            if owner.isdigit() and pid_alive(int(owner)):
+                return True
+            # Left behind by an instance that did not shut down cleanly
+            self._remove_pin(key, owner)
+        return False
+
+    def _evict(self, keep=None):
+        # Least recently used first. keep (the entry just written, even when
+        # it alone is over budget) and pinned entries stay
+        for key in list(self._entries):
+            if self._size <= self.max_bytes:
+                break
+            if key == keep or self._pinned(key):
+                continue
+            size = self._entries.pop(key)
+            self._size -= size
+            self.evictions += 1
+            try:
+                os.remove(self.path_for(key))
+            except OSError:
+                pass
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                if self._pinned(key):
+                    continue
+                self._size -= self._entries.pop(key)
+                try:
+                    os.remove(self.path_for(key))
+                except OSError:
+                    pass
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,122 @@
+import re
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from metrics import stage_metrics
+
+# Sentence ends: western punctuation followed by whitespace, or CJK full stops
+SENTENCE_END = re.compile(r'(?<=[.!?;:])\s+|(?<=[。！？；])')
+PARAGRAPH_BREAK = re.compile(r'\n\s*\n|\r\n\s*\r\n')
+
+
+def split_sentences(text):
+    return [s.strip() for s in SENTENCE_END.split(text) if s and s.strip()]
+
+
+def split_into_chunks(text, max_chars=400):
+    """Split text into sentence-aligned chunks of at most max_chars.
+
+    Paragraphs are packed independently, so editing one paragraph leaves the
+    chunks (and cache keys) of every other paragraph unchanged.
+    """
+    chunks = []
+    for paragraph in PARAGRAPH_BREAK.split(text):
+        paragraph = ' '.join(paragraph.split())
+        if not paragraph:
+            continue
+        current = ''
+        for sentence in split_sentences(paragraph):
+            # Sentences longer than a chunk are cut at word boundaries
+            while len(sentence) > max_chars:
+                cut = sentence.rfind(' ', 0, max_chars)
+                if cut <= 0:
+                    cut = max_chars
+                if current:
+                    chunks.append(current)
+                    current = ''
+                chunks.append(sentence[:cut].strip())
+                sentence = sentence[cut:].strip()
+            if not sentence:
+                continue
+            if current and len(current) + 1 + len(sentence) > max_chars:
+                chunks.append(current)
+                current = sentence
+            else:
+                current = f"{current} {sentence}" if current else sentence
+        if current:
+            chunks.append(current)
+    return chunks
+
+
+def render_chunk(chunk, index, synthesize_chunk, cache, key_for):
+    """Return the encoded audio for one chunk, synthesizing it on a cache miss"""
+    if cache is not None:
+        cached = cache.get_bytes(key_for(chunk))
+        if cached:
+            return cached
+    with stage_metrics.stage('synthesize', len(chunk.encode('utf-8'))) as stage:
+        data = synthesize_chunk(chunk)
+        stage.bytes_out = len(data or b'')
+    if not data:
+        raise Exception(f"Failed to generate audio for chunk {index + 1}")
+    if cache is not None:
+        cache.put_bytes(key_for(chunk), data)
+    return data
+
+
+def synthesize_chunks(job, chunks, synthesize_chunk, cache, key_for, max_workers=4, on_chunk=None,
+                      consume=None):
+    """Synthesize chunks concurrently and return their encoded audio in order.
+
+    synthesize_chunk(text) renders one chunk to encoded bytes; any callable
+    with that shape works, which keeps the pipeline testable without gTTS.
+    Chunks already in the cache are not synthesized again. on_chunk(index)
+    is called from the worker as each chunk's audio becomes available.
+
+    With consume(index, artifact), artifacts are handed over in order on
+    the calling thread as soon as every earlier one has been, and are not
+    kept. Rendering then runs at most a few chunks per worker ahead of the
+    next one to be consumed, so a fast backend cannot pile up audio while
+    the consumer catches up.
+    """
+    total = len(chunks)
+    artifacts = [None] * total if consume is None else None
+    ahead = total if consume is None else 4 * max(1, max_workers)
+    early = {}
+    next_index = 0
+    next_submit = 0
+    done = 0
+
+    def render(index):
+        job.check_cancelled()
+        artifact = render_chunk(chunks[index], index, synthesize_chunk, cache, key_for)
+        if on_chunk:
+            on_chunk(index)
+        return artifact
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="tts-chunk") as executor:
+        futures = {}
+        try:
+            while True:
+                while next_submit < min(total, next_index + ahead):
+                    futures[executor.submit(render, next_submit)] = next_submit
+                    next_submit += 1
+                if not futures:
+                    break
+                finished, _ = wait(futures, timeout=0.2, return_when=FIRST_COMPLETED)
+                job.check_cancelled()
+                for future in finished:
+                    index = futures.pop(future)
+                    if consume is None:
+                        artifacts[index] = future.result()
+                    else:
+                        early[index] = future.result()
+                        while next_index in early:
+                            consume(next_index, early.pop(next_index))
+                            next_index += 1
+                    done += 1
+                    job.report(done * 100 // total)
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+    return artifacts
@@ -0,0 +1,402 @@
+import os
+import tempfile
+
+from backends import Pyttsx3Backend, get_backend, backend_for_language
+from cache import AudioCache, cache_key
+from document import TextDocument
+from dsp import PostProcessor, numpy_available, plan_post, post_steps
+from engine_pool import EnginePool
+from export import export_audio
+from jobs import JobManager
+from metrics import stage_metrics
+from journal import JobJournal
+from ocr import tesseract_language
+from pdf_extract import PageCache, extract_pdf_job
+from scheduler import LOOKAHEAD_PARAGRAPHS, SynthesisScheduler
+from streaming import stream_scheduled
+from synthesis import SUPPORTED_LANGUAGES, synthesize_document
+from voices import VoiceCatalog, installed_voices_fingerprint
+from workspace import Workspace
+
+
+class Conversion:
+    """A resolved conversion request: document, backend, voice, rate,
+    post-processing and cache key"""
+
+    def __init__(self, document, lang_code, backend, voice_id=None, rate=None, post=None):
+        self.document = document
+        self.lang_code = lang_code
+        self.backend = backend
+        self.voice_id = voice_id
+        self.rate = rate
+        self.post = post
+        # Hashed page by page rather than as one joined string
+        self.key = cache_key(document.digest(), lang_code, voice_id, rate, backend.name,
+                             post.key() if post is not None else None)
+
+
+class VoicifyCore:
+    """Everything behind the window that does not need Qt.
+
+    Owns the caches, the job manager, the system voice catalog and the last
+    conversion result. Long operations are submitted as jobs; their callbacks
+    run on worker threads, so a GUI passes emitters that marshal back to its
+    own thread. Usable headless, e.g. by the benchmarks.
+    """
+
+    def __init__(self, temp_dir=None, cache_dir=None, max_workers=4, chunk_workers=4, engine_processes=None):
+        # Supported languages for gTTS with their codes
+        self.supported_languages = dict(SUPPORTED_LANGUAGES)
+
+        self.temp_dir = temp_dir or os.path.join(tempfile.gettempdir(), 'tts_app')
+        os.makedirs(self.temp_dir, exist_ok=True)
+        # The temp dir is shared by every running instance; scratch files go
+        # in this instance's own workspace, one directory per job
+        self.workspace = Workspace(self.temp_dir)
+
+        # Synthesized clips are cached by content so repeats skip the engines;
+        # VOICIFY_CACHE_DIR moves the cache out of the temp dir
+        self.cache_dir = cache_dir or os.environ.get('VOICIFY_CACHE_DIR') or os.path.join(self.temp_dir, 'cache')
+        self.audio_cache = AudioCache(self.cache_dir)
+        self.page_cache = PageCache(os.path.join(self.cache_dir, 'pages'))
+        # Plans of unfinished conversions, next to the chunks they resume from
+        self.journal_dir = os.path.join(self.cache_dir, 'journal')
+
+        # System voices come from load_voices(), off the GUI thread; the
+        # catalog is saved next to the audio cache between runs
+        self.voice_catalog = VoiceCatalog()
+        self.voice_catalog_path = os.path.join(self.cache_dir, 'voices.json')
+        self.voices_job_id = None
+        self.voice_load_error = None
+        # Languages other than English stay with gTTS unless
+        # VOICIFY_SYSTEM_VOICES=1 asks for installed system voices; then
+        # conversions wait for the catalog (see voices_pending)
+        self.system_voices = os.environ.get('VOICIFY_SYSTEM_VOICES') == '1'
+        self.system_voice_languages = ()
+
+        # Last conversion result: a WAV in the audio cache, assembled there
+        # chunk by chunk and pinned against eviction while it is the current
+        # result. Playback and export map it rather than load it
+        self.generated_audio_path = None
+        self.pinned_key = None
+        self.job_keys = {}
+        # Jobs cancelled with discard=True
+        self.discarded_jobs = set()
+
+        # With NumPy, speech of backends without a rate setting is
+        # time-stretched to the rate; loudness normalization and silence
+        # trimming only run when named in VOICIFY_POSTPROCESS
+        self.post_processing = numpy_available()
+        self.post_steps = post_steps()
+
+        self.job_manager = JobManager(max_workers=max_workers)
+        # Concurrent gTTS requests per conversion
+        self.chunk_workers = chunk_workers
+
+        # Reading aloud renders in priority order: the text at the reading
+        # position, VOICIFY_LOOKAHEAD paragraphs after it, then (unless
+        # VOICIFY_PREFETCH=0) the rest of the document in the background
+        self.scheduler = None
+        self.lookahead_paragraphs = int(os.environ.get('VOICIFY_LOOKAHEAD') or LOOKAHEAD_PARAGRAPHS)
+        self.prefetch = os.environ.get('VOICIFY_PREFETCH') != '0'
+
+        # pyttsx3 renders in a pool of warm engine processes so English
+        # conversions can overlap; VOICIFY_ENGINE_PROCESSES=0 keeps the single
+        # in-process engine
+        if engine_processes is None and os.environ.get('VOICIFY_ENGINE_PROCESSES'):
+            engine_processes = int(os.environ['VOICIFY_ENGINE_PROCESSES'])
+        self.engine_pool = None
+        # This core's pyttsx3 backend; the pooled one is not shared with
+        # other cores
+        self.pyttsx3 = get_backend('pyttsx3')
+        if engine_processes != 0:
+            self.engine_pool = EnginePool('pyttsx3', max_processes=engine_processes)
+            self.pyttsx3 = Pyttsx3Backend(self.engine_pool)
+
+    @property
+    def voices_loading(self):
+        return self.voices_job_id is not None
+
+    def voices_pending(self, backend):
+        """Whether conversions with backend must wait for the voice catalog"""
+        return self.voices_loading and (backend.name == 'pyttsx3' or self.system_voices)
+
+    def backend_for(self, lang_code):
+        backend = backend_for_language(lang_code, system_languages=self.system_voice_languages)
+        return self.pyttsx3 if backend.name == 'pyttsx3' else backend
+
+    def load_voices(self, on_finished=None, on_failed=None):
+        """Load the voice catalog as a job.
+
+        The saved catalog is used while the installed voice set is unchanged;
+        otherwise an in-process pyttsx3 engine is started to enumerate
+        voices. The job runs on that engine's lane, which is also where
+        renders run when there is no engine pool (with one, they run in its
+        worker processes). Call set_voices() or voices_failed() with the
+        outcome.
+        """
+        backend = get_backend('pyttsx3')
+        job = self.job_manager.submit(
+            self._load_voice_catalog, backend,
+            description="Load system voices",
+            lane=backend.lane,
+            on_finished=on_finished,
+            on_failed=on_failed,
+        )
+        self.voices_job_id = job.id
+        return job
+
+    def _load_voice_catalog(self, job, backend):
+        fingerprint = installed_voices_fingerprint()
+        catalog = VoiceCatalog.load(self.voice_catalog_path, fingerprint)
+        if catalog is None:
+            catalog = VoiceCatalog.from_engine_voices(backend.voices(), fingerprint)
+            catalog.save(self.voice_catalog_path)
+        return catalog
+
+    def set_voices(self, catalog):
+        self.voices_job_id = None
+        self.voice_catalog = catalog
+        if self.system_voices:
+            # System voices serve every language they speak, for this core only
+            self.system_voice_languages = tuple(catalog.languages(SUPPORTED_LANGUAGES.values()))
+
+    def voices_failed(self, message):
+        self.voices_job_id = None
+        self.voice_load_error = message
+
+    def voices_available(self, backend):
+        """Whether voice selection can be offered for backend"""
+        return backend.supports_voices and not (backend.name == 'pyttsx3' and self.voice_load_error)
+
+    def rate_available(self, backend):
+        """Whether the speech rate can be set for backend"""
+        return backend.supports_rate or self.post_processing
+
+    def plan_conversion(self, text, language, voice_type='female', rate=None):
+        """Resolve a conversion of text in a language named in supported_languages.
+
+        text is a str or a TextDocument; a document is snapshotted, so
+        edits made while the conversion runs do not affect it.
+        """
+        if isinstance(text, TextDocument):
+            document = text.snapshot()
+        else:
+            document = TextDocument(text)
+        lang_code = self.supported_languages[language]
+        backend = self.backend_for(lang_code)
+        voice_id = None
+        if backend.supports_voices and backend.name == 'pyttsx3':
+            voice = self.voice_catalog.find(lang_code, voice_type)
+            voice_id = voice['id'] if voice else None
+        post = None
+        if self.post_processing:
+            # The backend's own rate setting is used where there is one
+            post = plan_post(None if backend.supports_rate else rate, self.post_steps)
+        return Conversion(document, lang_code, backend, voice_id, rate if backend.supports_rate else None, post)
+
+    def warm_engine(self, language, voice_type='female', rate=None):
+        """Start a pooled engine for these settings ahead of the first conversion"""
+        conversion = self.plan_conversion('', language, voice_type, rate)
+        if self.engine_pool is not None and conversion.backend.name == 'pyttsx3':
+            self.engine_pool.warm(conversion.voice_id, conversion.rate)
+
+    def use_cached(self, conversion):
+        """Make a cached result the current one; returns its path or None"""
+        # Pinned before the lookup so no instance evicts it in between
+        self.audio_cache.pin(conversion.key)
+        cached_path = self.audio_cache.get(conversion.key)
+        if cached_path:
+            self._set_result_path(conversion.key, cached_path)
+        self.audio_cache.unpin(conversion.key)
+        return cached_path
+
+    def _set_result_path(self, key, path):
+        """Make a cache entry the current result, moving the pin to it"""
+        if key is not None:
+            self.audio_cache.pin(key)
+        if self.pinned_key is not None:
+            self.audio_cache.unpin(self.pinned_key)
+        self.pinned_key = key
+        self.generated_audio_path = path
+
+    def start_conversion(self, conversion, stream=None, description="", **callbacks):
+        """Submit the conversion as a job; pass the result to finish_conversion()"""
+        journal = self._journal_for(conversion, description)
+        return self._submit_synthesis(conversion.document, conversion.backend, journal, stream, description, callbacks)
+
+    def _journal_for(self, conversion, description):
+        # Picks up the progress of an earlier, interrupted run of the same text
+        return JobJournal.load(self.journal_dir, conversion.key) or JobJournal(
+            self.journal_dir, conversion.key, description, conversion.lang_code,
+            conversion.backend.name, conversion.voice_id, conversion.rate,
+            post=conversion.post.settings() if conversion.post is not None else None,
+        )
+
+    def start_reading(self, conversion, stream, position=0, visible_end=None, description="", **callbacks):
+        """Read the conversion aloud into stream from a character position.
+
+        Chunks come from a SynthesisScheduler: the paragraph at position and
+        the rest of the text up to visible_end first, then the look-ahead
+        paragraphs, then the rest of the document. Reading the same document
+        again from elsewhere seeks the same scheduler, so work queued for the
+        old position is dropped. Once the end has been read, the whole
+        document is assembled from the cache; pass the result to
+        finish_conversion(). Backends that must stay on one thread are read
+        from the start with start_conversion().
+        """
+        backend = conversion.backend
+        if not backend.thread_safe:
+            return self.start_conversion(conversion, stream, description, **callbacks)
+        scheduler = self.scheduler
+        journal = self._journal_for(conversion, description)
+        if scheduler is None or scheduler.key != conversion.key:
+            self.stop_reading()
+            plan = conversion.document.chunk_positions(400)
+            if not plan:
+                raise Exception("No text to convert")
+            # Chunks are journaled as the scheduler renders them, so reading
+            # that stops early can be resumed
+            journal.begin([chunk for _, chunk in plan])
+
+            def key_for(chunk):
+                return cache_key(chunk, conversion.lang_code, conversion.voice_id, conversion.rate, backend.name)
+
+            scheduler = self.scheduler = SynthesisScheduler(
+                [chunk for _, chunk in plan],
+                backend.chunk_synthesizer(conversion.lang_code, conversion.voice_id, conversion.rate),
+                self.audio_cache, key_for, backend.max_workers(self.chunk_workers),
+                [start for start, _ in plan], self.lookahead_paragraphs, self.prefetch, conversion.key,
+                journal.chunk_done,
+            ).start()
+        start, generation = scheduler.seek_position(position, visible_end)
+        job = self.job_manager.submit(
+            self._read_result, scheduler, start, generation, stream, backend, journal,
+            description=description, **callbacks
+        )
+        self.job_keys[job.id] = journal.key
+        return job
+
+    def _read_result(self, job, scheduler, start, generation, stream, backend, journal):
+        post = PostProcessor(**journal.post) if journal.post else None
+        stream_scheduled(job, scheduler, start, stream, post.process if post is not None else None, generation)
+        # A result that was cached already is not assembled again
+        self.audio_cache.pin(journal.key)
+        cached_path = self.audio_cache.get(journal.key)
+        if cached_path:
+            journal.finish()
+            return cached_path
+        self.audio_cache.unpin(journal.key)
+        # Chunks before the start (and any prefetch missed) are rendered by
+        # the scheduler too, so none is rendered twice; the assembly below
+        # then only reads the cache
+        scheduler.complete(job, generation)
+        return self._synthesize_result(job, scheduler.chunks, backend, journal, None)
+
+    def stop_reading(self):
+        """Stop the scheduler's background synthesis"""
+        if self.scheduler is not None:
+            self.scheduler.close()
+            self.scheduler = None
+
+    def pending_conversions(self):
+        """Journals of conversions that did not complete, most recent first"""
+        return JobJournal.pending(self.journal_dir)
+
+    def resume_conversion(self, journal, stream=None, **callbacks):
+        """Continue an unfinished conversion; only its missing chunks are synthesized"""
+        backend = get_backend(journal.backend)
+        return self._submit_synthesis(journal.chunks, backend, journal, stream, journal.description, callbacks)
+
+    def discard_conversion(self, journal):
+        journal.finish()
+
+    def _submit_synthesis(self, text, backend, journal, stream, description, callbacks):
+        # Long text is split into sentence chunks; thread-safe backends such
+        # as gTTS render them in parallel, pyttsx3 one at a time on its lane
+        job = self.job_manager.submit(
+            self._synthesize_result, text, backend, journal, stream,
+            description=description, lane=backend.lane, **callbacks
+        )
+        self.job_keys[job.id] = journal.key
+        return job
+
+    def _synthesize_result(self, job, text, backend, journal, stream):
+        """Assemble the document into this job's workspace and commit it to
+        the audio cache; returns the cached WAV path"""
+        with self.workspace.acquire(f'job-{job.id}') as scratch:
+            wav_path = synthesize_document(
+                job, text, backend, journal.lang_code, journal.voice_id, journal.rate,
+                self.audio_cache, self.chunk_workers, 400, stream, journal,
+                PostProcessor(**journal.post) if journal.post else None,
+                output=scratch.file('audio.wav'),
+            )
+            # Pinned until finish_conversion() takes it over, so no instance
+            # evicts it in between; moved into the cache atomically
+            self.audio_cache.pin(journal.key)
+            return self.audio_cache.put(journal.key, wav_path)
+
+    def finish_conversion(self, job_id, path):
+        key = self.job_keys.pop(job_id, None)
+        self.discarded_jobs.discard(job_id)
+        self._set_result_path(key, path)
+        if key is not None:
+            self.audio_cache.unpin(key)
+
+    def forget_job(self, job_id):
+        key = self.job_keys.pop(job_id, None)
+        if job_id in self.discarded_jobs:
+            self.discarded_jobs.discard(job_id)
+            if key is not None:
+                JobJournal(self.journal_dir, key).finish()
+
+    def cancel(self, job_id, discard=False):
+        """Cancel a job. With discard (the user gave the conversion up), its
+        journal is deleted by forget_job(), so it is not offered for resuming"""
+        if discard:
+            self.discarded_jobs.add(job_id)
+        self.job_manager.cancel(job_id)
+
+    def audio_file(self):
+        """Return the WAV path of the last result, or None"""
+        if self.generated_audio_path and os.path.exists(self.generated_audio_path):
+            return self.generated_audio_path
+        return None
+
+    def audio_source(self):
+        """The last result for playback or export"""
+        return self.audio_file()
+
+    def export(self, file_path, profile):
+        # Encoded now, streaming from the mapped cache entry
+        source = self.audio_source()
+        if source is None:
+            raise Exception("No audio available to export")
+        return export_audio(source, file_path, profile)
+
+    def extract_pdf(self, file_path, language, **callbacks):
+        """Submit PDF text extraction as a job; the result is a TextDocument
+        and the normalization stats.
+
+        Pages are extracted in worker processes and cached per file; pages
+        without a text layer are OCR'd in the given language. Running
+        headers, page numbers and similar boilerplate are removed before
+        the text reaches the document.
+        """
+        lang_code = self.supported_languages[language]
+        return self.job_manager.submit(
+            extract_pdf_job, file_path, self.page_cache, None, tesseract_language(lang_code), lang_code,
+            description=f"Extract {os.path.basename(file_path)}", **callbacks
+        )
+
+    def close(self):
+        self.stop_reading()
+        self.job_manager.shutdown(wait=False)
+        if self.engine_pool is not None:
+            self.engine_pool.shutdown()
+        # Only this instance's scratch space; the cache and other instances'
+        # workspaces stay
+        self._set_result_path(None, None)
+        self.workspace.close()
+        # Files named by VOICIFY_METRICS / VOICIFY_PROFILE, if any
+        stage_metrics.write_reports()
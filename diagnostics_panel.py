@@ -0,0 +1,112 @@
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtWidgets import (QCheckBox, QDialog, QFileDialog, QHBoxLayout, QHeaderView, QLabel, QMessageBox,
+                             QPushButton, QTableWidget, QTableWidgetItem, QVBoxLayout)
+
+from metrics import stage_metrics
+
+COLUMNS = (
+    ('Calls', 'calls', '{:,}'),
+    ('Time (s)', 'seconds', '{:.3f}'),
+    ('Mean (ms)', 'mean_ms', '{:.2f}'),
+    ('In (MB)', 'bytes_in', '{:.2f}'),
+    ('Out (MB)', 'bytes_out', '{:.2f}'),
+    ('MB/s', 'mb_per_second', '{:.1f}'),
+)
+
+
+class DiagnosticsPanel(QDialog):
+    """Live per-stage timings and byte counts of the conversion pipeline.
+
+    Shows metrics.stage_metrics, refreshed while the panel is open. The
+    counters can be reset before a conversion to see only its share, saved
+    as JSON or CSV, and a cProfile capture can be started and saved as a
+    .prof file for snakeviz or pstats.
+    """
+
+    REFRESH_MS = 1000
+
+    def __init__(self, parent=None, metrics=stage_metrics):
+        super().__init__(parent)
+        self.metrics = metrics
+        self.setWindowTitle("Diagnostics")
+        self.setMinimumWidth(640)
+
+        layout = QVBoxLayout(self)
+        self.summary_label = QLabel()
+        layout.addWidget(self.summary_label)
+
+        self.table = QTableWidget(0, len(COLUMNS))
+        self.table.setHorizontalHeaderLabels([title for title, _, _ in COLUMNS])
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        layout.addWidget(self.table)
+
+        buttons = QHBoxLayout()
+        self.profile_checkbox = QCheckBox("Capture profile")
+        self.profile_checkbox.setChecked(metrics.profiling)
+        self.profile_checkbox.toggled.connect(self.toggle_profiling)
+        buttons.addWidget(self.profile_checkbox)
+        buttons.addStretch()
+        for label, slot in (("Reset", self.reset), ("Export...", self.export), ("Close", self.close)):
+            button = QPushButton(label)
+            button.clicked.connect(slot)
+            buttons.addWidget(button)
+        layout.addLayout(buttons)
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.refresh()
+
+    def showEvent(self, event):
+        self.refresh()
+        self.timer.start(self.REFRESH_MS)
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self.timer.stop()
+        super().hideEvent(event)
+
+    def refresh(self):
+        rows = self.metrics.rows()
+        self.table.setRowCount(len(rows))
+        self.table.setVerticalHeaderLabels([row['stage'] for row in rows])
+        for r, row in enumerate(rows):
+            for c, (_, field, fmt) in enumerate(COLUMNS):
+                value = row[field] / 1e6 if field.startswith('bytes') else row[field]
+                item = QTableWidgetItem(fmt.format(value))
+                item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                self.table.setItem(r, c, item)
+        total = sum(row['seconds'] for row in rows)
+        slowest = max(rows, key=lambda row: row['seconds'])
+        text = f"{total:.2f} s in pipeline stages"
+        if slowest['seconds']:
+            text += f"; most in {slowest['stage']} ({slowest['seconds'] / total:.0%})"
+        self.summary_label.setText(text + ". Stages on parallel workers add up their time.")
+
+    def reset(self):
+        self.metrics.reset()
+        self.refresh()
+
+    def export(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Export Diagnostics", "voicify-stages.json",
+                                              "JSON (*.json);;CSV (*.csv)")
+        if not path:
+            return
+        try:
+            self.metrics.write(path)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed to export diagnostics: {str(e)}")
+
+    def toggle_profiling(self, enabled):
+        if enabled:
+            self.metrics.start_profiling()
+            return
+        self.metrics.stop_profiling()
+        path, _ = QFileDialog.getSaveFileName(self, "Save Profile", "voicify.prof", "Profile (*.prof)")
+        if not path:
+            return
+        try:
+            if self.metrics.write_profile(path) is None:
+                QMessageBox.information(self, "Profile", "Nothing was captured; run a conversion while capturing.")
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed to save profile: {str(e)}")
@@ -0,0 +1,364 @@
+import bisect
+import hashlib
+from contextlib import contextmanager
+
+from chunking import PARAGRAPH_BREAK, SENTENCE_END, split_into_chunks
+
+# Target characters per page of the buffer; pages are split at twice this
+PAGE_CHARS = 16384
+# Paragraphs longer than this are cut at a sentence end for synthesis
+MAX_BLOCK_CHARS = 65536
+# Edit groups kept for undo
+UNDO_LIMIT = 1000
+
+
+class TextDocument:
+    """Editable text held as a list of pages.
+
+    Edits touch only the pages they overlap, and reads return just the
+    requested range, so a whole book never needs to exist as one string.
+    Page and line offsets are prefix sums rebuilt lazily after an edit.
+    Strings are immutable, which makes snapshot() a cheap copy of the page
+    list that later edits do not affect.
+
+    Edits are recorded for undo()/redo() as (position, removed, inserted)
+    steps; typing and backspacing character by character undo a word at a
+    time, and edits made inside grouped() undo together. set_text() starts
+    a new history.
+    """
+
+    def __init__(self, text=''):
+        self._pages = []
+        # Newline offsets within each page, computed on first use
+        self._newlines = []
+        self._char_starts = None
+        self._line_starts = None
+        self.version = 0
+        self._listeners = []
+        self._undo = []
+        self._redo = []
+        # Steps of the open grouped() block; None outside one
+        self._group = None
+        self._recording = True
+        if text:
+            self.append(text)
+            self._undo = []
+
+    @classmethod
+    def from_pages(cls, pages, separator='\n'):
+        """Build a document from page texts without joining them"""
+        document = cls()
+        for index, text in enumerate(pages):
+            if index and separator:
+                text = separator + text
+            document._pages.extend(text[i:i + PAGE_CHARS] for i in range(0, len(text), PAGE_CHARS))
+        document._newlines = [None] * len(document._pages)
+        return document
+
+    def snapshot(self):
+        copy = TextDocument()
+        copy._pages = list(self._pages)
+        copy._newlines = list(self._newlines)
+        return copy
+
+    def add_listener(self, callback):
+        """Call callback() after every edit"""
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _changed(self):
+        self._char_starts = None
+        self._line_starts = None
+        self.version += 1
+        for callback in self._listeners:
+            callback()
+
+    def _index(self):
+        if self._char_starts is None:
+            char_starts = []
+            line_starts = []
+            chars = lines = 0
+            for page in self._pages:
+                char_starts.append(chars)
+                line_starts.append(lines)
+                chars += len(page)
+                lines += page.count('\n')
+            char_starts.append(chars)
+            line_starts.append(lines)
+            self._char_starts = char_starts
+            self._line_starts = line_starts
+        return self._char_starts, self._line_starts
+
+    def _page_newlines(self, page_no):
+        newlines = self._newlines[page_no]
+        if newlines is None:
+            page = self._pages[page_no]
+            newlines = []
+            position = page.find('\n')
+            while position != -1:
+                newlines.append(position)
+                position = page.find('\n', position + 1)
+            self._newlines[page_no] = newlines
+        return newlines
+
+    def __len__(self):
+        return self._index()[0][-1]
+
+    @property
+    def line_count(self):
+        return self._index()[1][-1] + 1
+
+    def is_blank(self):
+        return all(not page or page.isspace() for page in self._pages)
+
+    def _locate(self, position):
+        """(page_no, offset) of a character position; end of text allowed"""
+        char_starts = self._index()[0]
+        if not self._pages:
+            return 0, 0
+        page_no = min(bisect.bisect_right(char_starts, position) - 1, len(self._pages) - 1)
+        return page_no, position - char_starts[page_no]
+
+    def text(self, start=0, end=None):
+        """Characters in [start, end)"""
+        length = len(self)
+        end = length if end is None else min(end, length)
+        start = max(0, start)
+        if start >= end:
+            return ''
+        page_no, offset = self._locate(start)
+        parts = []
+        remaining = end - start
+        while remaining > 0:
+            piece = self._pages[page_no][offset:offset + remaining]
+            parts.append(piece)
+            remaining -= len(piece)
+            page_no += 1
+            offset = 0
+        return ''.join(parts)
+
+    def line_start(self, line):
+        """Position of the first character of a line (0-based)"""
+        if line <= 0:
+            return 0
+        char_starts, line_starts = self._index()
+        if line >= line_starts[-1] + 1:
+            return char_starts[-1]
+        # The page holding the newline that ends the previous line
+        page_no = bisect.bisect_left(line_starts, line) - 1
+        newlines = self._page_newlines(page_no)
+        return char_starts[page_no] + newlines[line - 1 - line_starts[page_no]] + 1
+
+    def line_end(self, line):
+        """Position of the newline ending a line, or the end of the text"""
+        if line + 1 >= self.line_count:
+            return len(self)
+        return self.line_start(line + 1) - 1
+
+    def line(self, line):
+        return self.text(self.line_start(line), self.line_end(line))
+
+    def line_of(self, position):
+        """Line containing a character position"""
+        if not self._pages:
+            return 0
+        page_no, offset = self._locate(position)
+        return self._index()[1][page_no] + bisect.bisect_left(self._page_newlines(page_no), offset)
+
+    def insert(self, position, text):
+        if not text:
+            return
+        if not self._pages:
+            self._pages.append('')
+            self._newlines.append(None)
+        position = max(0, min(position, len(self)))
+        self._record(position, '', text)
+        page_no, offset = self._locate(position)
+        page = self._pages[page_no]
+        page = page[:offset] + text + page[offset:]
+        pieces = [page[i:i + PAGE_CHARS] for i in range(0, len(page), PAGE_CHARS)] if len(page) > 2 * PAGE_CHARS else [page]
+        self._pages[page_no:page_no + 1] = pieces
+        self._newlines[page_no:page_no + 1] = [None] * len(pieces)
+        self._changed()
+
+    def append(self, text):
+        self.insert(len(self), text)
+
+    def delete(self, start, end):
+        length = len(self)
+        start, end = max(0, start), min(end, length)
+        if start >= end:
+            return
+        if self._recording:
+            self._record(start, self.text(start, end), '')
+        first, first_offset = self._locate(start)
+        last, last_offset = self._locate(end)
+        merged = self._pages[first][:first_offset] + self._pages[last][last_offset:]
+        replacement = [merged] if merged else []
+        self._pages[first:last + 1] = replacement
+        self._newlines[first:last + 1] = [None] * len(replacement)
+        self._changed()
+
+    def replace(self, start, end, text):
+        self.delete(start, end)
+        self.insert(start, text)
+
+    def set_text(self, text):
+        self._pages = []
+        self._newlines = []
+        self._changed()
+        self._recording = False
+        try:
+            self.append(text)
+        finally:
+            self._recording = True
+        self._undo, self._redo = [], []
+
+    # Undo
+
+    def _record(self, position, removed, inserted):
+        if not self._recording:
+            return
+        step = (position, removed, inserted)
+        self._redo = []
+        if self._group is not None:
+            self._group.append(step)
+            return
+        last = self._undo[-1] if self._undo else None
+        if last is not None and len(last) == 1 and self._continues(last[0], step):
+            last_position, last_removed, last_inserted = last[0]
+            if inserted:
+                last[0] = (last_position, '', last_inserted + inserted)
+            elif position + len(removed) == last_position:
+                # Backspace
+                last[0] = (position, removed + last_removed, '')
+            else:
+                # Delete key
+                last[0] = (last_position, last_removed + removed, '')
+            return
+        self._undo.append([step])
+        del self._undo[:-UNDO_LIMIT]
+
+    @staticmethod
+    def _continues(last, step):
+        """Whether step is the next character typed or erased after last"""
+        last_position, last_removed, last_inserted = last
+        position, removed, inserted = step
+        if len(inserted) + len(removed) != 1 or '\n' in inserted + removed:
+            return False
+        if inserted:
+            # A word at a time: typing after a space starts a new step
+            return (not last_removed and position == last_position + len(last_inserted)
+                    and not last_inserted[-1].isspace())
+        return not last_inserted and position in (last_position, last_position - 1)
+
+    @contextmanager
+    def grouped(self):
+        """Record the edits made in the block as one undo step"""
+        if self._group is not None:
+            yield
+            return
+        self._group = []
+        try:
+            yield
+        finally:
+            group, self._group = self._group, None
+            if group:
+                self._undo.append(group)
+                del self._undo[:-UNDO_LIMIT]
+
+    @property
+    def can_undo(self):
+        return bool(self._undo)
+
+    @property
+    def can_redo(self):
+        return bool(self._redo)
+
+    def _apply(self, steps):
+        self._recording = False
+        try:
+            for position, removed, inserted in steps:
+                self.delete(position, position + len(removed))
+                self.insert(position, inserted)
+        finally:
+            self._recording = True
+
+    def undo(self):
+        """Revert the last edit step; returns the position it happened at, or None"""
+        if not self._undo:
+            return None
+        group = self._undo.pop()
+        self._apply((position, inserted, removed) for position, removed, inserted in reversed(group))
+        self._redo.append(group)
+        position, removed, _ = group[0]
+        return position + len(removed)
+
+    def redo(self):
+        """Repeat the last undone step; returns the position after it, or None"""
+        if not self._redo:
+            return None
+        group = self._redo.pop()
+        self._apply(group)
+        self._undo.append(group)
+        position, _, inserted = group[-1]
+        return position + len(inserted)
+
+    def digest(self):
+        """sha256 of the text, computed page by page"""
+        digest = hashlib.sha256()
+        for page in self._pages:
+            digest.update(page.encode('utf-8'))
+        return digest.hexdigest()
+
+    def iter_blocks(self):
+        """Yield the text paragraph by paragraph, reading one page at a time.
+
+        Paragraphs are what split_into_chunks packs independently, so
+        chunking the blocks gives the same chunks as chunking the whole text.
+        Paragraphs over MAX_BLOCK_CHARS are cut at a sentence end.
+        """
+        for _, block in self._blocks():
+            yield block
+
+    def _blocks(self):
+        """(position, block) for iter_blocks()"""
+        carry = ''
+        # Document position of carry[0]
+        base = 0
+        for page in self._pages:
+            buffer = carry + page
+            start = 0
+            # Breaks inside the carried text were found already; one may
+            # start in its trailing whitespace though
+            for match in PARAGRAPH_BREAK.finditer(buffer, len(carry.rstrip())):
+                if match.end() == len(buffer):
+                    # The break may continue on the next page
+                    break
+                yield base + start, buffer[start:match.start()]
+                start = match.end()
+            carry = buffer[start:]
+            base += start
+            while len(carry) > MAX_BLOCK_CHARS:
+                cut = max((m.end() for m in SENTENCE_END.finditer(carry, 0, MAX_BLOCK_CHARS)), default=0)
+                if cut <= 0:
+                    cut = carry.rfind(' ', 0, MAX_BLOCK_CHARS) + 1 or MAX_BLOCK_CHARS
+                yield base, carry[:cut]
+                carry = carry[cut:]
+                base += cut
+        if carry:
+            yield base, carry
+
+    def chunks(self, max_chars=400):
+        """Sentence-aligned synthesis chunks, as split_into_chunks would give"""
+        return [chunk for _, chunk in self.chunk_positions(max_chars)]
+
+    def chunk_positions(self, max_chars=400):
+        """chunks() paired with the position of the paragraph each is from"""
+        chunks = []
+        for position, block in self._blocks():
+            chunks.extend((position, chunk) for chunk in split_into_chunks(block, max_chars))
+        return chunks
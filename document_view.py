@@ -0,0 +1,460 @@
+import bisect
+
+from PyQt5.QtCore import QEvent, Qt, QRect, pyqtSignal
+from PyQt5.QtGui import QKeySequence, QPainter, QPalette, QTextLayout, QTextOption
+from PyQt5.QtWidgets import QAbstractScrollArea, QApplication, QMenu
+
+from document import TextDocument
+
+
+class DocumentView(QAbstractScrollArea):
+    """Multi-line plain-text editor drawing straight from a TextDocument.
+
+    Nothing is copied into Qt: every paint reads only the lines in view
+    from the model, so a thousand-page document costs no more to show or
+    scroll than a single page. Lines are wrapped at the view's width, and
+    only the lines in view are laid out.
+
+    The scroll bar counts lines; a line taller than the view is scrolled
+    through a row at a time (wheel, keys), so the top of the view is a
+    (line, row) pair.
+    """
+
+    textChanged = pyqtSignal()
+    MARGIN = 6
+
+    def __init__(self, document=None, parent=None):
+        super().__init__(parent)
+        self._document = None
+        self._placeholder = ''
+        # Wrapped rows of the lines laid out: line -> (start, text, row starts)
+        self._layouts = {}
+        # Row of the top line at the top of the view
+        self._top_row = 0
+        self._keep_top_row = False
+        # Selection runs from anchor to cursor (character positions)
+        self.cursor = 0
+        self.anchor = 0
+        self._goal_column = None
+        self.setFocusPolicy(Qt.StrongFocus)
+        self.setAttribute(Qt.WA_InputMethodEnabled, True)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.viewport().setCursor(Qt.IBeamCursor)
+        self.setDocument(document or TextDocument())
+
+    def document(self):
+        return self._document
+
+    def setDocument(self, document):
+        if self._document is not None:
+            self._document.remove_listener(self._on_document_changed)
+        self._document = document
+        document.add_listener(self._on_document_changed)
+        self.cursor = self.anchor = 0
+        self._set_top(0, 0)
+        self._on_document_changed()
+
+    def setPlainText(self, text):
+        self._document.set_text(text)
+        self.cursor = self.anchor = 0
+
+    def setPlaceholderText(self, text):
+        self._placeholder = text
+        self.viewport().update()
+
+    def _on_document_changed(self):
+        self._layouts.clear()
+        self._update_scrollbars()
+        self.viewport().update()
+        self.textChanged.emit()
+
+    # Geometry
+
+    def _line_height(self):
+        return self.fontMetrics().lineSpacing()
+
+    def _visible_lines(self):
+        """Rows that fit in the view"""
+        return max(1, (self.viewport().height() - self.MARGIN) // self._line_height())
+
+    def _layout(self, line):
+        """(start, text, row starts) of a line wrapped at the view's width"""
+        layout = self._layouts.get(line)
+        if layout is None:
+            start = self._document.line_start(line)
+            # Tabs are drawn as single spaces so columns map to characters
+            text = self._document.text(start, self._document.line_end(line)).replace('\t', ' ')
+            text_layout = QTextLayout(text, self.font())
+            option = QTextOption()
+            option.setWrapMode(QTextOption.WrapAtWordBoundaryOrAnywhere)
+            text_layout.setTextOption(option)
+            width = max(1, self.viewport().width() - 2 * self.MARGIN)
+            starts = []
+            text_layout.beginLayout()
+            while True:
+                row = text_layout.createLine()
+                if not row.isValid():
+                    break
+                row.setLineWidth(width)
+                starts.append(row.textStart())
+            text_layout.endLayout()
+            layout = start, text, starts or [0]
+            if len(self._layouts) > 4 * self._visible_lines():
+                self._layouts.clear()
+            self._layouts[line] = layout
+        return layout
+
+    @staticmethod
+    def _row_text(layout, row):
+        _, text, starts = layout
+        end = starts[row + 1] if row + 1 < len(starts) else len(text)
+        return starts[row], text[starts[row]:end]
+
+    def _row_of(self, position):
+        """(line, row) holding a character position"""
+        line = self._document.line_of(position)
+        start, _, starts = self._layout(line)
+        return line, bisect.bisect_right(starts, position - start) - 1
+
+    def _step_rows(self, line, row, count):
+        """(line, row) count rows below (or above, when negative) a row"""
+        last_line = self._document.line_count - 1
+        while count > 0:
+            rows = len(self._layout(line)[2])
+            if row + count < rows or line >= last_line:
+                row = min(row + count, rows - 1)
+                break
+            count -= rows - row
+            line, row = line + 1, 0
+        while count < 0:
+            if row + count >= 0 or line <= 0:
+                row = max(0, row + count)
+                break
+            count += row + 1
+            line -= 1
+            row = len(self._layout(line)[2]) - 1
+        return line, row
+
+    def _rows_in_view(self):
+        """Yield (line, layout, row) for each row in view, top to bottom"""
+        line, row = self.verticalScrollBar().value(), self._top_row
+        shown = 0
+        # The last row may be cut off at the bottom
+        while shown <= self._visible_lines() and line < self._document.line_count:
+            layout = self._layout(line)
+            if row >= len(layout[2]):
+                line, row = line + 1, 0
+                continue
+            yield line, layout, row
+            row += 1
+            shown += 1
+
+    def visible_range(self):
+        """(start, end) character positions of the text in view"""
+        rows = list(self._rows_in_view())
+        if not rows:
+            return len(self._document), len(self._document)
+        _, (start, _, starts), row = rows[0]
+        _, layout, last_row = rows[-1]
+        offset, text = self._row_text(layout, last_row)
+        return start + starts[row], layout[0] + offset + len(text)
+
+    def _update_scrollbars(self):
+        vertical = self.verticalScrollBar()
+        # Any line may be scrolled to the top, as wrapped lines differ in height
+        vertical.setRange(0, max(0, self._document.line_count - 1))
+        vertical.setPageStep(self._visible_lines())
+
+    def _set_top(self, line, row):
+        self._keep_top_row = True
+        try:
+            self.verticalScrollBar().setValue(line)
+        finally:
+            self._keep_top_row = False
+        self._top_row = row
+        self.viewport().update()
+
+    def _scroll_rows(self, count):
+        self._set_top(*self._step_rows(self.verticalScrollBar().value(), self._top_row, count))
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self._layouts.clear()
+        self._top_row = min(self._top_row, len(self._layout(self.verticalScrollBar().value())[2]) - 1)
+        self._update_scrollbars()
+
+    def changeEvent(self, event):
+        super().changeEvent(event)
+        if event.type() == QEvent.FontChange:
+            self._layouts.clear()
+            self._update_scrollbars()
+
+    def scrollContentsBy(self, dx, dy):
+        # The scroll bar was moved by hand: show its line from the top
+        if not self._keep_top_row:
+            self._top_row = 0
+        self.viewport().update()
+
+    def wheelEvent(self, event):
+        steps = event.angleDelta().y() / 120
+        self._scroll_rows(-round(steps * QApplication.wheelScrollLines()))
+        event.accept()
+
+    def _position_at(self, point):
+        """Character position under a viewport point"""
+        rows = list(self._rows_in_view())
+        if not rows:
+            return len(self._document)
+        index = max(0, (point.y() - self.MARGIN) // self._line_height())
+        if index >= len(rows):
+            return self._document.line_end(rows[-1][0])
+        line, layout, row = rows[index]
+        offset, text = self._row_text(layout, row)
+        x = point.x() - self.MARGIN
+        metrics = self.fontMetrics()
+        low, high = 0, len(text)
+        if row + 1 < len(layout[2]):
+            # The end of a wrapped row is the start of the next one
+            high = max(0, high - 1)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if metrics.horizontalAdvance(text[:middle]) - metrics.horizontalAdvance(text[middle - 1]) / 2 <= x:
+                low = middle
+            else:
+                high = middle - 1
+        return layout[0] + offset + low
+
+    def _ensure_cursor_visible(self):
+        cursor = self._row_of(self.cursor)
+        top = (self.verticalScrollBar().value(), self._top_row)
+        if cursor < top:
+            self._set_top(*cursor)
+            return
+        visible = self._visible_lines()
+        for line, _, row in self._rows_in_view():
+            visible -= 1
+            if (line, row) == cursor and visible >= 0:
+                return
+        # Below the view: show the cursor's row at the bottom
+        self._set_top(*self._step_rows(*cursor, 1 - self._visible_lines()))
+
+    # Painting
+
+    def paintEvent(self, event):
+        painter = QPainter(self.viewport())
+        palette = self.palette()
+        metrics = self.fontMetrics()
+        height = metrics.lineSpacing()
+        document = self._document
+        left = self.MARGIN
+
+        if not len(document):
+            if self._placeholder:
+                painter.setPen(palette.color(QPalette.PlaceholderText))
+                painter.drawText(left, self.MARGIN + metrics.ascent(), self._placeholder)
+            if self.hasFocus():
+                painter.setPen(palette.color(QPalette.Text))
+                painter.drawLine(left, self.MARGIN, left, self.MARGIN + height)
+            return
+
+        selection_start, selection_end = sorted((self.anchor, self.cursor))
+        cursor_row = self._row_of(self.cursor)
+        for index, (line, layout, row) in enumerate(self._rows_in_view()):
+            offset, text = self._row_text(layout, row)
+            start = layout[0] + offset
+            last_row = row + 1 == len(layout[2])
+            top = self.MARGIN + index * height
+            baseline = top + metrics.ascent()
+            painter.setPen(palette.color(QPalette.Text))
+            painter.drawText(left, baseline, text)
+            if selection_start < selection_end and selection_start <= start + len(text) and selection_end > start:
+                a = max(selection_start, start) - start
+                b = min(selection_end, start + len(text)) - start
+                x = left + metrics.horizontalAdvance(text[:a])
+                width = metrics.horizontalAdvance(text[a:b])
+                if last_row and selection_end > start + len(text):
+                    # The selected line break
+                    width += metrics.horizontalAdvance(' ')
+                painter.fillRect(QRect(x, top, width, height), palette.highlight())
+                painter.setPen(palette.color(QPalette.HighlightedText))
+                painter.drawText(x, baseline, text[a:b])
+            if (line, row) == cursor_row and self.hasFocus():
+                x = left + metrics.horizontalAdvance(text[:self.cursor - start])
+                painter.setPen(palette.color(QPalette.Text))
+                painter.drawLine(x, top, x, top + height)
+
+    def focusInEvent(self, event):
+        super().focusInEvent(event)
+        self.viewport().update()
+
+    def focusOutEvent(self, event):
+        super().focusOutEvent(event)
+        self.viewport().update()
+
+    # Editing
+
+    def selected_range(self):
+        return tuple(sorted((self.anchor, self.cursor)))
+
+    def _move(self, position, extend=False, keep_column=False):
+        self.cursor = max(0, min(position, len(self._document)))
+        if not extend:
+            self.anchor = self.cursor
+        if not keep_column:
+            self._goal_column = None
+        self._ensure_cursor_visible()
+        self.viewport().update()
+
+    def _insert(self, text):
+        start, end = self.selected_range()
+        # Replacing a selection undoes in one step
+        with self._document.grouped():
+            if start != end:
+                self._document.delete(start, end)
+            self._document.insert(start, text)
+        self._move(start + len(text))
+
+    def _delete(self, start, end):
+        self._document.delete(start, end)
+        self._move(start)
+
+    def undo(self):
+        position = self._document.undo()
+        if position is not None:
+            self._move(position)
+
+    def redo(self):
+        position = self._document.redo()
+        if position is not None:
+            self._move(position)
+
+    def copy(self):
+        start, end = self.selected_range()
+        if start != end:
+            QApplication.clipboard().setText(self._document.text(start, end))
+
+    def cut(self):
+        start, end = self.selected_range()
+        if start != end:
+            self.copy()
+            self._delete(start, end)
+
+    def paste(self):
+        text = QApplication.clipboard().text()
+        if text:
+            self._insert(text)
+
+    def delete_selection(self):
+        start, end = self.selected_range()
+        if start != end:
+            self._delete(start, end)
+
+    def selectAll(self):
+        self.anchor = 0
+        self._move(len(self._document), extend=True)
+
+    def _move_lines(self, count, extend):
+        """Move the cursor count rows down (up when negative), keeping its column"""
+        line, row = self._row_of(self.cursor)
+        layout = self._layout(line)
+        if self._goal_column is None:
+            self._goal_column = self.cursor - layout[0] - layout[2][row]
+        line, row = self._step_rows(line, row, count)
+        layout = self._layout(line)
+        offset, text = self._row_text(layout, row)
+        # The end of a wrapped row is drawn at the start of the next one
+        longest = len(text) if row + 1 == len(layout[2]) else max(0, len(text) - 1)
+        self._move(layout[0] + offset + min(self._goal_column, longest), extend, keep_column=True)
+
+    def keyPressEvent(self, event):
+        document = self._document
+        key = event.key()
+        extend = bool(event.modifiers() & Qt.ShiftModifier)
+        control = bool(event.modifiers() & Qt.ControlModifier)
+        start, end = self.selected_range()
+        line = document.line_of(self.cursor)
+
+        if event.matches(QKeySequence.SelectAll):
+            self.selectAll()
+        elif event.matches(QKeySequence.Undo):
+            self.undo()
+        elif event.matches(QKeySequence.Redo):
+            self.redo()
+        elif event.matches(QKeySequence.Copy):
+            self.copy()
+        elif event.matches(QKeySequence.Cut):
+            self.cut()
+        elif event.matches(QKeySequence.Paste):
+            self.paste()
+        elif key == Qt.Key_Left:
+            self._move(start if start != end and not extend else self.cursor - 1, extend)
+        elif key == Qt.Key_Right:
+            self._move(end if start != end and not extend else self.cursor + 1, extend)
+        elif key == Qt.Key_Up:
+            self._move_lines(-1, extend)
+        elif key == Qt.Key_Down:
+            self._move_lines(1, extend)
+        elif key == Qt.Key_PageUp:
+            self._move_lines(-self._visible_lines(), extend)
+        elif key == Qt.Key_PageDown:
+            self._move_lines(self._visible_lines(), extend)
+        elif key == Qt.Key_Home:
+            self._move(0 if control else document.line_start(line), extend)
+        elif key == Qt.Key_End:
+            self._move(len(document) if control else document.line_end(line), extend)
+        elif key == Qt.Key_Backspace:
+            if start != end:
+                self._delete(start, end)
+            elif self.cursor > 0:
+                self._delete(self.cursor - 1, self.cursor)
+        elif key == Qt.Key_Delete:
+            if start != end:
+                self._delete(start, end)
+            else:
+                self._delete(self.cursor, self.cursor + 1)
+        elif key in (Qt.Key_Return, Qt.Key_Enter):
+            self._insert('\n')
+        elif key == Qt.Key_Tab:
+            self._insert('\t')
+        elif event.text() and event.text().isprintable() and not control:
+            self._insert(event.text())
+        else:
+            super().keyPressEvent(event)
+
+    def inputMethodEvent(self, event):
+        # Composed input (Japanese, Chinese, Korean) arrives here
+        if event.commitString():
+            self._insert(event.commitString())
+        event.accept()
+
+    def contextMenuEvent(self, event):
+        start, end = self.selected_range()
+        document = self._document
+        menu = QMenu(self)
+        for item in (
+            ("&Undo", self.undo, document.can_undo, QKeySequence.Undo),
+            ("&Redo", self.redo, document.can_redo, QKeySequence.Redo),
+            None,
+            ("Cu&t", self.cut, start != end, QKeySequence.Cut),
+            ("&Copy", self.copy, start != end, QKeySequence.Copy),
+            ("&Paste", self.paste, bool(QApplication.clipboard().text()), QKeySequence.Paste),
+            ("Delete", self.delete_selection, start != end, QKeySequence.Delete),
+            None,
+            ("Select &All", self.selectAll, len(document) > 0, QKeySequence.SelectAll),
+        ):
+            if item is None:
+                menu.addSeparator()
+                continue
+            label, slot, enabled, shortcut = item
+            action = menu.addAction(label, slot, QKeySequence(shortcut))
+            action.setEnabled(enabled)
+        menu.exec_(event.globalPos())
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.LeftButton:
+            self._move(self._position_at(event.pos()), bool(event.modifiers() & Qt.ShiftModifier))
+        super().mousePressEvent(event)
+
+    def mouseMoveEvent(self, event):
+        if event.buttons() & Qt.LeftButton:
+            self._move(self._position_at(event.pos()), extend=True)
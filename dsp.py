@@ -0,0 +1,233 @@
+import importlib.util
+import os
+
+from audio import PCMAudio
+from metrics import stage_metrics
+
+# Speech rate (words per minute) that a speed of 1.0 corresponds to; the
+# rate slider's default
+BASE_RATE = 150
+# Frames of this length are compared when finding silence
+SILENCE_FRAME_MS = 10
+# dBFS below which a frame is silence, and silence left at each end of a
+# trimmed chunk (so chunks still have a short pause between them)
+SILENCE_DBFS = -45.0
+KEEP_SILENCE_MS = 60
+# Steps that change audio beyond the requested rate; off unless named in
+# VOICIFY_POSTPROCESS (e.g. "loudness,trim")
+POST_STEPS = ('loudness', 'trim')
+
+_SAMPLE_TYPES = {1: 'u1', 2: '<i2', 4: '<i4'}
+
+
+def numpy_available():
+    # Found, not imported: NumPy is only loaded by the first PostProcessor
+    return importlib.util.find_spec('numpy') is not None
+
+
+def post_steps(value=None):
+    """Optional post-processing steps named in value (comma separated) or
+    VOICIFY_POSTPROCESS"""
+    if value is None:
+        value = os.environ.get('VOICIFY_POSTPROCESS', '')
+    steps = {step.strip().lower() for step in value.split(',') if step.strip()}
+    unknown = steps - set(POST_STEPS)
+    if unknown:
+        raise Exception(f"Unknown post-processing step: {', '.join(sorted(unknown))}")
+    return tuple(step for step in POST_STEPS if step in steps)
+
+
+def plan_post(rate=None, steps=()):
+    """PostProcessor for a conversion, or None when it would change nothing
+    or NumPy is missing. rate is reached by time-stretching (None for a
+    backend with a rate of its own); steps are names from POST_STEPS."""
+    if not numpy_available():
+        return None
+    post = PostProcessor.for_rate(rate, loudness_dbfs=-20.0 if 'loudness' in steps else None,
+                                  trim='trim' in steps)
+    return post if post.active else None
+
+
+def to_array(pcm):
+    """PCM as a float32 array of shape (frames, channels) in [-1, 1]"""
+    import numpy as np
+
+    if pcm.sample_width not in _SAMPLE_TYPES:
+        raise Exception(f"Unsupported sample width: {pcm.sample_width}")
+    samples = np.frombuffer(pcm.data, dtype=_SAMPLE_TYPES[pcm.sample_width], count=pcm.frame_count * pcm.channels)
+    samples = samples.astype(np.float32)
+    if pcm.sample_width == 1:
+        samples -= 128.0
+    samples /= float(1 << (8 * pcm.sample_width - 1))
+    return samples.reshape(-1, pcm.channels)
+
+
+def from_array(samples, like):
+    """float array -> PCMAudio in the format of `like`, clipping overs"""
+    import numpy as np
+
+    scale = float(1 << (8 * like.sample_width - 1))
+    samples = np.clip(samples, -1.0, (scale - 1) / scale) * scale
+    if like.sample_width == 1:
+        samples += 128.0
+    data = np.rint(samples).astype(_SAMPLE_TYPES[like.sample_width]).tobytes()
+    return PCMAudio(data, like.sample_rate, like.channels, like.sample_width)
+
+
+def _frame_levels(samples, frame):
+    """dBFS of consecutive frames (the last, partial frame included)"""
+    import numpy as np
+
+    power = np.square(samples).mean(axis=1)
+    starts = np.arange(0, len(power), frame)
+    energy = np.add.reduceat(power, starts) if len(power) else np.zeros(0)
+    counts = np.minimum(frame, len(power) - starts)
+    return 10 * np.log10(np.maximum(energy / counts, 1e-12))
+
+
+def trim_silence(samples, sample_rate, threshold_dbfs=SILENCE_DBFS, keep_ms=KEEP_SILENCE_MS):
+    """Drop leading and trailing silence, keeping keep_ms of it at each end"""
+    import numpy as np
+
+    frame = max(1, sample_rate * SILENCE_FRAME_MS // 1000)
+    loud = np.flatnonzero(_frame_levels(samples, frame) > threshold_dbfs)
+    if not len(loud):
+        return samples[:0]
+    keep = sample_rate * keep_ms // 1000
+    start = max(0, loud[0] * frame - keep)
+    end = min(len(samples), (loud[-1] + 1) * frame + keep)
+    return samples[start:end]
+
+
+def loudness_gains(chunks, sample_rate, target_dbfs=-20.0, peak_dbfs=-1.0):
+    """Gain per chunk that brings its speech to target_dbfs.
+
+    Loudness is the RMS of the frames above the silence threshold, so pauses
+    do not pull it down. All chunks are measured in one pass over their
+    concatenation; gains are capped so no peak exceeds peak_dbfs.
+    """
+    import numpy as np
+
+    if not chunks:
+        return np.zeros(0, dtype=np.float32)
+    frame = max(1, sample_rate * SILENCE_FRAME_MS // 1000)
+    lengths = np.array([len(chunk) for chunk in chunks])
+    joined = np.concatenate(chunks) if len(chunks) > 1 else chunks[0]
+    power = np.square(joined).mean(axis=1)
+
+    # Frames never straddle chunks: each chunk's frames start at its offset
+    offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    frame_starts = np.concatenate([offset + np.arange(0, length, frame) for offset, length in zip(offsets, lengths)])
+    frame_chunk = np.repeat(np.arange(len(chunks)), (lengths + frame - 1) // frame)
+    valid = frame_starts < len(power)
+    frame_starts, frame_chunk = frame_starts[valid], frame_chunk[valid]
+    frame_ends = np.append(frame_starts[1:], len(power))
+    frame_power = np.add.reduceat(power, frame_starts) / (frame_ends - frame_starts) if len(frame_starts) else power[:0]
+
+    voiced = frame_power > 10 ** (SILENCE_DBFS / 10)
+    voiced_power = np.bincount(frame_chunk, weights=np.where(voiced, frame_power, 0.0), minlength=len(chunks))
+    voiced_frames = np.bincount(frame_chunk, weights=voiced, minlength=len(chunks))
+    rms = np.sqrt(voiced_power / np.maximum(voiced_frames, 1))
+
+    peaks = np.array([np.abs(chunk).max() if len(chunk) else 0.0 for chunk in chunks])
+    gains = np.where(rms > 0, 10 ** (target_dbfs / 20) / np.maximum(rms, 1e-12), 1.0)
+    gains = np.minimum(gains, 10 ** (peak_dbfs / 20) / np.maximum(peaks, 1e-12))
+    # Silent chunks stay as they are
+    return np.where(voiced_frames > 0, gains, 1.0).astype(np.float32)
+
+
+def time_stretch(samples, sample_rate, speed, frame_ms=30, tolerance_ms=10):
+    """Change tempo by `speed` without changing pitch (WSOLA).
+
+    The output is built from overlapping, Hann-windowed frames taken at
+    `speed` times the output hop. Each frame is shifted by up to
+    tolerance_ms to the position whose waveform best matches the natural
+    continuation of the previous frame, so overlaps add up in phase. The
+    loop runs once per frame; correlation and overlap-add are array
+    operations.
+    """
+    import numpy as np
+
+    if abs(speed - 1.0) < 1e-3 or not len(samples):
+        return samples
+    length = max(4, sample_rate * frame_ms // 1000 // 2 * 2)
+    hop = length // 2
+    tolerance = sample_rate * tolerance_ms // 1000
+    # Periodic Hann: overlapping halves sum to exactly one
+    window = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(length) / length)).astype(np.float32)[:, None]
+
+    out_length = int(len(samples) / speed)
+    frames = out_length // hop + 1
+    pad_end = length + 2 * tolerance + int(hop * speed) + 1
+    padded = np.pad(samples, ((tolerance, pad_end), (0, 0)))
+    # Alignment is found on the channel mix
+    mono = padded.mean(axis=1)
+    out = np.zeros((frames * hop + length, samples.shape[1]), dtype=np.float32)
+
+    delta = 0
+    for k in range(frames):
+        nominal = int(k * hop * speed) + tolerance
+        position = nominal + delta
+        out[k * hop:k * hop + length] += padded[position:position + length] * window
+        template = mono[position + hop:position + hop + length]
+        following = int((k + 1) * hop * speed) + tolerance
+        region = mono[following - tolerance:following + tolerance + length]
+        if len(region) < len(template) + 2 * tolerance or len(template) < length:
+            break
+        delta = int(np.argmax(np.correlate(region, template, mode='valid'))) - tolerance
+    return out[:out_length]
+
+
+class PostProcessor:
+    """Vectorized processing of synthesized speech chunks (needs NumPy).
+
+    speed time-stretches chunks so speech rate works for backends that have
+    no rate of their own; loudness_dbfs brings every chunk to one speech
+    loudness; trim drops leading and trailing silence. Only the speed is on
+    by default. process() handles
+    one chunk (streaming); process_batch() measures and processes a whole
+    document's chunks at once, with the same result.
+    """
+
+    def __init__(self, speed=1.0, loudness_dbfs=None, trim=False):
+        self.speed = speed
+        self.loudness_dbfs = loudness_dbfs
+        self.trim = trim
+
+    @classmethod
+    def for_rate(cls, rate=None, **settings):
+        return cls(speed=(rate or BASE_RATE) / BASE_RATE, **settings)
+
+    @property
+    def active(self):
+        return abs(self.speed - 1.0) >= 1e-3 or self.loudness_dbfs is not None or self.trim
+
+    def settings(self):
+        return {'speed': self.speed, 'loudness_dbfs': self.loudness_dbfs, 'trim': self.trim}
+
+    def key(self):
+        """Identity of the settings, for cache keys of processed results"""
+        return f"dsp:{self.speed:.4g}:{self.loudness_dbfs}:{int(self.trim)}"
+
+    def process(self, pcm):
+        return self.process_batch([pcm])[0]
+
+    def process_batch(self, pcms):
+        if not pcms:
+            return []
+        with stage_metrics.stage('postprocess', sum(len(pcm.data) for pcm in pcms)) as stage:
+            processed = self._process_batch(pcms)
+            stage.bytes_out = sum(len(pcm.data) for pcm in processed)
+        return processed
+
+    def _process_batch(self, pcms):
+        chunks = [to_array(pcm) for pcm in pcms]
+        sample_rate = pcms[0].sample_rate
+        if self.trim:
+            chunks = [trim_silence(chunk, pcm.sample_rate) for chunk, pcm in zip(chunks, pcms)]
+        if self.loudness_dbfs is not None:
+            gains = loudness_gains(chunks, sample_rate, self.loudness_dbfs)
+            chunks = [chunk * gain for chunk, gain in zip(chunks, gains)]
+        if abs(self.speed - 1.0) >= 1e-3:
+            chunks = [time_stretch(chunk, pcm.sample_rate, self.speed) for chunk, pcm in zip(chunks, pcms)]
+        return [from_array(chunk, pcm) for chunk, pcm in zip(chunks, pcms)]
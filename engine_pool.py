@@ -0,0 +1,130 @@
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Set in each worker process by _init_worker
+_worker_backend = None
+_worker_config = None
+_worker_error = None
+
+
+def _init_worker(backend_name, voice_id, rate):
+    """Start the engine once per process and bind it to one configuration"""
+    global _worker_backend, _worker_config, _worker_error
+    from backends import get_backend
+
+    try:
+        # A fresh instance, never the registered one: under fork that would
+        # carry any engine the parent had started
+        _worker_backend = type(get_backend(backend_name))()
+        _worker_config = (voice_id, rate)
+        _worker_backend.configure(voice_id, rate)
+    except Exception as e:
+        # A failing initializer breaks the whole pool without a message, so
+        # the error is kept and raised by the first render instead
+        _worker_error = str(e)
+
+
+def _render(text, lang_code):
+    if _worker_error:
+        raise Exception(_worker_error)
+    voice_id, rate = _worker_config
+    return _worker_backend.render(text, lang_code, voice_id, rate)
+
+
+def _ready():
+    return os.getpid()
+
+
+class EnginePool:
+    """Warm speech engines in worker processes, one per process.
+
+    Every process is bound to a single (voice, rate) configuration when it
+    starts, so renders never change engine properties. Renders go to the
+    processes of their configuration, up to processes_per_config at a time;
+    a configuration without processes gets new ones, retiring the least
+    recently used configuration when max_processes would be exceeded.
+    """
+
+    def __init__(self, backend_name='pyttsx3', max_processes=None, processes_per_config=2):
+        self.backend_name = backend_name
+        self.max_processes = max(1, max_processes or os.cpu_count() or 1)
+        self.processes_per_config = max(1, min(processes_per_config, self.max_processes))
+        self._executors = OrderedDict()
+        self._lock = threading.Lock()
+        self.warm_hits = 0
+        self.cold_starts = 0
+        self.retired = 0
+
+    def _executor_for(self, voice_id, rate):
+        config = (voice_id, rate)
+        with self._lock:
+            executor = self._executors.get(config)
+            if executor is not None:
+                self._executors.move_to_end(config)
+                self.warm_hits += 1
+                return executor
+            while self._executors and (len(self._executors) + 1) * self.processes_per_config > self.max_processes:
+                # Renders already running on a retired configuration finish
+                _, retired = self._executors.popitem(last=False)
+                retired.shutdown(wait=False)
+                self.retired += 1
+            executor = ProcessPoolExecutor(
+                max_workers=self.processes_per_config,
+                # Forking a process that runs Qt and other threads can copy
+                # locks held at that moment; spawned workers start clean
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(self.backend_name, voice_id, rate),
+            )
+            self._executors[config] = executor
+            self.cold_starts += 1
+            return executor
+
+    def _discard(self, voice_id, rate, executor):
+        with self._lock:
+            if self._executors.get((voice_id, rate)) is executor:
+                del self._executors[(voice_id, rate)]
+        executor.shutdown(wait=False)
+
+    def warm(self, voice_id=None, rate=None):
+        """Start a process for a configuration ahead of its first render"""
+        return self._executor_for(voice_id, rate).submit(_ready)
+
+    def render(self, text, lang_code, voice_id=None, rate=None):
+        executor = self._executor_for(voice_id, rate)
+        try:
+            try:
+                future = executor.submit(_render, text, lang_code)
+            except RuntimeError:
+                # Retired by another thread between lookup and submit
+                executor = self._executor_for(voice_id, rate)
+                future = executor.submit(_render, text, lang_code)
+            return future.result()
+        except BrokenProcessPool:
+            # The engine process died; the next render starts a fresh one
+            self._discard(voice_id, rate, executor)
+            raise Exception("Speech engine process exited unexpectedly")
+
+    def stats(self):
+        with self._lock:
+            configs = list(self._executors)
+        return {
+            'backend': self.backend_name,
+            'configurations': len(configs),
+            'max_processes': self.max_processes,
+            'processes_per_config': self.processes_per_config,
+            'warm_hits': self.warm_hits,
+            'cold_starts': self.cold_starts,
+            'retired': self.retired,
+        }
+
+    def shutdown(self, wait=False):
+        with self._lock:
+            executors = list(self._executors.values())
+            self._executors.clear()
+        for executor in executors:
+            executor.shutdown(wait=wait, cancel_futures=True)
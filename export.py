@@ -0,0 +1,175 @@
+import os
+import shutil
+import subprocess
+import wave
+
+from audio import MappedAudio, PCMAudio
+from metrics import stage_metrics
+from workspace import scratch_path
+
+# PCM sample width in bytes -> ffmpeg raw sample format
+RAW_FORMATS = {1: 'u8', 2: 's16le', 4: 's32le'}
+
+# Frames handed to the writer per block while streaming an export
+BLOCK_FRAMES = 32768
+
+
+class ExportProfile:
+    """Output format for saved audio.
+
+    sample_rate/channels of None keep the source's values. Profiles with
+    codec_args are encoded by piping PCM blocks through ffmpeg; plain WAV at
+    the source format is written directly.
+    """
+
+    def __init__(self, name, label, extension, codec_args=None, sample_rate=None, channels=None):
+        self.name = name
+        self.label = label
+        self.extension = extension
+        self.codec_args = codec_args
+        self.sample_rate = sample_rate
+        self.channels = channels
+
+    @property
+    def file_filter(self):
+        return f"{self.label} (*{self.extension})"
+
+    def needs_ffmpeg(self, params):
+        channels, _, sample_rate = params
+        return (self.codec_args is not None
+                or (self.sample_rate is not None and self.sample_rate != sample_rate)
+                or (self.channels is not None and self.channels != channels))
+
+
+EXPORT_PROFILES = {
+    profile.name: profile for profile in [
+        ExportProfile('wav', "WAV (original quality)", '.wav'),
+        ExportProfile('mp3', "MP3 128 kbps", '.mp3', ['-c:a', 'libmp3lame', '-b:a', '128k']),
+        ExportProfile('opus', "Ogg/Opus 48 kbps", '.ogg', ['-c:a', 'libopus', '-b:a', '48k']),
+        ExportProfile('flac', "FLAC (lossless)", '.flac', ['-c:a', 'flac']),
+        ExportProfile('speech_wav', "WAV speech (16 kHz mono)", '.wav', ['-c:a', 'pcm_s16le'], 16000, 1),
+        ExportProfile('speech_mp3', "MP3 speech (22 kHz mono, 48 kbps)", '.mp3',
+                      ['-c:a', 'libmp3lame', '-b:a', '48k'], 22050, 1),
+        ExportProfile('speech_opus', "Ogg/Opus speech (16 kHz mono, 24 kbps)", '.ogg',
+                      ['-c:a', 'libopus', '-b:a', '24k', '-application', 'voip'], 16000, 1),
+    ]
+}
+
+
+def profile_for_filter(file_filter):
+    for profile in EXPORT_PROFILES.values():
+        if profile.file_filter == file_filter:
+            return profile
+    return EXPORT_PROFILES['wav']
+
+
+def source_params(source):
+    """(channels, sample_width, sample_rate) of a PCMAudio or WAV path"""
+    if isinstance(source, PCMAudio):
+        return source.params
+    mapped = MappedAudio(source)
+    mapped.close()
+    return mapped.params
+
+
+def pcm_blocks(source, block_frames=BLOCK_FRAMES):
+    """Yield raw PCM blocks from a PCMAudio or a WAV path, as zero-copy
+    views (a WAV file is memory-mapped)"""
+    if isinstance(source, PCMAudio):
+        view = memoryview(source.data)
+        step = block_frames * source.channels * source.sample_width
+        for start in range(0, len(view), step):
+            yield view[start:start + step]
+        return
+    mapped = MappedAudio(source)
+    try:
+        yield from pcm_blocks(mapped, block_frames)
+    finally:
+        mapped.close()
+
+
+def ffmpeg_binary():
+    try:
+        from pydub import AudioSegment
+        if AudioSegment.converter:
+            return AudioSegment.converter
+    except ImportError:
+        pass
+    return shutil.which('ffmpeg') or 'ffmpeg'
+
+
+def export_audio(source, output_path, profile):
+    """Encode source (PCMAudio or WAV path) to output_path using profile.
+
+    Audio is streamed block by block to the writer or encoder, so no second
+    full-size copy is built in memory. The output appears atomically.
+    """
+    if isinstance(profile, str):
+        profile = EXPORT_PROFILES[profile]
+    params = source_params(source)
+    channels, sample_width, sample_rate = params
+    # Keeps the extension, which ffmpeg picks the container from
+    tmp_path = scratch_path(output_path) + profile.extension
+
+    try:
+        # WAV at the source format is only written; everything else is encoded
+        stage = 'encode' if profile.needs_ffmpeg(params) else 'write'
+        with stage_metrics.stage(stage) as measurement:
+            if stage == 'write':
+                with wave.open(tmp_path, 'wb') as out:
+                    out.setnchannels(channels)
+                    out.setsampwidth(sample_width)
+                    out.setframerate(sample_rate)
+                    for block in pcm_blocks(source):
+                        measurement.bytes_in += len(block)
+                        out.writeframes(block)
+            else:
+                measurement.bytes_in = _encode_with_ffmpeg(source, tmp_path, profile, params)
+            measurement.bytes_out = os.path.getsize(tmp_path)
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return output_path
+
+
+def _encode_with_ffmpeg(source, output_path, profile, params):
+    channels, sample_width, sample_rate = params
+    if sample_width not in RAW_FORMATS:
+        raise Exception(f"Unsupported sample width: {sample_width}")
+
+    command = [
+        ffmpeg_binary(), '-y', '-loglevel', 'error',
+        '-f', RAW_FORMATS[sample_width], '-ar', str(sample_rate), '-ac', str(channels), '-i', 'pipe:0',
+    ]
+    if profile.sample_rate:
+        command += ['-ar', str(profile.sample_rate)]
+    if profile.channels:
+        command += ['-ac', str(profile.channels)]
+    command += list(profile.codec_args or [])
+    command += ['-f', _container_for(profile), output_path]
+
+    try:
+        process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                   stderr=subprocess.PIPE)
+    except OSError as e:
+        raise Exception(f"ffmpeg is required to export {profile.label}: {str(e)}")
+
+    written = 0
+    try:
+        for block in pcm_blocks(source):
+            process.stdin.write(block)
+            written += len(block)
+    except BrokenPipeError:
+        pass
+    finally:
+        process.stdin.close()
+    errors = process.stderr.read().decode('utf-8', 'replace').strip()
+    process.stderr.close()
+    if process.wait() != 0:
+        raise Exception(f"ffmpeg failed to encode {profile.label}: {errors or process.returncode}")
+    return written
+
+
+def _container_for(profile):
+    return {'.wav': 'wav', '.mp3': 'mp3', '.ogg': 'ogg', '.flac': 'flac'}[profile.extension]
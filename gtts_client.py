@@ -0,0 +1,280 @@
+import base64
+import http.client
+import os
+import queue
+import random
+import re
+import threading
+import time
+import urllib.parse
+from collections import deque
+
+from audio import join_encoded
+
+DEFAULT_BASE_URL = 'https://translate.google.com'
+# How gTTS reads the audio out of a response; it has no function for it
+AUDIO_PATTERN = re.compile(r'jQ1olc","\[\\"(.*)\\"]')
+
+
+class GTTSError(Exception):
+    """A request failed; retryable errors were already retried"""
+
+    def __init__(self, message, status=None, retryable=False, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+def prepare_requests(text, lang_code, slow=False):
+    """(path, body, headers) of the requests gTTS would send for text.
+
+    gTTS splits the text, packages each part and sets the headers, so
+    endpoint changes are picked up by upgrading it; only sending is done
+    here.
+    """
+    from gtts import gTTS
+
+    try:
+        requests = gTTS(text, lang=lang_code, slow=slow, lang_check=False)._prepare_requests()
+    except AssertionError:
+        # Only punctuation, which gTTS cleans away
+        raise GTTSError("No text to speak")
+    prepared = []
+    for request in requests:
+        parts = urllib.parse.urlsplit(request.url)
+        body = request.body.encode('utf-8') if isinstance(request.body, str) else request.body
+        # http.client sets Content-Length for the body it sends
+        headers = {name: value for name, value in request.headers.items() if name.lower() != 'content-length'}
+        prepared.append((parts.path + (f'?{parts.query}' if parts.query else ''), body, headers))
+    return prepared
+
+
+def parse_audio(body):
+    """MP3 bytes from a batchexecute response"""
+    match = AUDIO_PATTERN.search(body.decode('utf-8', 'replace'))
+    if match:
+        return base64.b64decode(match.group(1).encode('ascii'))
+    raise GTTSError("No audio stream in response")
+
+
+class TokenBucket:
+    """Request rate limiter that backs off when the server throttles.
+
+    Tokens refill at `rate` per second up to `capacity`. A 429 halves the
+    rate and stops all requests until the server's Retry-After has passed;
+    every success then wins back a small step, up to the configured rate.
+    """
+
+    def __init__(self, rate=10.0, capacity=10, min_rate=0.5):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.paused_until = 0.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may be sent; returns the seconds waited"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = max(self.paused_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(delay)
+            waited += delay
+
+    def throttled(self, retry_after=None):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = 0.0
+            if retry_after:
+                self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+
+    def succeeded(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+class ConnectionPool:
+    """Keep-alive HTTP(S) connections to one host, reused across threads"""
+
+    def __init__(self, base_url, maxsize=4, timeout=15.0):
+        parts = urllib.parse.urlsplit(base_url)
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port
+        self.prefix = parts.path.rstrip('/')
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize)
+        self._lock = threading.Lock()
+        self.opened = 0
+
+    def _connect(self):
+        with self._lock:
+            self.opened += 1
+        if self.scheme == 'https':
+            return http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def request(self, method, path, body=None, headers=None):
+        """Send a request and return (status, headers, body)"""
+        try:
+            connection = self._idle.get_nowait()
+            reused = True
+        except queue.Empty:
+            connection = self._connect()
+            reused = False
+        try:
+            connection.request(method, self.prefix + path, body=body, headers=headers or {})
+            response = connection.getresponse()
+            data = response.read()
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            connection.close()
+            if not reused:
+                raise
+            # The server closed an idle keep-alive connection; use a new one
+            return self.request(method, path, body, headers)
+        except Exception:
+            connection.close()
+            raise
+        if response.will_close:
+            connection.close()
+        else:
+            try:
+                self._idle.put_nowait(connection)
+            except queue.Full:
+                connection.close()
+        return response.status, dict(response.getheaders()), data
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class GTTSClient:
+    """Google Translate speech client with pooling, retries and rate limiting.
+
+    Requests are built by gTTS, which splits texts longer than the
+    endpoint's limit into several; their audio is joined. Up to max_concurrency requests are in flight at once
+    over pooled keep-alive connections. Throttling (429), server errors and
+    network failures are retried with jittered exponential backoff.
+
+    base_url defaults to VOICIFY_GTTS_URL or the real endpoint, so tests and
+    benchmarks can point the client at a local stand-in server; rate
+    (requests per second) defaults to VOICIFY_GTTS_RATE or 10.
+    """
+
+    def __init__(self, base_url=None, max_concurrency=4, max_retries=4, backoff_base=0.5,
+                 backoff_max=8.0, rate=None, timeout=15.0):
+        self.base_url = base_url or os.environ.get('VOICIFY_GTTS_URL') or DEFAULT_BASE_URL
+        rate = rate or float(os.environ.get('VOICIFY_GTTS_RATE') or 10.0)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.pool = ConnectionPool(self.base_url, max_concurrency, timeout)
+        self.bucket = TokenBucket(rate, capacity=max_concurrency)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        # Latencies of the most recent successful requests
+        self._latencies = deque(maxlen=1000)
+        self.requests = 0
+        self.failures = 0
+        self.retries = 0
+        self.throttled = 0
+        self.rate_limit_wait_seconds = 0.0
+
+    def synthesize(self, text, lang_code, slow=False):
+        """Return MP3 (or whatever the server sends) for text"""
+        return join_encoded([self._request(*request) for request in prepare_requests(text, lang_code, slow)])
+
+    def _request(self, path, body, headers):
+        attempt = 0
+        while True:
+            try:
+                return self._send(path, body, headers)
+            except GTTSError as e:
+                if not e.retryable or attempt >= self.max_retries:
+                    with self._lock:
+                        self.failures += 1
+                    raise
+                delay = self._backoff(attempt)
+                if e.retry_after:
+                    delay = max(delay, e.retry_after)
+            attempt += 1
+            with self._lock:
+                self.retries += 1
+            time.sleep(delay)
+
+    def _backoff(self, attempt):
+        # "Full jitter": spreads retries of concurrent requests apart
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _send(self, path, body, headers):
+        with self._slots:
+            waited = self.bucket.acquire()
+            started = time.perf_counter()
+            try:
+                status, headers, data = self.pool.request('POST', path, body, headers)
+            except (OSError, http.client.HTTPException) as e:
+                raise GTTSError(f"connection failed: {e}", retryable=True)
+            latency = time.perf_counter() - started
+        with self._lock:
+            self.requests += 1
+            self.rate_limit_wait_seconds += waited
+        if status == 429:
+            retry_after = _retry_after(headers)
+            with self._lock:
+                self.throttled += 1
+            self.bucket.throttled(retry_after)
+            raise GTTSError("429 (Too Many Requests) from TTS API", status, True, retry_after)
+        if status >= 500:
+            raise GTTSError(f"{status} from TTS API", status, True)
+        if status != 200:
+            raise GTTSError(f"{status} from TTS API", status)
+        audio = parse_audio(data)
+        self.bucket.succeeded()
+        with self._lock:
+            self._latencies.append(latency)
+        return audio
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            stats = {
+                'requests': self.requests,
+                'failures': self.failures,
+                'retries': self.retries,
+                'throttled': self.throttled,
+                'rate_limit_wait_seconds': round(self.rate_limit_wait_seconds, 4),
+                'connections_opened': self.pool.opened,
+                'current_rate': round(self.bucket.rate, 3),
+            }
+        if latencies:
+            stats['latency_p50'] = round(latencies[len(latencies) // 2], 4)
+            stats['latency_p95'] = round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 4)
+            stats['latency_max'] = round(latencies[-1], 4)
+        return stats
+
+    def close(self):
+        self.pool.close()
+
+
+def _retry_after(headers):
+    for name, value in headers.items():
+        if name.lower() == 'retry-after':
+            try:
+                return float(value)
+            except ValueError:
+                return None
+    return None
@@ -0,0 +1,130 @@
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, job_id, description="", on_progress=None):
+        self.id = job_id
+        self.description = description
+        self.progress = 0
+        self.future = None
+        self._on_progress = on_progress
+        self._cancel_event = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def cancel(self):
+        self._cancel_event.set()
+        # Jobs that have not started yet are dropped straight from the queue
+        if self.future is not None:
+            self.future.cancel()
+
+    def check_cancelled(self):
+        """Raise JobCancelled if cancel() has been requested"""
+        if self._cancel_event.is_set():
+            raise JobCancelled(f"Job {self.id} was cancelled")
+
+    def report(self, value):
+        """Record progress (0-100) and notify the listener"""
+        self.check_cancelled()
+        self.progress = max(0, min(100, int(value)))
+        if self._on_progress:
+            self._on_progress(self.id, self.progress)
+
+
+class JobManager:
+    """Runs conversions as jobs on a worker pool.
+
+    Work submitted without a lane shares a thread pool of max_workers threads.
+    Work submitted with a lane name runs on a dedicated single thread for that
+    lane, for engines that must only ever be driven from one thread.
+    """
+
+    def __init__(self, max_workers=4):
+        self.max_workers = max_workers
+        self.jobs = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tts-job")
+        self._lanes = {}
+
+    def _executor_for(self, lane):
+        if lane is None:
+            return self._pool
+        with self._lock:
+            if lane not in self._lanes:
+                self._lanes[lane] = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"tts-{lane}")
+            return self._lanes[lane]
+
+    def submit(self, fn, *args, description="", lane=None,
+               on_progress=None, on_finished=None, on_failed=None, on_cancelled=None, **kwargs):
+        """Queue fn(job, *args, **kwargs) and return its Job.
+
+        Callbacks run on the worker thread; GUI code must marshal them back to
+        its own thread (e.g. through Qt signals).
+        """
+        job = Job(next(self._ids), description, on_progress)
+
+        def run():
+            try:
+                job.check_cancelled()
+                result = fn(job, *args, **kwargs)
+                job.check_cancelled()
+            except JobCancelled:
+                if on_cancelled:
+                    on_cancelled(job.id)
+                raise
+            except Exception as e:
+                if on_failed:
+                    on_failed(job.id, str(e))
+                raise
+            finally:
+                with self._lock:
+                    self.jobs.pop(job.id, None)
+            if on_finished:
+                on_finished(job.id, result)
+            return result
+
+        with self._lock:
+            self.jobs[job.id] = job
+        job.future = self._executor_for(lane).submit(run)
+
+        def dropped(future):
+            # A job cancelled while still queued never enters run()
+            if future.cancelled():
+                with self._lock:
+                    self.jobs.pop(job.id, None)
+                if on_cancelled:
+                    on_cancelled(job.id)
+
+        job.future.add_done_callback(dropped)
+        return job
+
+    def cancel(self, job_id):
+        with self._lock:
+            job = self.jobs.get(job_id)
+        if job is not None:
+            job.cancel()
+
+    def cancel_all(self):
+        with self._lock:
+            jobs = list(self.jobs.values())
+        for job in jobs:
+            job.cancel()
+
+    def active_count(self):
+        with self._lock:
+            return len(self.jobs)
+
+    def shutdown(self, wait=False):
+        self.cancel_all()
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+        for executor in self._lanes.values():
+            executor.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,153 @@
+import json
+import os
+import threading
+import time
+
+from workspace import scratch_path
+
+JOURNAL_VERSION = 1
+# Unfinished conversions are offered for resuming this long, and only the
+# most recent ones; older journals are deleted
+MAX_AGE_SECONDS = 7 * 24 * 3600
+MAX_PENDING = 5
+
+
+class JobJournal:
+    """On-disk record of a conversion, kept until it completes, is
+    cancelled by the user or expires (see pending()).
+
+    <key>.json holds the plan: the conversion settings and the chunk texts.
+    <key>.log gets one line per finished chunk. A conversion that was
+    interrupted (crash, cancel, engine failure) can be resumed from the plan
+    alone. Finished chunks are taken from the audio cache, so only the
+    missing ones are synthesized. The log is for reporting progress; a chunk
+    whose cache entry is lost is simply rendered again.
+    """
+
+    def __init__(self, directory, key, description="", lang_code=None, backend=None,
+                 voice_id=None, rate=None, chunks=None, post=None):
+        self.directory = directory
+        self.key = key
+        self.description = description
+        self.lang_code = lang_code
+        self.backend = backend
+        self.voice_id = voice_id
+        self.rate = rate
+        self.chunks = chunks
+        # PostProcessor settings, if any
+        self.post = post
+        self.completed = set()
+        self._lock = threading.Lock()
+
+    @property
+    def plan_path(self):
+        return os.path.join(self.directory, f'{self.key}.json')
+
+    @property
+    def log_path(self):
+        return os.path.join(self.directory, f'{self.key}.log')
+
+    @property
+    def remaining(self):
+        return len(self.chunks or ()) - len(self.completed)
+
+    def begin(self, chunks):
+        """Record the chunk plan; keeps the progress of an earlier run of the same plan"""
+        with self._lock:
+            if self.chunks != chunks:
+                self.chunks = list(chunks)
+                self.completed = set()
+                os.makedirs(self.directory, exist_ok=True)
+                tmp_path = scratch_path(self.plan_path)
+                with open(tmp_path, 'w', encoding='utf-8') as file:
+                    json.dump({
+                        'version': JOURNAL_VERSION,
+                        'key': self.key,
+                        'description': self.description,
+                        'lang_code': self.lang_code,
+                        'backend': self.backend,
+                        'voice_id': self.voice_id,
+                        'rate': self.rate,
+                        'post': self.post,
+                        'chunks': self.chunks,
+                    }, file, ensure_ascii=False)
+                os.replace(tmp_path, self.plan_path)
+                # A stale log would belong to a different plan
+                open(self.log_path, 'w').close()
+
+    def chunk_done(self, index):
+        with self._lock:
+            if index in self.completed:
+                return
+            self.completed.add(index)
+            with open(self.log_path, 'a') as log:
+                log.write(f'{index}\n')
+
+    def finish(self):
+        """The conversion completed; forget it"""
+        for path in (self.plan_path, self.log_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    @classmethod
+    def load(cls, directory, key):
+        """The journal of an unfinished conversion, or None"""
+        journal = cls(directory, key)
+        try:
+            with open(journal.plan_path, encoding='utf-8') as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if data.get('version') != JOURNAL_VERSION or not data.get('chunks'):
+            return None
+        for name in ('description', 'lang_code', 'backend', 'voice_id', 'rate', 'post', 'chunks'):
+            setattr(journal, name, data.get(name))
+        try:
+            with open(journal.log_path) as log:
+                for line in log:
+                    # A torn last line from a crash is ignored
+                    if line.strip().isdigit():
+                        journal.completed.add(int(line))
+        except OSError:
+            pass
+        journal.completed &= set(range(len(journal.chunks)))
+        return journal
+
+    def modified(self):
+        """When the conversion last made progress"""
+        times = []
+        for path in (self.plan_path, self.log_path):
+            try:
+                times.append(os.path.getmtime(path))
+            except OSError:
+                pass
+        return max(times, default=0.0)
+
+    @classmethod
+    def pending(cls, directory, max_age=MAX_AGE_SECONDS, limit=MAX_PENDING):
+        """Unfinished conversions in a journal directory, most recent first.
+
+        Journals older than max_age seconds, beyond the limit most recent,
+        or unreadable are deleted, as are logs left without a plan.
+        """
+        if not os.path.isdir(directory):
+            return []
+        names = os.listdir(directory)
+        keys = {name[:-len('.json')] for name in names if name.endswith('.json')}
+        for name in names:
+            if name.endswith('.log') and name[:-len('.log')] not in keys:
+                cls(directory, name[:-len('.log')]).finish()
+        journals = sorted((cls(directory, key) for key in keys), key=cls.modified, reverse=True)
+        now = time.time()
+        pending = []
+        for journal in journals:
+            loaded = None
+            if len(pending) < limit and now - journal.modified() <= max_age:
+                loaded = cls.load(directory, journal.key)
+            if loaded is None:
+                journal.finish()
+            else:
+                pending.append(loaded)
+        return pending
@@ -1,20 +1,34 @@
+# Imported first so the startup report covers every other import
+from startup import startup_timer
 import os
-import tempfile
-import pyttsx3
-from gtts import gTTS
 import sys
-import winsound
 from PyQt5.QtWidgets import (QApplication, QWidget, QVBoxLayout, QLabel, 
-    QLineEdit, QPushButton, QSlider, QComboBox, QFileDialog, QRadioButton, 
-    QHBoxLayout, QMessageBox, QProgressBar, QFrame)
-from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QFont, QIcon, QPalette, QColor
-from pydub import AudioSegment
-import shutil
-from PyPDF2 import PdfReader
-import pytesseract
-from PIL import Image
-import io
+    QPushButton, QSlider, QComboBox, QFileDialog, QRadioButton, 
+    QHBoxLayout, QMessageBox, QProgressBar, QFrame, QCheckBox)
+from PyQt5.QtCore import Qt, QObject, QTimer, pyqtSignal
+from PyQt5.QtGui import QFont
+from core import VoicifyCore
+from document_view import DocumentView
+from streaming import ChunkStream, StreamPlayer
+from playback import PlaybackEngine, ChunkSinkPlayer, PLAYING
+from export import EXPORT_PROFILES, profile_for_filter
+
+startup_timer.mark('imports')
+
+
+class JobSignals(QObject):
+    # Emitted from worker threads; Qt queues delivery onto the GUI thread
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal(int, object)
+    failed = pyqtSignal(int, str)
+    cancelled = pyqtSignal(int)
+    stream_finished = pyqtSignal(object)
+
+
+class PlaybackSignals(QObject):
+    position = pyqtSignal(float)
+    state = pyqtSignal(str)
+
 
 class StyledFrame(QFrame):
     def __init__(self):
@@ -30,54 +44,51 @@ class StyledFrame(QFrame):
         """)
 
 class TextToSpeechApp(QWidget):
-    def __init__(self):
+    """Qt shell over VoicifyCore: widgets, dialogs, signals and playback"""
+
+    def __init__(self, core=None):
         super().__init__()
-        
-        # Initialize pyttsx3 engine once
-        self.engine = pyttsx3.init()
-        
-        # Get available voices
-        self.available_voices = self.engine.getProperty('voices')
-        
-        # Store voice options
-        self.voice_options = {
-            'male': None,
-            'female': None,
-            'default': self.available_voices[0] if self.available_voices else None
-        }
-        
-        # Find and categorize voices
-        for voice in self.available_voices:
-            voice_name = voice.name.lower()
-            if 'david' in voice_name or 'james' in voice_name or 'mark' in voice_name:
-                self.voice_options['male'] = voice
-            elif 'zira' in voice_name or 'heather' in voice_name or 'susan' in voice_name:
-                self.voice_options['female'] = voice
-
-        # Supported languages for gTTS with their codes
-        self.supported_languages = {
-            "English": "en",
-            "Spanish": "es",
-            "French": "fr",
-            "German": "de",
-            "Italian": "it",
-            "Portuguese": "pt",
-            "Russian": "ru",
-            "Japanese": "ja",
-            "Korean": "ko",
-            "Chinese (Simplified)": "zh-CN"
-        }
 
-        # Create temp directory
-        self.temp_dir = os.path.join(tempfile.gettempdir(), 'tts_app')
-        os.makedirs(self.temp_dir, exist_ok=True)
-        
-        # Initialize audio file path
-        self.generated_audio_path = None
+        self.core = core or VoicifyCore()
+        self.first_painted = False
+
+        # Conversions run as background jobs so the window stays responsive
+        self.job_signals = JobSignals()
+        self.job_signals.progress.connect(self.on_job_progress)
+        self.job_signals.finished.connect(self.on_job_finished)
+        self.job_signals.failed.connect(self.on_job_failed)
+        self.job_signals.cancelled.connect(self.on_job_cancelled)
+        self.job_signals.stream_finished.connect(self.on_stream_finished)
+        # PDF extraction runs as a job too, with its own signal routing
+        self.pdf_signals = JobSignals()
+        self.pdf_signals.progress.connect(self.on_pdf_progress)
+        self.pdf_signals.finished.connect(self.on_pdf_extracted)
+        self.pdf_signals.failed.connect(self.on_pdf_failed)
+        self.pdf_signals.cancelled.connect(self.on_pdf_cancelled)
+        self.pdf_job_id = None
+        self.voice_signals = JobSignals()
+        self.voice_signals.finished.connect(self.on_voices_loaded)
+        self.voice_signals.failed.connect(self.on_voices_failed)
+
+        # Playback runs on its own thread; position/state come back as signals
+        self.playback_signals = PlaybackSignals()
+        self.player = PlaybackEngine(
+            on_position=self.playback_signals.position.emit,
+            on_state=self.playback_signals.state.emit
+        )
+        self.player_needs_load = True
+        self.active_job_id = None
+        # Streaming playback state; stats of the last stream for measurement
+        self.active_stream = None
+        # Plays the stream, and keeps playing what is queued after the job ends
+        self.stream_player = None
+        self.last_stream_stats = None
+        self.diagnostics_panel = None
         
         # Set up the GUI layout
         self.initUI()
         self.apply_styles()
+        startup_timer.mark('window_constructed')
 
     def initUI(self):
         main_layout = QVBoxLayout()
@@ -119,7 +130,7 @@ class TextToSpeechApp(QWidget):
 
         self.language_dropdown = QComboBox()
         self.language_dropdown.setFont(QFont("Segoe UI", 10))
-        for language in sorted(self.supported_languages.keys()):
+        for language in sorted(self.core.supported_languages.keys()):
             self.language_dropdown.addItem(language)
         self.language_dropdown.setCurrentText("English")
         self.language_dropdown.currentTextChanged.connect(self.on_language_change)
@@ -131,7 +142,7 @@ class TextToSpeechApp(QWidget):
         voice_frame = StyledFrame()
         voice_layout = QVBoxLayout(voice_frame)
         
-        self.voice_label = QLabel("Select Voice Type (English only):")
+        self.voice_label = QLabel("Select Voice Type:")
         self.voice_label.setFont(QFont("Segoe UI", 10, QFont.Bold))
         self.voice_label.setStyleSheet("color: #ECF0F1;")
         voice_layout.addWidget(self.voice_label)
@@ -155,9 +166,10 @@ class TextToSpeechApp(QWidget):
         self.text_label.setStyleSheet("color: #ECF0F1;")
         text_layout.addWidget(self.text_label)
 
-        self.text_input = QLineEdit()
+        # Draws only the visible lines of the document, so whole books stay responsive
+        self.text_input = DocumentView()
         self.text_input.setPlaceholderText("Type your text here...")
-        self.text_input.setMinimumHeight(40)
+        self.text_input.setMinimumHeight(160)
         text_layout.addWidget(self.text_input)
         
         content_layout.addWidget(text_frame)
@@ -198,19 +210,42 @@ class TextToSpeechApp(QWidget):
         self.convert_button = QPushButton("Convert")
         self.play_button = QPushButton("Play")
         self.download_button = QPushButton("Download")
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.setEnabled(False)
+        self.stop_button = QPushButton("Stop")
         
-        for btn in [self.convert_button, self.play_button, self.download_button]:
+        for btn in [self.convert_button, self.cancel_button, self.play_button, self.stop_button, self.download_button]:
             btn.setMinimumHeight(45)
             buttons_layout.addWidget(btn)
 
+        options_layout = QHBoxLayout()
+        self.stream_checkbox = QCheckBox("Start playback at the cursor while converting")
+        options_layout.addWidget(self.stream_checkbox)
+        options_layout.addStretch()
+        # Per-stage timings of the pipeline, for finding where time goes
+        self.diagnostics_button = QPushButton("Diagnostics")
+        options_layout.addWidget(self.diagnostics_button)
+        content_layout.addLayout(options_layout)
+
         content_layout.addLayout(buttons_layout)
+
+        # Playback position; drag to seek
+        self.position_slider = QSlider(Qt.Horizontal)
+        self.position_slider.setRange(0, 0)
+        content_layout.addWidget(self.position_slider)
         main_layout.addWidget(content_frame)
 
         # Connect button signals
         self.convert_button.clicked.connect(self.text_to_speech)
+        self.cancel_button.clicked.connect(self.cancel_conversion)
         self.play_button.clicked.connect(self.play_audio)
+        self.stop_button.clicked.connect(self.stop_audio)
+        self.position_slider.sliderReleased.connect(self.seek_audio)
+        self.playback_signals.position.connect(self.on_playback_position)
+        self.playback_signals.state.connect(self.on_playback_state)
         self.download_button.clicked.connect(self.download_audio)
         self.upload_pdf_button.clicked.connect(self.upload_pdf)
+        self.diagnostics_button.clicked.connect(self.show_diagnostics)
 
         self.setLayout(main_layout)
         self.setWindowTitle("Voicify")
@@ -252,7 +287,7 @@ class TextToSpeechApp(QWidget):
                 border-top: 5px solid #ECF0F1;
             }
             
-            QLineEdit {
+            DocumentView {
                 padding: 4px;
                 border: 1px solid #34495E;
                 border-radius: 5px;
@@ -343,434 +378,76 @@ class TextToSpeechApp(QWidget):
             }
         """)
 
-   
-    def on_language_change(self, language):
-        """Handle language change events"""
-        is_english = language == "English"
-        self.voice_male_radio.setEnabled(is_english)
-        self.voice_female_radio.setEnabled(is_english)
-        self.rate_slider.setEnabled(is_english)
-        self.voice_label.setText("Select Voice Type (English only):" if is_english else "Voice selection not available for non-English languages")
-        self.rate_label.setText("Speech Rate:" if is_english else "Speech rate not adjustable for non-English languages")
-
-        placeholder_texts = {
-            "Russian": "Введите текст здесь...",
-            "Chinese (Simplified)": "在这里输入文字...",
-            "Japanese": "ここにテキストを入力してください...",
-            "Korean": "여기에 텍스트를 입력하세요..."
-        }
-        self.text_input.setPlaceholderText(placeholder_texts.get(language, "Type your text here..."))
-
-    def text_to_speech(self):
-        text = self.text_input.text().strip()
-        if not text:
-            QMessageBox.warning(self, "Input Error", "Please enter some text to convert.")
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self.first_painted:
+            self.first_painted = True
+            startup_timer.mark('first_paint')
+            QTimer.singleShot(0, self.load_voices)
+
+    def load_voices(self):
+        # Slow engine start-up happens in the background after first paint
+        self.core.load_voices(on_finished=self.voice_signals.finished.emit,
+                              on_failed=self.voice_signals.failed.emit)
+
+    def on_voices_loaded(self, job_id, catalog):
+        self.core.set_voices(catalog)
+        # Languages with an installed system voice now offer voice selection
+        self.on_language_change(self.language_dropdown.currentText())
+        voice_type = 'male' if self.voice_male_radio.isChecked() else 'female'
+        self.core.warm_engine(self.language_dropdown.currentText(), voice_type, self.rate_slider.value())
+        startup_timer.mark('voices_loaded')
+        self._finish_startup()
+
+    def on_voices_failed(self, job_id, message):
+        self.core.voices_failed(message)
+        self.on_language_change(self.language_dropdown.currentText())
+        startup_timer.mark('voices_failed')
+        self._finish_startup()
+
+    def _finish_startup(self):
+        startup_timer.write_report()
+        if startup_timer.exit_after_report:
+            self.close()
             return
+        self.offer_resume()
 
-        try:
-            self.progress_bar.setVisible(True)
-            self.progress_bar.setValue(0)
-            
-            selected_language = self.language_dropdown.currentText()
-            lang_code = self.supported_languages[selected_language]
-            
-            temp_mp3 = os.path.join(self.temp_dir, 'temp.mp3')
-            output_wav = os.path.join(self.temp_dir, 'output.wav')
-            
-            for file in [temp_mp3, output_wav]:
-                if os.path.exists(file):
-                    os.remove(file)
-            
-            self.progress_bar.setValue(20)
-
-            if selected_language == "English":
-                voice_type = 'male' if self.voice_male_radio.isChecked() else 'female'
-                voice = self.voice_options[voice_type] or self.voice_options['default']
-                self.engine.setProperty('voice', voice.id)
-                self.engine.setProperty('rate', self.rate_slider.value())
-                
-                self.progress_bar.setValue(40)
-                self.engine.save_to_file(text, output_wav)
-                self.engine.runAndWait()
-                self.progress_bar.setValue(80)
-            else:
-                try:
-                    tts = gTTS(text=text, lang=lang_code, slow=False)
-                    self.progress_bar.setValue(40)
-                    
-                    tts.save(temp_mp3)
-                    self.progress_bar.setValue(60)
-                    
-                    audio = AudioSegment.from_mp3(temp_mp3)
-                    audio.export(output_wav, format="wav")
-                    self.progress_bar.setValue(80)
-                    
-                    if os.path.exists(temp_mp3):
-                        os.remove(temp_mp3)
-                except Exception as e:
-                    raise Exception(f"gTTS error: {str(e)}")
-            
-            if os.path.exists(output_wav):
-                self.generated_audio_path = output_wav
-                self.progress_bar.setValue(100)
-                QMessageBox.information(self, "Success", "Text converted to speech successfully!")
-            else:
-                raise Exception("Failed to generate audio file")
-
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"An error occurred: {str(e)}")
-        finally:
-            self.progress_bar.setVisible(False)
-
-    def play_audio(self):
-        try:
-            if self.generated_audio_path and os.path.exists(self.generated_audio_path):
-                winsound.PlaySound(self.generated_audio_path, winsound.SND_FILENAME)
-            else:
-                QMessageBox.warning(self, "Playback Error", "No audio file available. Please convert text first.")
-        except Exception as e:
-            QMessageBox.critical(self, "Playback Error", f"Error playing audio: {str(e)}")
-
-    def download_audio(self):
-        if not self.generated_audio_path or not os.path.exists(self.generated_audio_path):
-            QMessageBox.warning(self, "Download Error", "No audio available to download. Please convert text first.")
+    def offer_resume(self):
+        """Offer to finish the most recent conversion that was interrupted"""
+        journals = self.core.pending_conversions()
+        if not journals or self.active_job_id is not None:
             return
+        journal = journals[0]
+        box = QMessageBox(self)
+        box.setWindowTitle("Unfinished conversion")
+        box.setText(f"\"{journal.description}\" was interrupted with "
+                    f"{len(journal.completed)} of {len(journal.chunks)} parts done.")
+        resume_button = box.addButton("Resume", QMessageBox.AcceptRole)
+        discard_button = box.addButton("Discard", QMessageBox.DestructiveRole)
+        box.addButton("Later", QMessageBox.RejectRole)
+        box.exec_()
+        if box.clickedButton() is resume_button:
+            self._start_active_job(self.core.resume_conversion(
+                journal,
+                on_progress=self.job_signals.progress.emit,
+                on_finished=self.job_signals.finished.emit,
+                on_failed=self.job_signals.failed.emit,
+                on_cancelled=self.job_signals.cancelled.emit,
+            ))
+        elif box.clickedButton() is discard_button:
+            self.core.discard_conversion(journal)
 
-        try:
-            file_path, _ = QFileDialog.getSaveFileName(
-                self,
-                "Save Audio File",
-                os.path.expanduser("~/Downloads/audio.wav"),
-                "WAV Files (*.wav)"
-            )
-
-            if file_path:
-                shutil.copy2(self.generated_audio_path, file_path)
-                QMessageBox.information(self, "Success", f"Audio saved successfully to:\n{file_path}")
-
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Failed to save audio file: {str(e)}")
-
-    def closeEvent(self, event):
-        try:
-            if os.path.exists(self.temp_dir):
-                shutil.rmtree(self.temp_dir)
-        except:
-            pass
-        super().closeEvent(event)
-
-    def upload_pdf(self):
-        file_path, _ = QFileDialog.getOpenFileName(self, "Open PDF File", "", "PDF Files (*.pdf)")
-        if file_path:
-            try:
-                extracted_text = self.extract_text_from_pdf(file_path)
-                if extracted_text:
-                    self.text_input.setText(extracted_text)
-                    QMessageBox.information(self, "Success", "Text extracted successfully from the PDF.")
-                else:
-                    QMessageBox.warning(self, "PDF Error", "No text found in the PDF.")
-            except Exception as e:
-                QMessageBox.critical(self, "Error", f"Failed to extract text from PDF: {str(e)}")
-
-    def extract_text_from_pdf(self, pdf_path):
-        try:
-            with open(pdf_path, "rb") as file:
-                reader = PdfReader(file)
-                pdf_text = ""
-                for page in reader.pages:
-                    pdf_text += page.extract_text()
-                return pdf_text
-        except Exception as e:
-            raise Exception(f"Error extracting text from PDF: {str(e)}")
-
-
-if __name__ == "__main__":
-    try:
-        app = QApplication(sys.argv)
-        app.setStyle('Fusion')  
-        window = TextToSpeechApp()
-        window.show()
-        sys.exit(app.exec_())
-    except Exception as e:
-        print(f"Application error: {str(e)}")
-
-        
-
-class TextToSpeechApp(QWidget):
-    def __init__(self):
-        super().__init__()
-        
-        # Initialize pyttsx3 engine once
-        self.engine = pyttsx3.init()
-        
-        # Get available voices
-        self.available_voices = self.engine.getProperty('voices')
-        
-        # Store voice options
-        self.voice_options = {
-            'male': None,
-            'female': None,
-            'default': self.available_voices[0] if self.available_voices else None
-        }
-        
-        # Find and categorize voices
-        for voice in self.available_voices:
-            voice_name = voice.name.lower()
-            if 'david' in voice_name or 'james' in voice_name or 'mark' in voice_name:
-                self.voice_options['male'] = voice
-            elif 'zira' in voice_name or 'heather' in voice_name or 'susan' in voice_name:
-                self.voice_options['female'] = voice
-
-        # Supported languages for gTTS with their codes
-        self.supported_languages = {
-            "English": "en",
-            "Spanish": "es",
-            "French": "fr",
-            "German": "de",
-            "Italian": "it",
-            "Portuguese": "pt",
-            "Russian": "ru",
-            "Japanese": "ja",
-            "Korean": "ko",
-            "Chinese (Simplified)": "zh-CN"
-        }
-
-        # Create temp directory
-        self.temp_dir = os.path.join(tempfile.gettempdir(), 'tts_app')
-        os.makedirs(self.temp_dir, exist_ok=True)
-        
-        # Initialize audio file path
-        self.generated_audio_path = None
-        
-        # Set up the GUI layout
-        self.initUI()
-        self.apply_styles()
-
-    def initUI(self):
-        main_layout = QVBoxLayout()
-        main_layout.setSpacing(15)
-        main_layout.setContentsMargins(20, 20, 20, 20)
-
-        # Title
-        title_label = QLabel("VoiciFy")
-        title_label.setFont(QFont("Arial", 24, QFont.Bold))
-        title_label.setAlignment(Qt.AlignCenter)
-        main_layout.addWidget(title_label)
-
-        subtitle_label = QLabel("Text to Speech Converter")
-        subtitle_label.setFont(QFont("Arial", 12))
-        subtitle_label.setAlignment(Qt.AlignCenter)
-        main_layout.addWidget(subtitle_label)
-
-        # Main content frame
-        content_frame = StyledFrame()
-        content_layout = QVBoxLayout(content_frame)
-        content_layout.setSpacing(15)
-        content_layout.setContentsMargins(10, 10, 10, 10)
-        
-
-        # Language selection
-        lang_frame = StyledFrame()
-        lang_layout = QVBoxLayout(lang_frame)
-        
-        self.language_label = QLabel("Select Language:")
-        self.language_label.setFont(QFont("Arial", 20, QFont.Bold))
-        lang_layout.addWidget(self.language_label)
-
-        self.language_dropdown = QComboBox()
-        self.language_dropdown.setFont(QFont("Arial", 10))
-        for language in sorted(self.supported_languages.keys()):
-            self.language_dropdown.addItem(language)
-        self.language_dropdown.setCurrentText("English")
-        self.language_dropdown.currentTextChanged.connect(self.on_language_change)
-        lang_layout.addWidget(self.language_dropdown)
-        
-        content_layout.addWidget(lang_frame)
-
-        # Voice selection frame
-        voice_frame = StyledFrame()
-        voice_layout = QVBoxLayout(voice_frame)
-        
-        self.voice_label = QLabel("Select Voice Type (English only):")
-        self.voice_label.setFont(QFont("Arial", 10, QFont.Bold))
-        voice_layout.addWidget(self.voice_label)
-
-        voice_options = QHBoxLayout()
-        self.voice_male_radio = QRadioButton("Male")
-        self.voice_female_radio = QRadioButton("Female")
-        self.voice_male_radio.setChecked(True)
-        voice_options.addWidget(self.voice_male_radio)
-        voice_options.addWidget(self.voice_female_radio)
-        voice_layout.addLayout(voice_options)
-        
-        content_layout.addWidget(voice_frame)
-
-        # Text input frame
-        text_frame = StyledFrame()
-        text_layout = QVBoxLayout(text_frame)
-        
-        self.text_label = QLabel("Enter Text:")
-        self.text_label.setFont(QFont("Arial", 10, QFont.Bold))
-        text_layout.addWidget(self.text_label)
-
-        self.text_input = QLineEdit()
-        self.text_input.setPlaceholderText("Type your text here...")
-        self.text_input.setMinimumHeight(40)
-        text_layout.addWidget(self.text_input)
-        
-        content_layout.addWidget(text_frame)
-
-        # Upload PDF button
-        self.upload_pdf_button = QPushButton("Upload PDF")
-        self.upload_pdf_button.setMinimumHeight(40)
-        content_layout.addWidget(self.upload_pdf_button)
-
-        # Progress bar
-        self.progress_bar = QProgressBar()
-        self.progress_bar.setVisible(False)
-        self.progress_bar.setMinimumHeight(20)
-        content_layout.addWidget(self.progress_bar)
-
-        # Speech rate frame
-        rate_frame = StyledFrame()
-        rate_layout = QVBoxLayout(rate_frame)
-        
-        self.rate_label = QLabel("Speech Rate:")
-        self.rate_label.setFont(QFont("Arial", 10, QFont.Bold))
-        rate_layout.addWidget(self.rate_label)
-
-        self.rate_slider = QSlider(Qt.Horizontal)
-        self.rate_slider.setMinimum(50)
-        self.rate_slider.setMaximum(200)
-        self.rate_slider.setValue(150)
-        self.rate_slider.setTickPosition(QSlider.TicksBelow)
-        self.rate_slider.setTickInterval(25)
-        rate_layout.addWidget(self.rate_slider)
-        
-        content_layout.addWidget(rate_frame)
-
-        # Action buttons
-        buttons_layout = QHBoxLayout()
-        
-        self.convert_button = QPushButton("Convert")
-        self.play_button = QPushButton("Play")
-        self.download_button = QPushButton("Download")
-        
-        for btn in [self.convert_button, self.play_button, self.download_button]:
-            btn.setMinimumHeight(40)
-            buttons_layout.addWidget(btn)
-
-        content_layout.addLayout(buttons_layout)
-        main_layout.addWidget(content_frame)
-
-        # Connect button signals
-        self.convert_button.clicked.connect(self.text_to_speech)
-        self.play_button.clicked.connect(self.play_audio)
-        self.download_button.clicked.connect(self.download_audio)
-        self.upload_pdf_button.clicked.connect(self.upload_pdf)
-
-        self.setLayout(main_layout)
-        self.setWindowTitle("Voicify")
-        self.setMinimumWidth(700)
-        self.setMinimumHeight(700)
-
-    def apply_styles(self):
-        # Set the application style
-        self.setStyleSheet("""
-            QWidget {
-                background-color: #f5f6fa;
-                color: #2f3640;
-                height: 100px;
-            }
-            
-            QLabel {
-                color: #2f3640;
-                font-size: 1px;
-            }
-            
-            QComboBox {
-                padding: 8px;
-                border: 1px solid #dcdde1;
-                border-radius: 5px;
-                background-color: white;
-                font-size: 18px;
-                
-            }
-            
-            QLineEdit {
-                padding: 4px;
-                border: 1px solid #dcdde1;
-                border-radius: 5px;
-                background-color: white;
-                font-size: 18px;
-               
-            }
-            
-            QPushButton {
-                background-color: #3498db;
-                color: white;
-                border: none;
-                border-radius: 5px;
-                padding: 5px;
-                font-weight: bold;
-                font-size: 20px;
-            }
-            
-            QPushButton:hover {
-                background-color: #2980b9;
-            }
-            
-            QPushButton:pressed {
-                background-color: #2475a8;
-            }
-            
-            QProgressBar {
-                border: 1px solid #dcdde1;
-                border-radius: 5px;
-                text-align: center;
-            }
-            
-            QProgressBar::chunk {
-                background-color: #3498db;
-                border-radius: 5px;
-            }
-            
-            QSlider::groove:horizontal {
-                border: 1px solid #dcdde1;
-                height: 8px;
-                background: white;
-                margin: 2px 0;
-                border-radius: 4px;
-            }
-            
-            QSlider::handle:horizontal {
-                background: #3498db;
-                border: none;
-                width: 18px;
-                margin: -6px 0;
-                border-radius: 9px;
-            }
-            
-            QRadioButton {
-                spacing: 8px;
-                font-size: 18px;
-            }
-            
-            QRadioButton::indicator {
-                width: 16px;
-                height: 16px;
-            }
-        """)
-
-   
     def on_language_change(self, language):
         """Handle language change events"""
-        is_english = language == "English"
-        self.voice_male_radio.setEnabled(is_english)
-        self.voice_female_radio.setEnabled(is_english)
-        self.rate_slider.setEnabled(is_english)
-        self.voice_label.setText("Select Voice Type (English only):" if is_english else "Voice selection not available for non-English languages")
-        self.rate_label.setText("Speech Rate:" if is_english else "Speech rate not adjustable for non-English languages")
+        backend = self.core.backend_for(self.core.supported_languages[language])
+        voices_available = self.core.voices_available(backend)
+        self.voice_male_radio.setEnabled(voices_available)
+        self.voice_female_radio.setEnabled(voices_available)
+        self.rate_slider.setEnabled(self.core.rate_available(backend))
+        self.voice_label.setText("Select Voice Type:" if backend.supports_voices else "Voice selection not available for this language")
+        if backend.supports_voices and not voices_available:
+            self.voice_label.setText(f"System voices unavailable: {self.core.voice_load_error}")
+        self.rate_label.setText("Speech Rate:" if self.core.rate_available(backend) else "Speech rate not adjustable for this language")
 
         placeholder_texts = {
             "Russian": "Введите текст здесь...",
@@ -781,136 +458,241 @@ class TextToSpeechApp(QWidget):
         self.text_input.setPlaceholderText(placeholder_texts.get(language, "Type your text here..."))
 
     def text_to_speech(self):
-        text = self.text_input.text().strip()
-        if not text:
+        document = self.text_input.document()
+        if document.is_blank():
             QMessageBox.warning(self, "Input Error", "Please enter some text to convert.")
             return
 
-        try:
-            self.progress_bar.setVisible(True)
-            self.progress_bar.setValue(0)
-            
-            selected_language = self.language_dropdown.currentText()
-            lang_code = self.supported_languages[selected_language]
-            
-            temp_mp3 = os.path.join(self.temp_dir, 'temp.mp3')
-            output_wav = os.path.join(self.temp_dir, 'output.wav')
-            
-            for file in [temp_mp3, output_wav]:
-                if os.path.exists(file):
-                    os.remove(file)
-            
-            self.progress_bar.setValue(20)
+        selected_language = self.language_dropdown.currentText()
+        voice_type = 'male' if self.voice_male_radio.isChecked() else 'female'
+        conversion = self.core.plan_conversion(document, selected_language, voice_type, self.rate_slider.value())
+        if self.core.voices_pending(conversion.backend):
+            QMessageBox.information(self, "Please wait", "System voices are still loading, try again in a moment.")
+            return
 
-            if selected_language == "English":
-                voice_type = 'male' if self.voice_male_radio.isChecked() else 'female'
-                voice = self.voice_options[voice_type] or self.voice_options['default']
-                self.engine.setProperty('voice', voice.id)
-                self.engine.setProperty('rate', self.rate_slider.value())
-                
-                self.progress_bar.setValue(40)
-                self.engine.save_to_file(text, output_wav)
-                self.engine.runAndWait()
-                self.progress_bar.setValue(80)
-            else:
-                try:
-                    tts = gTTS(text=text, lang=lang_code, slow=False)
-                    self.progress_bar.setValue(40)
-                    
-                    tts.save(temp_mp3)
-                    self.progress_bar.setValue(60)
-                    
-                    audio = AudioSegment.from_mp3(temp_mp3)
-                    audio.export(output_wav, format="wav")
-                    self.progress_bar.setValue(80)
-                    
-                    if os.path.exists(temp_mp3):
-                        os.remove(temp_mp3)
-                except Exception as e:
-                    raise Exception(f"gTTS error: {str(e)}")
-            
-            if os.path.exists(output_wav):
-                self.generated_audio_path = output_wav
-                self.progress_bar.setValue(100)
+        # Read aloud, a cached result still starts at the cursor: its chunks
+        # come from the cache through the scheduler below
+        if not self.stream_checkbox.isChecked() and self.core.use_cached(conversion):
+            self.player_needs_load = True
+            QMessageBox.information(self, "Success", "Text converted to speech successfully!")
+            return
+
+        stream = None
+        if self.stream_checkbox.isChecked():
+            # Reading again jumps: the old stream stops, the scheduler and
+            # what it already rendered are kept
+            if self.active_job_id is not None:
+                self.core.cancel(self.active_job_id)
+            self.stop_stream_player()
+            # Chunks are played from a bounded queue while later ones render
+            stream = ChunkStream(maxsize=4)
+            try:
+                play_chunk = ChunkSinkPlayer()
+            except Exception as e:
+                QMessageBox.critical(self, "Playback Error", f"Error playing audio: {str(e)}")
+                return
+            self.player.stop()
+            player = StreamPlayer(stream, play_chunk, on_finished=self.job_signals.stream_finished.emit)
+            player.start()
+            self.active_stream = stream
+            self.stream_player = player
+
+        callbacks = dict(
+            description=f"{selected_language}: {' '.join(conversion.document.text(0, 200).split())[:40]}",
+            on_progress=self.job_signals.progress.emit,
+            on_finished=self.job_signals.finished.emit,
+            on_failed=self.job_signals.failed.emit,
+            on_cancelled=self.job_signals.cancelled.emit,
+        )
+        if stream is not None:
+            # Read from the cursor when it is on screen, else from the top of the view
+            start, end = self.text_input.visible_range()
+            cursor = self.text_input.cursor
+            position = cursor if start <= cursor <= end else start
+            job = self.core.start_reading(conversion, stream, position, end, **callbacks)
+        else:
+            job = self.core.start_conversion(conversion, stream, **callbacks)
+        self._start_active_job(job)
+
+    def _start_active_job(self, job):
+        self.active_job_id = job.id
+        self.progress_bar.setValue(0)
+        self.progress_bar.setVisible(True)
+        self.cancel_button.setEnabled(True)
+
+    def cancel_conversion(self):
+        if self.active_job_id is not None:
+            # Given up on purpose: not offered for resuming at the next start
+            self.core.cancel(self.active_job_id, discard=True)
+        self.stop_stream_player()
+        self.active_stream = None
+        self.core.stop_reading()
+
+    def stop_audio(self):
+        """Stop playback, streamed or not; a conversion that streams stops too"""
+        self.player.stop()
+        self.stop_stream_player()
+
+    def stop_stream_player(self):
+        if self.stream_player is not None:
+            # Cancelling the stream also cancels the job feeding it
+            self.stream_player.stop()
+            self.stream_player = None
+
+    def on_stream_finished(self, stats):
+        self.last_stream_stats = stats
+
+    def on_job_progress(self, job_id, value):
+        if job_id == self.active_job_id:
+            self.progress_bar.setValue(value)
+
+    def on_job_finished(self, job_id, audio):
+        self.core.finish_conversion(job_id, audio)
+        self.player_needs_load = True
+        if job_id == self.active_job_id:
+            streaming = self.active_stream is not None
+            self._end_active_job()
+            if not streaming:
                 QMessageBox.information(self, "Success", "Text converted to speech successfully!")
-            else:
-                raise Exception("Failed to generate audio file")
 
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"An error occurred: {str(e)}")
-        finally:
-            self.progress_bar.setVisible(False)
+    def on_job_failed(self, job_id, message):
+        self.core.forget_job(job_id)
+        if job_id == self.active_job_id:
+            self._end_active_job()
+        # Finished chunks are journaled and cached, so a retry only renders the rest
+        QMessageBox.critical(self, "Error", f"An error occurred: {message}\n\n"
+                             "Completed parts were kept; convert again to continue from where it stopped.")
+
+    def on_job_cancelled(self, job_id):
+        self.core.forget_job(job_id)
+        if job_id == self.active_job_id:
+            self._end_active_job()
+
+    def _end_active_job(self):
+        self.active_job_id = None
+        self.active_stream = None
+        self.progress_bar.setVisible(False)
+        self.cancel_button.setEnabled(False)
 
     def play_audio(self):
+        """Play, or pause when already playing"""
         try:
-            if self.generated_audio_path and os.path.exists(self.generated_audio_path):
-                winsound.PlaySound(self.generated_audio_path, winsound.SND_FILENAME)
-            else:
-                QMessageBox.warning(self, "Playback Error", "No audio file available. Please convert text first.")
+            if self.player_needs_load:
+                # The cached WAV is memory-mapped, not loaded
+                source = self.core.audio_source()
+                if source is None:
+                    QMessageBox.warning(self, "Playback Error", "No audio file available. Please convert text first.")
+                    return
+                self.player.load(source)
+                self.player_needs_load = False
+                self.position_slider.setRange(0, int(self.player.duration * 1000))
+            self.player.toggle()
         except Exception as e:
             QMessageBox.critical(self, "Playback Error", f"Error playing audio: {str(e)}")
 
+    def seek_audio(self):
+        self.player.seek(self.position_slider.value() / 1000)
+
+    def on_playback_position(self, seconds):
+        if not self.position_slider.isSliderDown():
+            self.position_slider.setValue(int(seconds * 1000))
+
+    def on_playback_state(self, state):
+        self.play_button.setText("Pause" if state == PLAYING else "Play")
+
     def download_audio(self):
-        if not self.generated_audio_path or not os.path.exists(self.generated_audio_path):
+        if not self.core.audio_file():
             QMessageBox.warning(self, "Download Error", "No audio available to download. Please convert text first.")
             return
 
         try:
-            file_path, _ = QFileDialog.getSaveFileName(
+            file_path, selected_filter = QFileDialog.getSaveFileName(
                 self,
                 "Save Audio File",
                 os.path.expanduser("~/Downloads/audio.wav"),
-                "WAV Files (*.wav)"
+                ";;".join(profile.file_filter for profile in EXPORT_PROFILES.values())
             )
 
             if file_path:
-                shutil.copy2(self.generated_audio_path, file_path)
+                profile = profile_for_filter(selected_filter)
+                if not file_path.lower().endswith(profile.extension):
+                    file_path += profile.extension
+                self.core.export(file_path, profile)
                 QMessageBox.information(self, "Success", f"Audio saved successfully to:\n{file_path}")
 
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Failed to save audio file: {str(e)}")
 
+    def show_diagnostics(self):
+        if self.diagnostics_panel is None:
+            from diagnostics_panel import DiagnosticsPanel
+            self.diagnostics_panel = DiagnosticsPanel(self)
+        self.diagnostics_panel.show()
+        self.diagnostics_panel.raise_()
+
     def closeEvent(self, event):
-        try:
-            if os.path.exists(self.temp_dir):
-                shutil.rmtree(self.temp_dir)
-        except:
-            pass
+        self.stop_stream_player()
+        self.player.close()
+        self.core.close()
         super().closeEvent(event)
 
     def upload_pdf(self):
         file_path, _ = QFileDialog.getOpenFileName(self, "Open PDF File", "", "PDF Files (*.pdf)")
         if file_path:
-            try:
-                extracted_text = self.extract_text_from_pdf(file_path)
-                if extracted_text:
-                    self.text_input.setText(extracted_text)
-                    QMessageBox.information(self, "Success", "Text extracted successfully from the PDF.")
-                else:
-                    QMessageBox.warning(self, "PDF Error", "No text found in the PDF.")
-            except Exception as e:
-                QMessageBox.critical(self, "Error", f"Failed to extract text from PDF: {str(e)}")
+            job = self.core.extract_pdf(
+                file_path, self.language_dropdown.currentText(),
+                on_progress=self.pdf_signals.progress.emit,
+                on_finished=self.pdf_signals.finished.emit,
+                on_failed=self.pdf_signals.failed.emit,
+                on_cancelled=self.pdf_signals.cancelled.emit,
+            )
+            self.pdf_job_id = job.id
+            self.upload_pdf_button.setEnabled(False)
+            self.progress_bar.setValue(0)
+            self.progress_bar.setVisible(True)
 
-    def extract_text_from_pdf(self, pdf_path):
-        try:
-            with open(pdf_path, "rb") as file:
-                reader = PdfReader(file)
-                pdf_text = ""
-                for page in reader.pages:
-                    pdf_text += page.extract_text()
-                return pdf_text
-        except Exception as e:
-            raise Exception(f"Error extracting text from PDF: {str(e)}")
+    def on_pdf_progress(self, job_id, value):
+        if job_id == self.pdf_job_id:
+            self.progress_bar.setValue(value)
+
+    def on_pdf_extracted(self, job_id, result):
+        self._end_pdf_job()
+        document, cleanup = result
+        if not document.is_blank():
+            self.text_input.setDocument(document)
+            message = "Text extracted successfully from the PDF."
+            if cleanup and cleanup['chars_saved'] > 0:
+                message += (f"\n\nRemoved {cleanup['chars_saved']:,} characters "
+                            f"({cleanup['saved_ratio']:.0%}) of headers, footers, page numbers "
+                            "and broken lines before conversion.")
+            QMessageBox.information(self, "Success", message)
+        else:
+            QMessageBox.warning(self, "PDF Error", "No text found in the PDF.")
+
+    def on_pdf_failed(self, job_id, message):
+        self._end_pdf_job()
+        QMessageBox.critical(self, "Error", f"Failed to extract text from PDF: {message}")
+
+    def on_pdf_cancelled(self, job_id):
+        self._end_pdf_job()
+
+    def _end_pdf_job(self):
+        self.pdf_job_id = None
+        self.upload_pdf_button.setEnabled(True)
+        if self.active_job_id is None:
+            self.progress_bar.setVisible(False)
+
+
+def main():
+    app = QApplication(sys.argv)
+    app.setStyle('Fusion')
+    window = TextToSpeechApp()
+    window.show()
+    return app.exec_()
 
 
 if __name__ == "__main__":
     try:
-        app = QApplication(sys.argv)
-        app.setStyle('Fusion') 
-        window = TextToSpeechApp()
-        window.show()
-        sys.exit(app.exec_())
+        sys.exit(main())
     except Exception as e:
         print(f"Application error: {str(e)}")
-
-        
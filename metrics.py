@@ -0,0 +1,203 @@
+import csv
+import json
+import os
+import threading
+import time
+
+# Pipeline stages, in the order a conversion passes through them
+STAGES = ('extract', 'normalize', 'synthesize', 'decode', 'postprocess', 'encode', 'write', 'play')
+FIELDS = ('calls', 'seconds', 'bytes_in', 'bytes_out')
+
+
+class _Measurement:
+    """One timed run of a stage; set bytes_in/bytes_out before it ends"""
+
+    __slots__ = ('metrics', 'name', 'bytes_in', 'bytes_out', 'started', 'profiler')
+
+    def __init__(self, metrics, name, bytes_in, bytes_out):
+        self.metrics = metrics
+        self.name = name
+        self.bytes_in = bytes_in
+        self.bytes_out = bytes_out
+        self.profiler = None
+
+    def __enter__(self):
+        if self.metrics.profiling:
+            self.profiler = self.metrics._enter_profile()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.add(self.name, time.perf_counter() - self.started, self.bytes_in, self.bytes_out)
+        if self.profiler is not None:
+            self.metrics._exit_profile(self.profiler)
+        return False
+
+
+class StageMetrics:
+    """Time, call and byte counters per pipeline stage, for the whole process.
+
+    Hot paths wrap their work in stage(name); seconds are summed over every
+    thread, so a stage that runs on several workers at once can add up to
+    more than the wall time it took. snapshot()/since() give the share of
+    one conversion, rows() a table for display, write() a JSON or CSV file.
+
+    With profiling on, every thread that runs a stage also runs a cProfile
+    profiler for the duration of its stages; write_profile() merges them
+    into one pstats file. VOICIFY_PROFILE names a .prof file that profiling
+    starts for at launch and is written to on exit; VOICIFY_METRICS names a
+    .json or .csv file the counters are written to on exit.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._local = threading.local()
+        self._profilers = []
+        self.profiling = False
+        self.started_at = time.time()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._stages = {name: dict.fromkeys(FIELDS, 0) for name in STAGES}
+            self.started_at = time.time()
+
+    def stage(self, name, bytes_in=0, bytes_out=0):
+        return _Measurement(self, name, bytes_in, bytes_out)
+
+    def add(self, name, seconds, bytes_in=0, bytes_out=0):
+        with self._lock:
+            counters = self._stages.setdefault(name, dict.fromkeys(FIELDS, 0))
+            counters['calls'] += 1
+            counters['seconds'] += seconds
+            counters['bytes_in'] += bytes_in
+            counters['bytes_out'] += bytes_out
+
+    def timed(self, name, items, size=len):
+        """Pass items through, counting the time spent producing each one
+        (and size(item) bytes out) against the stage"""
+        items = iter(items)
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(items)
+            except StopIteration:
+                return
+            self.add(name, time.perf_counter() - started, 0, size(item))
+            yield item
+
+    def snapshot(self):
+        with self._lock:
+            return {name: dict(counters) for name, counters in self._stages.items()}
+
+    def since(self, snapshot):
+        """Counters accumulated since snapshot(), e.g. for one conversion"""
+        current = self.snapshot()
+        return {
+            name: {field: counters[field] - snapshot.get(name, {}).get(field, 0) for field in FIELDS}
+            for name, counters in current.items()
+        }
+
+    def rows(self, stages=None):
+        """One dict per stage with the counters and derived rates"""
+        stages = stages if stages is not None else self.snapshot()
+        rows = []
+        for name, counters in stages.items():
+            seconds = counters['seconds']
+            rows.append({
+                'stage': name,
+                **counters,
+                'seconds': round(seconds, 6),
+                'mean_ms': round(1000 * seconds / counters['calls'], 3) if counters['calls'] else 0.0,
+                'mb_per_second': round(max(counters['bytes_in'], counters['bytes_out']) / seconds / 1e6, 3)
+                if seconds else 0.0,
+            })
+        return rows
+
+    def report(self):
+        return {'started_at': self.started_at, 'seconds': round(time.time() - self.started_at, 3),
+                'stages': self.rows()}
+
+    def write(self, path):
+        """Write the counters to a .csv file, or JSON for any other name"""
+        if path.lower().endswith('.csv'):
+            rows = self.rows()
+            with open(path, 'w', newline='', encoding='utf-8') as file:
+                writer = csv.DictWriter(file, fieldnames=list(rows[0]))
+                writer.writeheader()
+                writer.writerows(rows)
+        else:
+            with open(path, 'w', encoding='utf-8') as file:
+                json.dump(self.report(), file, indent=2)
+        return path
+
+    def start_profiling(self):
+        with self._lock:
+            self._profilers = []
+            self.profiling = True
+
+    def stop_profiling(self):
+        self.profiling = False
+
+    def _enter_profile(self):
+        import cProfile
+
+        profiler = getattr(self._local, 'profiler', None)
+        depth = getattr(self._local, 'depth', 0)
+        if profiler is None:
+            profiler = self._local.profiler = cProfile.Profile()
+            with self._lock:
+                self._profilers.append(profiler)
+        if depth == 0:
+            try:
+                profiler.enable()
+            except ValueError:
+                # Python 3.12+ profiles every thread from one active profiler
+                return None
+        self._local.depth = depth + 1
+        return profiler
+
+    def _exit_profile(self, profiler):
+        self._local.depth -= 1
+        if self._local.depth == 0:
+            profiler.disable()
+
+    def write_profile(self, path):
+        """Merge the profiles captured so far into one pstats file; returns
+        the path, or None when nothing was captured"""
+        import pstats
+
+        with self._lock:
+            profilers = list(self._profilers)
+        stats = None
+        for profiler in profilers:
+            try:
+                stats = pstats.Stats(profiler) if stats is None else stats.add(profiler)
+            except TypeError:
+                # Created but never enabled: nothing recorded
+                continue
+        if stats is None:
+            return None
+        stats.dump_stats(path)
+        return path
+
+    @property
+    def profile_path(self):
+        return os.environ.get('VOICIFY_PROFILE')
+
+    @property
+    def report_path(self):
+        return os.environ.get('VOICIFY_METRICS')
+
+    def write_reports(self):
+        """Write the files named by VOICIFY_METRICS and VOICIFY_PROFILE"""
+        if self.report_path:
+            self.write(self.report_path)
+        if self.profile_path:
+            self.write_profile(self.profile_path)
+
+
+stage_metrics = StageMetrics()
+if stage_metrics.profile_path:
+    stage_metrics.start_profiling()
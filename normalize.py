@@ -0,0 +1,278 @@
+import re
+import time
+from collections import defaultdict, deque
+
+from metrics import stage_metrics
+
+# Non-blank lines at the top and bottom of a page searched for boilerplate
+BAND_LINES = 3
+# A line in that band is a running header or footer once it (digits aside)
+# has been seen on this many pages, and on this share of the pages so far;
+# chapter titles at the top of a chapter's first page stay
+MIN_REPEATS = 3
+MIN_SHARE = 0.3
+MAX_BOILERPLATE_CHARS = 120
+# Pages held back while repeated lines are learned
+LOOKAHEAD_PAGES = 8
+
+PAGE_NUMBER = re.compile(
+    r'^(?:page|p\.|seite|página|pagina|страница)?\s*[-–—]?\s*\d+\s*'
+    r'(?:(?:/|of|de|von|sur|di|из)\s*\d+)?\s*[-–—]?$',
+    re.IGNORECASE,
+)
+# Front-matter page numbers (iv, xii); words such as "mix" or "I" are valid
+# numerals too, so these only count where numerals recur in the band of
+# many pages
+ROMAN_PAGE_NUMBER = re.compile(
+    r'^(?:page|p\.|seite|página|pagina|страница)?\s*[-–—]?\s*'
+    r'(?=[ivxlcdm])m{0,4}(?:cm|cd|d?c{0,3})(?:xc|xl|l?x{0,3})(?:ix|iv|v?i{0,3})\s*[-–—]?$',
+    re.IGNORECASE,
+)
+ROMAN_SIGNATURE = '#roman'
+HYPHENATED_BREAK = re.compile(r'(\w+)([-­])[ \t]*\n[ \t]*([^\W\d_A-ZÀ-ÖØ-Þ][^\W\d_]*)')
+TRAILING_FRAGMENT = re.compile(r'(\w+)([-­])\s*$')
+# Words split by a line-break hyphen, left out of the vocabulary
+BREAK_FRAGMENTS = re.compile(r'\w+[-­][ \t]*(?:\n[ \t]*\w+|$)')
+WORD = re.compile(r'[^\W\d_]+(?:-[^\W\d_]+)*')
+LEADING_FRAGMENT = re.compile(r'^\s*([^\W\d_A-ZÀ-ÖØ-Þ]\S*)[ \t]*')
+INLINE_SPACE = re.compile(r'[ \t 　]+')
+BLANK_LINES = re.compile(r'\n{3,}')
+# What follows an abbreviation that ended its sentence
+SENTENCE_FOLLOWS = re.compile(r'(?:\s*$|\s*\n\s*\n|\s+[A-ZÀ-ÖØ-Þ])')
+
+# (abbreviation, expansion, can end a sentence) per primary language
+ABBREVIATIONS = {
+    'en': [
+        ('e.g.', 'for example', False), ('i.e.', 'that is', False), ('etc.', 'et cetera', True),
+        ('vs.', 'versus', False), ('approx.', 'approximately', False), ('Dr.', 'Doctor', False),
+        ('Mr.', 'Mister', False), ('Mrs.', 'Missus', False), ('Prof.', 'Professor', False),
+        ('Fig.', 'Figure', False), ('No.', 'number', False), ('p.', 'page', False), ('pp.', 'pages', False),
+    ],
+    'es': [
+        ('p. ej.', 'por ejemplo', False), ('etc.', 'etcétera', True), ('Sr.', 'señor', False),
+        ('Sra.', 'señora', False), ('Dr.', 'doctor', False), ('Dra.', 'doctora', False), ('pág.', 'página', False),
+    ],
+    'fr': [
+        ('p. ex.', 'par exemple', False), ('etc.', 'et cetera', True), ('M.', 'Monsieur', False),
+        ('Mme', 'Madame', False), ('Dr', 'Docteur', False), ('env.', 'environ', False),
+    ],
+    'de': [
+        ('z.B.', 'zum Beispiel', False), ('z. B.', 'zum Beispiel', False), ('d.h.', 'das heißt', False),
+        ('d. h.', 'das heißt', False), ('usw.', 'und so weiter', True), ('bzw.', 'beziehungsweise', False),
+        ('ca.', 'circa', False), ('Dr.', 'Doktor', False), ('Nr.', 'Nummer', False),
+    ],
+    'it': [
+        ('ecc.', 'eccetera', True), ('Sig.', 'signor', False), ('Sig.ra', 'signora', False),
+        ('Dott.', 'dottor', False), ('pag.', 'pagina', False),
+    ],
+    'pt': [
+        ('p. ex.', 'por exemplo', False), ('etc.', 'et cetera', True), ('Sr.', 'senhor', False),
+        ('Sra.', 'senhora', False), ('Dr.', 'doutor', False), ('pág.', 'página', False),
+    ],
+    'ru': [
+        ('т.е.', 'то есть', False), ('т. е.', 'то есть', False), ('и т.д.', 'и так далее', True),
+        ('и т. д.', 'и так далее', True), ('стр.', 'страница', False),
+    ],
+}
+# First halves of common hyphenated compounds ("well-known"), kept when
+# split across a line break unless the document shows otherwise
+COMPOUND_WORDS = {
+    'en': {'well', 'self', 'ill', 'half', 'all', 'ever', 'long', 'short', 'high', 'low', 'full', 'part',
+           'cross', 'non', 'twenty', 'thirty', 'forty', 'fifty', 'sixty', 'seventy', 'eighty', 'ninety',
+           'state', 'world', 'mid', 'pre', 'post', 'anti', 'multi', 'semi', 'co', 'ex'},
+}
+# Only expanded in front of a number ("No. 5", not "No. I won't")
+NUMBERED = {'No.', 'p.', 'pp.', 'Nr.', 'pág.', 'pag.', 'стр.'}
+NUMBER_FOLLOWS = re.compile(r'\s*\d')
+
+
+def _signature(line):
+    """Line identity for boilerplate detection: page numbers and spacing ignored"""
+    return re.sub(r'\d+', '#', ' '.join(line.split()).lower())
+
+
+def spoken_length(text):
+    """Characters a backend would be sent for text (whitespace runs count once)"""
+    return len(' '.join(text.split()))
+
+
+def _abbreviation_pattern(entries):
+    # Longest first so 'p. ej.' wins over 'p.'
+    alternatives = sorted((re.escape(abbr) for abbr, _, _ in entries), key=len, reverse=True)
+    # The character after an abbreviation without its own period must not be a letter
+    return re.compile(r'(?<![\w.])(' + '|'.join(alternatives) + r')(?![^\W\d_])')
+
+
+_ABBREVIATION_PATTERNS = {lang: _abbreviation_pattern(entries) for lang, entries in ABBREVIATIONS.items()}
+
+
+class PageNormalizer:
+    """Cleans extracted page text before it is synthesized.
+
+    Removes running headers and footers (lines repeated at the top or bottom
+    of many pages), page numbers and paragraphs repeated across a page
+    break, joins words hyphenated across line and page breaks (keeping the
+    hyphen of compounds such as "well-known"), collapses whitespace and
+    expands common abbreviations, so they are read out in full and do not
+    end a sentence chunk early.
+
+    Pages are processed as a stream: normalize() holds back a few pages to
+    learn the repeated lines, then yields each page as soon as it is clean.
+    stats() reports what was removed and how many spoken characters were
+    saved.
+    """
+
+    def __init__(self, lang_code=None, lookahead=LOOKAHEAD_PAGES):
+        primary = (lang_code or '').split('-')[0].lower()
+        self.abbreviations = {abbr: (expansion, terminal) for abbr, expansion, terminal in ABBREVIATIONS.get(primary, ())}
+        self.abbreviation_pattern = _ABBREVIATION_PATTERNS.get(primary)
+        self.compound_words = COMPOUND_WORDS.get(primary, set())
+        # Lowercased words of the pages seen, hyphenated compounds included;
+        # decides whether a line-break hyphen is part of the word
+        self._words = set()
+        self.lookahead = max(1, lookahead)
+        # Boilerplate signature -> number of pages its band showed it on
+        self._seen = defaultdict(int)
+        self._learned = 0
+        self.counts = defaultdict(int)
+
+    def normalize(self, pages):
+        """Yield (index, text) for (index, text) pages, cleaned"""
+        pending = deque()
+        held = None
+        for index, text in pages:
+            started = time.perf_counter()
+            lines = text.splitlines()
+            self._learn(lines)
+            # Counted with the cleaning, as one 'normalize' call per page
+            pending.append((index, text, lines, time.perf_counter() - started))
+            if len(pending) > self.lookahead:
+                held = yield from self._release(pending.popleft(), held)
+        while pending:
+            held = yield from self._release(pending.popleft(), held)
+        if held is not None:
+            yield self._emit(held)
+
+    def _band(self, lines):
+        filled = [i for i, line in enumerate(lines) if line.strip()]
+        # Short pages get a shallower band so their body is never searched
+        depth = min(BAND_LINES, max(1, len(filled) // 4))
+        return set(filled[:depth] + filled[-depth:])
+
+    def _learn(self, lines):
+        self._learned += 1
+        band = [lines[i].strip() for i in self._band(lines)]
+        signatures = {_signature(line) for line in band if len(line) <= MAX_BOILERPLATE_CHARS}
+        if any(ROMAN_PAGE_NUMBER.match(line) for line in band):
+            signatures.add(ROMAN_SIGNATURE)
+        for signature in signatures:
+            self._seen[signature] += 1
+        text = BREAK_FRAGMENTS.sub(' ', '\n'.join(lines))
+        self._words.update(word.lower() for word in WORD.findall(text))
+
+    def _release(self, page, held):
+        """Clean a page and carry a word hyphenated across the page break.
+
+        Returns the cleaned page, held back until the next one shows
+        whether its last word continues there.
+        """
+        index, text, lines, learn_seconds = page
+        self.counts['pages'] += 1
+        self.counts['chars_in'] += spoken_length(text)
+        started = time.perf_counter()
+        cleaned = self._clean(lines)
+        stage_metrics.add('normalize', learn_seconds + time.perf_counter() - started,
+                          len(text.encode('utf-8')), len(cleaned.encode('utf-8')))
+        if held is not None:
+            held_index, held_text = held
+            cleaned = self._drop_repeat(held_text, cleaned)
+            fragment = TRAILING_FRAGMENT.search(held_text)
+            continuation = LEADING_FRAGMENT.match(cleaned)
+            if fragment and continuation:
+                first, hyphen = fragment.groups()
+                held_text = held_text[:fragment.start()] + self._join(first, hyphen, continuation.group(1))
+                cleaned = cleaned[continuation.end():]
+            yield self._emit((held_index, held_text))
+        return index, cleaned
+
+    def _drop_repeat(self, previous, text):
+        """text without a first paragraph that repeats the last one of previous"""
+        head, _, rest = text.partition('\n\n')
+        tail = previous.rpartition('\n\n')[2]
+        if len(head) > 20 and ' '.join(head.split()) == ' '.join(tail.split()):
+            self.counts['duplicates'] += 1
+            return rest
+        return text
+
+    def _emit(self, page):
+        self.counts['chars_out'] += spoken_length(page[1])
+        return page
+
+    def _repeated(self, signature):
+        seen = self._seen[signature]
+        return seen >= MIN_REPEATS and seen >= MIN_SHARE * self._learned
+
+    def _boilerplate(self, line):
+        return self._repeated(_signature(line))
+
+    def _page_number(self, line):
+        return bool(PAGE_NUMBER.match(line)) or bool(ROMAN_PAGE_NUMBER.match(line) and self._repeated(ROMAN_SIGNATURE))
+
+    def _compound(self, first, second):
+        """Whether a hyphen that broke first/second across lines belongs to the word"""
+        first, second = first.lower(), second.lower()
+        if f'{first}-{second}' in self._words:
+            return True
+        if first + second in self._words:
+            return False
+        return first in self.compound_words or (first in self._words and second in self._words)
+
+    def _join(self, first, hyphen, second):
+        """A word hyphenated across a break, rejoined"""
+        if hyphen == '-' and self._compound(first, second):
+            return f'{first}-{second}'
+        self.counts['hyphenations'] += 1
+        return first + second
+
+    def _clean(self, lines):
+        band = self._band(lines)
+        kept = []
+        for i, line in enumerate(lines):
+            stripped = line.strip()
+            if i in band and stripped:
+                if self._page_number(stripped):
+                    self.counts['page_numbers'] += 1
+                    continue
+                if len(stripped) <= MAX_BOILERPLATE_CHARS and self._boilerplate(stripped):
+                    self.counts['headers_footers'] += 1
+                    continue
+            kept.append(INLINE_SPACE.sub(' ', line).strip())
+        text = '\n'.join(kept)
+
+        text = HYPHENATED_BREAK.sub(lambda match: self._join(*match.groups()), text)
+
+        text = BLANK_LINES.sub('\n\n', text).strip('\n')
+
+        if self.abbreviation_pattern is not None:
+            text = self.abbreviation_pattern.sub(self._expand, text)
+        return text
+
+    def _expand(self, match):
+        abbreviation = match.group(1)
+        expansion, terminal = self.abbreviations[abbreviation]
+        if abbreviation in NUMBERED and not NUMBER_FOLLOWS.match(match.string, match.end()):
+            return abbreviation
+        self.counts['abbreviations'] += 1
+        if terminal and SENTENCE_FOLLOWS.match(match.string, match.end()):
+            # The abbreviation's period also ended the sentence
+            return expansion + '.'
+        return expansion
+
+    def stats(self):
+        stats = {name: self.counts[name] for name in (
+            'pages', 'chars_in', 'chars_out', 'headers_footers', 'page_numbers',
+            'hyphenations', 'duplicates', 'abbreviations',
+        )}
+        stats['chars_saved'] = stats['chars_in'] - stats['chars_out']
+        stats['saved_ratio'] = stats['chars_saved'] / stats['chars_in'] if stats['chars_in'] else 0.0
+        return stats
@@ -0,0 +1,53 @@
+import io
+
+# gTTS language codes -> Tesseract traineddata names
+TESSERACT_LANGUAGES = {
+    "en": "eng",
+    "es": "spa",
+    "fr": "fra",
+    "de": "deu",
+    "it": "ita",
+    "pt": "por",
+    "ru": "rus",
+    "ja": "jpn",
+    "ko": "kor",
+    "zh-CN": "chi_sim",
+}
+
+
+class OCRUnavailable(Exception):
+    """pytesseract, Pillow or the Tesseract program is not installed"""
+
+
+def tesseract_language(lang_code):
+    return TESSERACT_LANGUAGES.get(lang_code, "eng")
+
+
+def ocr_page(pdf_path, index, ocr_lang="eng"):
+    """OCR the embedded images of one PDF page; runs in worker processes.
+
+    Scanned PDFs store each page as one or more images, so those are read
+    straight out of the page instead of rasterizing it.
+    """
+    from PyPDF2 import PdfReader
+    try:
+        from PIL import Image
+        import pytesseract
+    except ImportError as e:
+        raise OCRUnavailable(f"OCR needs pytesseract and Pillow ({e})")
+
+    with open(pdf_path, "rb") as file:
+        page = PdfReader(file).pages[index]
+        texts = []
+        for image_file in page.images:
+            try:
+                image = Image.open(io.BytesIO(image_file.data))
+                image.load()
+            except Exception:
+                # Masks and exotic encodings are not worth failing the page over
+                continue
+            try:
+                texts.append(pytesseract.image_to_string(image, lang=ocr_lang).strip())
+            except pytesseract.TesseractNotFoundError:
+                raise OCRUnavailable("Tesseract OCR is not installed or not on PATH")
+    return "\n".join(text for text in texts if text)
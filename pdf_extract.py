@@ -0,0 +1,224 @@
+import hashlib
+import json
+import os
+import threading
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+from document import TextDocument
+from metrics import stage_metrics
+from normalize import PageNormalizer
+from ocr import OCRUnavailable, ocr_page
+from workspace import scratch_path
+
+# Pages per task handed to a worker process; each task opens the PDF once
+PAGES_PER_TASK = 8
+
+
+def document_key(pdf_path):
+    """Identity of a PDF file: path, size and modification time"""
+    stat = os.stat(pdf_path)
+    payload = f"{os.path.abspath(pdf_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class PageCache:
+    """Extracted page text on disk, one file per page.
+
+    Pages are stored under a directory named by document_key(), so editing
+    or replacing a PDF invalidates its pages automatically.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _doc_dir(self, doc_key):
+        return os.path.join(self.cache_dir, doc_key)
+
+    def page_count(self, doc_key):
+        try:
+            with open(os.path.join(self._doc_dir(doc_key), 'meta.json'), encoding='utf-8') as file:
+                return json.load(file)['pages']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def set_page_count(self, doc_key, pages):
+        self._write(doc_key, 'meta.json', json.dumps({'pages': pages}))
+
+    def get(self, doc_key, index, kind='text'):
+        """Cached text of a page; kind is 'text' (text layer) or 'ocr'"""
+        try:
+            with open(os.path.join(self._doc_dir(doc_key), f'{index}.{kind}'), encoding='utf-8') as file:
+                return file.read()
+        except OSError:
+            return None
+
+    def put(self, doc_key, index, text, kind='text'):
+        self._write(doc_key, f'{index}.{kind}', text)
+
+    def _write(self, doc_key, name, content):
+        doc_dir = self._doc_dir(doc_key)
+        with self._lock:
+            os.makedirs(doc_dir, exist_ok=True)
+        path = os.path.join(doc_dir, name)
+        tmp_path = scratch_path(path)
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        os.replace(tmp_path, path)
+
+
+def count_pages(pdf_path):
+    from PyPDF2 import PdfReader
+
+    with open(pdf_path, "rb") as file:
+        return len(PdfReader(file).pages)
+
+
+def extract_page_range(pdf_path, start, stop):
+    """Extract text from pages [start, stop); runs in worker processes"""
+    from PyPDF2 import PdfReader
+
+    with open(pdf_path, "rb") as file:
+        reader = PdfReader(file)
+        return [reader.pages[index].extract_text() or "" for index in range(start, stop)]
+
+
+def iter_pdf_pages(pdf_path, cache=None, max_workers=None, on_page=None, ocr_lang=None):
+    """Yield (page_index, text) for every page of a PDF, in page order.
+
+    Cached pages are yielded immediately. Missing pages are extracted in
+    batches across up to max_workers processes (inline when max_workers is
+    1), and each page is yielded as soon as it and all earlier pages are
+    available, so consumers can start on page 1 while later pages are still
+    being extracted. on_page(done, total) reports progress.
+
+    With ocr_lang set (a Tesseract language such as 'eng'), pages without a
+    text layer are OCR'd on the same bounded pool and the result is cached
+    alongside the extracted text. Without pytesseract or Tesseract, those
+    pages are yielded empty after a warning, as if OCR was off.
+    """
+    try:
+        doc_key = document_key(pdf_path)
+        total = cache.page_count(doc_key) if cache is not None else None
+        if total is None:
+            total = count_pages(pdf_path)
+            if cache is not None:
+                cache.set_page_count(doc_key, total)
+
+        texts = {}
+        missing = []
+        for index in range(total):
+            text = cache.get(doc_key, index) if cache is not None else None
+            if text is None:
+                missing.append(index)
+            else:
+                texts[index] = text
+
+        # Contiguous runs of missing pages, split into tasks
+        tasks = []
+        for index in missing:
+            if tasks and tasks[-1][1] == index and tasks[-1][1] - tasks[-1][0] < PAGES_PER_TASK:
+                tasks[-1][1] = index + 1
+            else:
+                tasks.append([index, index + 1])
+    except Exception as e:
+        raise Exception(f"Error extracting text from PDF: {str(e)}")
+
+    done = 0
+    executor = None
+    if max_workers != 1 and (len(tasks) > 1 or (ocr_lang and total > 1)):
+        executor = ProcessPoolExecutor(max_workers=max_workers or os.cpu_count() or 1)
+    # Pages waiting for OCR: index -> future (None when running inline)
+    ocr_pending = {}
+
+    def queue_ocr(index):
+        cached = cache.get(doc_key, index, kind='ocr') if cache is not None else None
+        if cached is not None:
+            texts[index] = cached
+        elif executor is not None:
+            ocr_pending[index] = executor.submit(ocr_page, pdf_path, index, ocr_lang)
+        else:
+            ocr_pending[index] = None
+
+    try:
+        futures = [
+            executor.submit(extract_page_range, pdf_path, start, stop) if executor else None
+            for start, stop in tasks
+        ]
+        # Pages known to be empty are OCR'd from the start, all at once; the
+        # executor bounds how many run together
+        if ocr_lang:
+            for index in sorted(texts):
+                if not texts[index].strip():
+                    del texts[index]
+                    queue_ocr(index)
+        pending_tasks = list(zip(tasks, futures))
+
+        def collect(task):
+            (start, stop), future = task
+            try:
+                results = future.result() if future else extract_page_range(pdf_path, start, stop)
+            except Exception as e:
+                raise Exception(f"Error extracting text from PDF: {str(e)}")
+            for offset, text in enumerate(results):
+                if cache is not None:
+                    cache.put(doc_key, start + offset, text)
+                if ocr_lang and not text.strip():
+                    queue_ocr(start + offset)
+                else:
+                    texts[start + offset] = text
+
+        for index in range(total):
+            # Pull finished tasks until this page is available
+            while index not in texts and index not in ocr_pending:
+                collect(pending_tasks.pop(0))
+            # Tasks that finished early queue their OCR now, not when reached
+            for task in [task for task in pending_tasks if task[1] is not None and task[1].done()]:
+                pending_tasks.remove(task)
+                collect(task)
+            if index in ocr_pending:
+                future = ocr_pending.pop(index)
+                try:
+                    text = future.result() if future else ocr_page(pdf_path, index, ocr_lang)
+                except OCRUnavailable as e:
+                    # Not cached, so the page is OCR'd once Tesseract is installed
+                    warnings.warn(f"Pages without a text layer are left empty: {e}", RuntimeWarning)
+                    text = ""
+                except Exception as e:
+                    raise Exception(f"OCR failed on page {index + 1}: {str(e)}")
+                else:
+                    if cache is not None:
+                        cache.put(doc_key, index, text, kind='ocr')
+                texts[index] = text
+            done += 1
+            if on_page:
+                on_page(done, total)
+            yield index, texts.pop(index)
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def extract_text_from_pdf(pdf_path, cache=None, max_workers=None, on_page=None, ocr_lang=None):
+    """Return the text of all pages, one page per line block"""
+    return "\n".join(text for _, text in iter_pdf_pages(pdf_path, cache, max_workers, on_page, ocr_lang))
+
+
+def extract_pdf_job(job, pdf_path, cache=None, max_workers=None, ocr_lang=None, lang_code=None, normalize=True):
+    """JobManager entry point: extract a PDF into a TextDocument, reporting
+    per-page progress. Pages go into the document as they are, never joined
+    into one string. Returns (document, normalization stats); the stats are
+    None when normalize is off."""
+    pages = iter_pdf_pages(pdf_path, cache, max_workers,
+                           on_page=lambda done, total: job.report(done * 100 // total),
+                           ocr_lang=ocr_lang)
+    # Pages are extracted in worker processes; this counts the wait for each
+    pages = stage_metrics.timed('extract', pages, size=lambda page: len(page[1].encode('utf-8')))
+    normalizer = None
+    if normalize:
+        normalizer = PageNormalizer(lang_code)
+        pages = normalizer.normalize(pages)
+    document = TextDocument.from_pages(text for _, text in pages)
+    return document, normalizer.stats() if normalizer is not None else None
@@ -0,0 +1,373 @@
+import os
+import sys
+import threading
+import time
+
+from audio import MappedAudio, PCMAudio
+from metrics import stage_metrics
+
+# Frames per block written to the sink; ~50 ms at 22 kHz keeps pause/seek snappy
+BLOCK_FRAMES = 1024
+
+STOPPED = 'stopped'
+PLAYING = 'playing'
+PAUSED = 'paused'
+
+
+class PCMSource:
+    """Random access over in-memory or mapped PCM, handing out zero-copy views"""
+
+    def __init__(self, pcm):
+        self._pcm = pcm
+        self.params = pcm.params
+        self.frame_count = pcm.frame_count
+        self._view = memoryview(pcm.data)
+        self._frame_bytes = pcm.channels * pcm.sample_width
+
+    def read(self, frame, frames):
+        start = frame * self._frame_bytes
+        return self._view[start:start + frames * self._frame_bytes]
+
+    def close(self):
+        self._view.release()
+        if isinstance(self._pcm, MappedAudio):
+            self._pcm.close()
+
+
+def open_source(source):
+    if isinstance(source, PCMAudio):
+        return PCMSource(source)
+    if isinstance(source, str):
+        # Mapped: blocks are views into the page cache, never copies
+        return PCMSource(MappedAudio(source))
+    return source
+
+
+class NullSink:
+    """Discards audio; for headless tests and throughput measurements.
+
+    With realtime=True each write sleeps for the block's duration, which
+    mimics a sound card for latency tests.
+    """
+
+    def __init__(self, realtime=False):
+        self.realtime = realtime
+        self.bytes_written = 0
+        self.blocks_written = 0
+        self._bytes_per_second = 1
+
+    def open(self, params):
+        channels, sample_width, sample_rate = params
+        self._bytes_per_second = channels * sample_width * sample_rate
+
+    def write(self, block):
+        self.bytes_written += len(block)
+        self.blocks_written += 1
+        if self.realtime:
+            time.sleep(len(block) / self._bytes_per_second)
+
+    def abort(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class SoundDeviceSink:
+    """Cross-platform output through PortAudio (the optional sounddevice package)"""
+
+    DTYPES = {1: 'uint8', 2: 'int16', 4: 'int32'}
+
+    def __init__(self):
+        import sounddevice
+        self._sounddevice = sounddevice
+        self._stream = None
+
+    def open(self, params):
+        channels, sample_width, sample_rate = params
+        self._stream = self._sounddevice.RawOutputStream(
+            samplerate=sample_rate, channels=channels, dtype=self.DTYPES[sample_width]
+        )
+        self._stream.start()
+
+    def write(self, block):
+        self._stream.write(bytes(block))
+
+    def abort(self):
+        # Drop whatever PortAudio still has buffered so pause/stop are immediate
+        if self._stream is not None:
+            self._stream.abort()
+            self._stream.start()
+
+    def close(self):
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream.close()
+            self._stream = None
+
+
+class WinsoundSink:
+    """Fallback for Windows without sounddevice.
+
+    winsound can only play whole clips, so blocks are played synchronously
+    one after another; use larger blocks to keep the joins inaudible.
+    """
+
+    block_frames = 22050
+
+    def __init__(self):
+        import winsound
+        self._winsound = winsound
+        self._params = None
+
+    def open(self, params):
+        self._params = params
+
+    def write(self, block):
+        channels, sample_width, sample_rate = self._params
+        clip = PCMAudio(bytes(block), sample_rate, channels, sample_width).to_wav_bytes()
+        self._winsound.PlaySound(clip, self._winsound.SND_MEMORY)
+
+    def abort(self):
+        self._winsound.PlaySound(None, 0)
+
+    def close(self):
+        pass
+
+
+def default_sink():
+    """Best available audio output; VOICIFY_AUDIO_SINK=null forces NullSink"""
+    if os.environ.get('VOICIFY_AUDIO_SINK') == 'null':
+        return NullSink(realtime=True)
+    try:
+        return SoundDeviceSink()
+    except (ImportError, OSError):
+        pass
+    if sys.platform == 'win32':
+        return WinsoundSink()
+    raise Exception("No audio output available. Install the 'sounddevice' package for playback.")
+
+
+class PlaybackEngine:
+    """Plays audio on its own thread in small blocks.
+
+    play/pause/stop/seek return immediately. on_position(seconds) is called
+    from the playback thread after every block and on_state(state) on every
+    state change; GUI code must marshal them to its own thread.
+    """
+
+    def __init__(self, sink_factory=default_sink, on_position=None, on_state=None, block_frames=None):
+        self.sink_factory = sink_factory
+        self.on_position = on_position
+        self.on_state = on_state
+        self.block_frames = block_frames
+        self.state = STOPPED
+        self.frames_played = 0
+        self.start_latency = None
+        self._source = None
+        self._sink = None
+        self._frame = 0
+        self._generation = 0
+        self._requested_at = 0.0
+        self._cond = threading.Condition()
+        # Set while a playback thread owns the loop; cleared under the lock
+        # by the thread itself when it decides to exit
+        self._thread = None
+
+    @property
+    def duration(self):
+        if self._source is None:
+            return 0.0
+        return self._source.frame_count / self._source.params[2]
+
+    @property
+    def position(self):
+        if self._source is None:
+            return 0.0
+        return self._frame / self._source.params[2]
+
+    def load(self, source):
+        """Load a PCMAudio, WAV path or source object, stopping current playback"""
+        self.stop()
+        with self._cond:
+            if self._source is not None:
+                self._source.close()
+            self._source = open_source(source)
+            self._frame = 0
+
+    def play(self):
+        with self._cond:
+            if self._source is None:
+                raise Exception("No audio loaded")
+            if self.state == PLAYING:
+                return
+            if self._frame >= self._source.frame_count:
+                self._frame = 0
+            self._requested_at = time.perf_counter()
+            self.start_latency = None
+            self._set_state(PLAYING)
+            if self._thread is None:
+                self._generation += 1
+                self._thread = threading.Thread(target=self._run, args=(self._generation,),
+                                                daemon=True, name="tts-playback")
+                self._thread.start()
+            self._cond.notify_all()
+
+    def pause(self):
+        with self._cond:
+            if self.state == PLAYING:
+                self._set_state(PAUSED)
+                if self._sink is not None:
+                    self._sink.abort()
+
+    def toggle(self):
+        if self.state == PLAYING:
+            self.pause()
+        else:
+            self.play()
+
+    def stop(self):
+        with self._cond:
+            if self.state == STOPPED and self._frame == 0:
+                return
+            self._frame = 0
+            self._set_state(STOPPED)
+            if self._sink is not None:
+                self._sink.abort()
+            self._cond.notify_all()
+        if self.on_position:
+            self.on_position(0.0)
+
+    def seek(self, seconds):
+        with self._cond:
+            if self._source is None:
+                return
+            rate = self._source.params[2]
+            self._frame = max(0, min(int(seconds * rate), self._source.frame_count))
+            if self.state == PLAYING and self._sink is not None:
+                self._sink.abort()
+            self._cond.notify_all()
+        if self.on_position:
+            self.on_position(self.position)
+
+    def close(self):
+        self.stop()
+        with self._cond:
+            # Retire the playback thread; a later play() starts a fresh one
+            self._generation += 1
+            self._thread = None
+            self._cond.notify_all()
+            if self._source is not None:
+                self._source.close()
+                self._source = None
+
+    def _set_state(self, state):
+        self.state = state
+        if self.on_state:
+            self.on_state(state)
+
+    def _run(self, generation):
+        sink = None
+        params = None
+        try:
+            while True:
+                with self._cond:
+                    while self.state != PLAYING and generation == self._generation:
+                        self._cond.wait(0.5)
+                        if self.state == STOPPED:
+                            break
+                    if generation != self._generation or self.state != PLAYING:
+                        if generation == self._generation:
+                            self._thread = None
+                        return
+                    source = self._source
+                    if sink is None or params != source.params:
+                        if sink is not None:
+                            sink.close()
+                        sink = self.sink_factory()
+                        params = source.params
+                        sink.open(params)
+                        self._sink = sink
+                    frames = self.block_frames or getattr(sink, 'block_frames', BLOCK_FRAMES)
+                    start = self._frame
+                    block = source.read(start, frames)
+                    if not block:
+                        self._set_state(STOPPED)
+                        self._frame = 0
+                        self._thread = None
+                        ended = True
+                    else:
+                        ended = False
+                if ended:
+                    if self.on_position:
+                        self.on_position(self.duration)
+                    return
+                # The sink blocks for roughly the block's duration; write
+                # outside the lock so controls stay responsive
+                with stage_metrics.stage('play', len(block)):
+                    sink.write(block)
+                with self._cond:
+                    if self.start_latency is None:
+                        self.start_latency = time.perf_counter() - self._requested_at
+                    written = len(block) // (params[0] * params[1])
+                    # A seek or stop during the write moved the cursor; keep it
+                    if self._frame == start and self.state == PLAYING:
+                        self._frame = start + written
+                        self.frames_played += written
+                if self.on_position:
+                    self.on_position(self.position)
+        finally:
+            with self._cond:
+                if self._sink is sink:
+                    self._sink = None
+            if sink is not None:
+                sink.close()
+
+
+def play_blocking(source, sink, block_frames=BLOCK_FRAMES, stopped=None):
+    """Play a whole source synchronously through an already opened sink;
+    stops early once the stopped event is set"""
+    opened = open_source(source)
+    frame = 0
+    try:
+        while stopped is None or not stopped.is_set():
+            block = opened.read(frame, block_frames)
+            if not block:
+                break
+            with stage_metrics.stage('play', len(block)):
+                sink.write(block)
+            frame += len(block) // (opened.params[0] * opened.params[1])
+    finally:
+        # Only what was opened here; a source object belongs to the caller
+        if opened is not source:
+            opened.close()
+
+
+class ChunkSinkPlayer:
+    """play_chunk callable for a StreamPlayer that writes every chunk to one sink"""
+
+    def __init__(self, sink_factory=default_sink):
+        self.sink = sink_factory()
+        self._params = None
+        self._stopped = threading.Event()
+
+    def __call__(self, pcm):
+        if self._stopped.is_set():
+            return
+        if pcm.params != self._params:
+            if self._params is not None:
+                self.sink.close()
+            self.sink.open(pcm.params)
+            self._params = pcm.params
+        play_blocking(pcm, self.sink, getattr(self.sink, 'block_frames', BLOCK_FRAMES), self._stopped)
+
+    def abort(self):
+        """Stop at once: the chunk playing is cut off and buffered audio dropped"""
+        self._stopped.set()
+        if self._params is not None:
+            self.sink.abort()
+
+    def close(self):
+        if self._params is not None:
+            self.sink.close()
+            self._params = None
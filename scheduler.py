@@ -0,0 +1,272 @@
+import bisect
+import heapq
+import threading
+
+from chunking import render_chunk
+from jobs import JobCancelled
+
+# Chunk priorities, most urgent first
+VISIBLE = 0
+LOOKAHEAD = 1
+PREFETCH = 2
+# Paragraphs after the visible text that are synthesized ahead of the listener
+LOOKAHEAD_PARAGRAPHS = 8
+
+
+class SynthesisScheduler:
+    """Renders a document's chunks in priority order for reading aloud.
+
+    Chunks of the text being read (or shown) come first, then a look-ahead
+    window of the paragraphs after it, then, with prefetch, the rest of the
+    document in the background. seek() moves the reading position: queued
+    work that no longer falls in the new window, or lies behind it, is
+    dropped, and chunks that now matter are queued ahead of everything
+    else. A render already running is not interrupted; it still lands in
+    the cache. One worker is always kept free of prefetch, so a seek never
+    waits behind background work.
+
+    Finished chunks go to the audio cache (or, without one, are held until
+    taken); get(index) waits for one, promoting it if it has not started.
+    Every seek starts a new generation; advance() and get() calls made for
+    an older one (by a reader the seek replaced) are ignored or refused.
+    positions gives each chunk's paragraph position in the document (see
+    TextDocument.chunk_positions); chunks with the same position are one
+    paragraph. on_rendered(index) is called as each chunk lands.
+    """
+
+    def __init__(self, chunks, synthesize_chunk, cache, key_for, max_workers=4, positions=None,
+                 lookahead=LOOKAHEAD_PARAGRAPHS, prefetch=True, key=None, on_rendered=None):
+        self.chunks = chunks
+        self.synthesize_chunk = synthesize_chunk
+        self.cache = cache
+        self.key_for = key_for
+        self.max_workers = max(1, max_workers)
+        self.positions = positions if positions is not None else list(range(len(chunks)))
+        self.lookahead = lookahead
+        self.prefetch = prefetch
+        # Identity of the conversion this schedules, for reuse across seeks
+        self.key = key
+        self.on_rendered = on_rendered
+        # Paragraph ordinal of every chunk
+        self.paragraphs = []
+        paragraph = -1
+        for index, position in enumerate(self.positions):
+            if index == 0 or position != self.positions[index - 1]:
+                paragraph += 1
+            self.paragraphs.append(paragraph)
+        self.position = 0
+        self.visible = 1
+        self.generation = 0
+        self._cond = threading.Condition()
+        self._heap = []
+        # index -> priority it is queued with; absent when not wanted
+        self._queued = {}
+        self._running = set()
+        self._running_prefetch = 0
+        self._done = set()
+        self._artifacts = {}
+        self._errors = {}
+        self._closed = False
+        self._threads = []
+        self.counts = dict.fromkeys(('rendered', 'dropped', 'promoted', 'seeks', 'failed'), 0)
+
+    def start(self):
+        for n in range(self.max_workers):
+            thread = threading.Thread(target=self._work, daemon=True, name=f"tts-schedule-{n}")
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def index_at(self, position):
+        """Index of the first chunk of the paragraph containing position"""
+        index = max(0, bisect.bisect_right(self.positions, position) - 1)
+        return bisect.bisect_left(self.positions, self.positions[index]) if self.positions else 0
+
+    def seek_position(self, position, visible_end=None):
+        """seek() to the paragraph containing a character position; the
+        paragraphs starting before visible_end count as visible. Returns the
+        index reading starts at and the new generation."""
+        index = self.index_at(position)
+        visible = 1
+        if visible_end is not None:
+            visible = bisect.bisect_left(self.positions, visible_end) - index
+        return index, self.seek(index, visible)
+
+    def priority(self, index):
+        """Priority of index for the current position, or None if not wanted"""
+        if index < self.position:
+            return None
+        if index < self.position + self.visible:
+            return VISIBLE
+        last_visible = self.paragraphs[min(len(self.chunks), self.position + self.visible) - 1]
+        if self.paragraphs[index] <= last_visible + self.lookahead:
+            return LOOKAHEAD
+        return PREFETCH if self.prefetch else None
+
+    def seek(self, index, visible=1):
+        """Read from index on, with visible chunks on screen; drops queued work
+        that is no longer wanted and queues what is. Returns the generation
+        the reader from index on passes to advance() and get()."""
+        with self._cond:
+            self.counts['seeks'] += 1
+            self.generation += 1
+            self.position = max(0, min(index, len(self.chunks)))
+            self.visible = max(1, visible)
+            queued, self._queued, self._heap = self._queued, {}, []
+            for i in range(len(self.chunks)):
+                if i in self._done or i in self._running:
+                    continue
+                priority = self.priority(i)
+                if priority is None:
+                    if i in queued:
+                        self.counts['dropped'] += 1
+                    continue
+                self._queued[i] = priority
+                self._heap.append((priority, i))
+            heapq.heapify(self._heap)
+            self._cond.notify_all()
+            return self.generation
+
+    def _stale(self, generation):
+        return generation is not None and generation != self.generation
+
+    def advance(self, index, generation=None):
+        """The listener reached index; slides the look-ahead window along"""
+        with self._cond:
+            if self._stale(generation) or index <= self.position:
+                return
+            self.position = index
+            # Only the window changes; what was prefetched stays queued
+            end = len(self.chunks)
+            for i in range(index, end):
+                priority = self.priority(i)
+                if priority not in (VISIBLE, LOOKAHEAD):
+                    break
+                self._queue(i, priority)
+
+    def _queue(self, index, priority):
+        if index in self._done or index in self._running or priority is None:
+            return
+        if self._queued.get(index, PREFETCH + 1) <= priority:
+            return
+        self._queued[index] = priority
+        heapq.heappush(self._heap, (priority, index))
+        self._cond.notify()
+
+    def _next(self):
+        """Pop the most urgent wanted chunk; None when closed"""
+        while not self._closed:
+            while self._heap:
+                priority, index = self._heap[0]
+                if self._queued.get(index) != priority:
+                    # Superseded by a later push or dropped by a seek
+                    heapq.heappop(self._heap)
+                    continue
+                if priority == PREFETCH and self._running_prefetch >= max(1, self.max_workers - 1):
+                    break
+                heapq.heappop(self._heap)
+                del self._queued[index]
+                return priority, index
+            self._cond.wait(0.5)
+        return None
+
+    def _work(self):
+        while True:
+            with self._cond:
+                task = self._next()
+                if task is None:
+                    return
+                priority, index = task
+                self._running.add(index)
+                if priority == PREFETCH:
+                    self._running_prefetch += 1
+            artifact = error = None
+            try:
+                artifact = render_chunk(self.chunks[index], index, self.synthesize_chunk, self.cache, self.key_for)
+                if self.on_rendered is not None:
+                    # Before anyone waiting sees the chunk as done
+                    self.on_rendered(index)
+            except Exception as e:
+                error = e
+            with self._cond:
+                self._running.discard(index)
+                if priority == PREFETCH:
+                    self._running_prefetch -= 1
+                if error is not None:
+                    self._errors[index] = error
+                    self.counts['failed'] += 1
+                else:
+                    self._errors.pop(index, None)
+                    self._done.add(index)
+                    self.counts['rendered'] += 1
+                    if self.cache is None:
+                        self._artifacts[index] = artifact
+                self._cond.notify_all()
+
+    def get(self, index, job=None, generation=None):
+        """Encoded audio of chunk index, waiting for it to be rendered"""
+        with self._cond:
+            if self._stale(generation):
+                raise JobCancelled("Reading moved elsewhere")
+            if index not in self._done and index not in self._running and index not in self._errors:
+                if self._queued.get(index) != VISIBLE:
+                    self.counts['promoted'] += 1
+                self._queue(index, VISIBLE)
+            while index not in self._done:
+                if index in self._errors:
+                    # Failed renders are retried by the next get()
+                    raise self._errors.pop(index)
+                if self._closed:
+                    raise JobCancelled("Scheduler was closed")
+                self._cond.wait(0.1)
+                if job is not None:
+                    job.check_cancelled()
+            artifact = self._artifacts.pop(index, None)
+        if artifact is None:
+            artifact = render_chunk(self.chunks[index], index, self.synthesize_chunk, self.cache, self.key_for)
+        return artifact
+
+    def complete(self, job=None, generation=None):
+        """Render every chunk not done yet, those before the reading position
+        included, and wait for all of them; chunks already running are
+        waited for rather than rendered again"""
+        with self._cond:
+            if self._stale(generation):
+                raise JobCancelled("Reading moved elsewhere")
+            for index in range(len(self.chunks)):
+                self._queue(index, VISIBLE)
+            while len(self._done) < len(self.chunks):
+                if self._stale(generation):
+                    raise JobCancelled("Reading moved elsewhere")
+                if self._errors:
+                    index = min(self._errors)
+                    raise self._errors.pop(index)
+                if self._closed:
+                    raise JobCancelled("Scheduler was closed")
+                self._cond.wait(0.1)
+                if job is not None:
+                    job.check_cancelled()
+
+    @property
+    def finished(self):
+        with self._cond:
+            return len(self._done) == len(self.chunks)
+
+    def close(self):
+        """Stop the workers; renders in progress finish into the cache"""
+        with self._cond:
+            self._closed = True
+            self._queued.clear()
+            self._heap = []
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'chunks': len(self.chunks),
+                'done': len(self._done),
+                'running': len(self._running),
+                'queued': len(self._queued),
+                'position': self.position,
+                **self.counts,
+            }
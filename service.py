@@ -0,0 +1,368 @@
+"""Local HTTP synthesis service: many clients share one VoiciFy core.
+
+    python service.py [--port 8765] [--max-concurrent 2] [--max-queue 64]
+
+Endpoints (all on 127.0.0.1 unless --host says otherwise):
+
+  POST /synthesize   JSON {"text", "language", "voice", "rate"}, or the text
+                     itself as the body with ?language=&voice=&rate=
+  POST /pdf          the PDF file as the body, ?language=&voice=&rate=
+  GET  /metrics      queue depth, coalescing and cache counters, stage timings
+  GET  /health
+
+Audio comes back as WAV with chunked transfer encoding, streamed from the
+shared audio cache. Identical requests that arrive while a conversion is
+running wait for that conversion instead of starting their own; at most
+--max-concurrent conversions run at once, the rest queue, and requests
+beyond --max-queue are turned away with 503.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import sys
+import time
+from urllib.parse import parse_qs, urlsplit
+
+from core import VoicifyCore
+from metrics import stage_metrics
+from synthesis import SUPPORTED_LANGUAGES
+
+MAX_BODY_BYTES = 64 << 20
+SEND_BLOCK_BYTES = 64 << 10
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class ResponseAborted(Exception):
+    """A response failed after its headers were sent; no error response
+    can follow, so the connection is dropped"""
+
+
+def language_name(value):
+    """Language name from a name or code, as plan_conversion takes it"""
+    value = value or 'English'
+    if value in SUPPORTED_LANGUAGES:
+        return value
+    for name, code in SUPPORTED_LANGUAGES.items():
+        if code.lower() == value.lower():
+            return name
+    raise HttpError(400, f"Unsupported language: {value}")
+
+
+class SynthesisService:
+    """asyncio front end over a VoicifyCore.
+
+    Conversions run as core jobs on its worker threads; the event loop only
+    parses requests, coalesces them and streams files. Requests for the
+    same conversion key share one in-flight task, so a burst of identical
+    requests costs one conversion. A finished conversion is in the audio
+    cache, and every response pins its entry while it is being sent.
+    """
+
+    def __init__(self, core, max_concurrent=2, max_queue=64):
+        self.core = core
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self._slots = asyncio.Semaphore(max_concurrent)
+        # Conversion key (or PDF digest) -> task shared by identical requests
+        self._inflight = {}
+        self.queued = 0
+        self.active = 0
+        self.peak_queued = 0
+        self.counters = dict.fromkeys((
+            'requests', 'responses', 'errors', 'rejected', 'cache_hits', 'coalesced',
+            'conversions', 'extractions', 'bytes_sent',
+        ), 0)
+        self.response_seconds = 0.0
+        self.started_at = time.time()
+
+    async def start(self, host='127.0.0.1', port=8765):
+        return await asyncio.start_server(self.handle, host, port)
+
+    # --- HTTP ---
+
+    async def handle(self, reader, writer):
+        """Serve requests on one connection until the client closes it"""
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except HttpError as e:
+                    await self._send_json(writer, e.status, {'error': str(e)}, close=True)
+                    return
+                if request is None:
+                    return
+                method, path, query, headers, body = request
+                started = time.perf_counter()
+                self.counters['requests'] += 1
+                try:
+                    await self._route(writer, method, path, query, headers, body)
+                except HttpError as e:
+                    self.counters['errors'] += 1
+                    await self._send_json(writer, e.status, {'error': str(e)})
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    return
+                except ResponseAborted:
+                    # The client sees a truncated chunked body, not a corrupt one
+                    self.counters['errors'] += 1
+                    return
+                except Exception as e:
+                    self.counters['errors'] += 1
+                    await self._send_json(writer, 500, {'error': str(e)})
+                self.counters['responses'] += 1
+                self.response_seconds += time.perf_counter() - started
+                if headers.get('connection', '').lower() == 'close':
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _read_request(self, reader):
+        line = await reader.readline()
+        if not line.strip():
+            return None
+        try:
+            method, target, _ = line.decode('latin-1').split()
+        except ValueError:
+            raise HttpError(400, "Malformed request line")
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get('content-length') or 0)
+        except ValueError:
+            raise HttpError(400, "Malformed Content-Length")
+        if length < 0:
+            raise HttpError(400, "Malformed Content-Length")
+        if length > MAX_BODY_BYTES:
+            raise HttpError(413, f"Request body over {MAX_BODY_BYTES} bytes")
+        body = await reader.readexactly(length) if length else b''
+        url = urlsplit(target)
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        return method.upper(), url.path, query, headers, body
+
+    async def _route(self, writer, method, path, query, headers, body):
+        if path == '/health':
+            await self._send_json(writer, 200, {'status': 'ok'})
+        elif path == '/metrics':
+            await self._send_json(writer, 200, self.metrics())
+        elif path in ('/synthesize', '/pdf'):
+            if method != 'POST':
+                raise HttpError(405, f"{path} takes POST")
+            if path == '/synthesize':
+                params = self._synthesis_params(query, headers, body)
+                document = params.pop('text')
+            else:
+                params = {name: query.get(name) for name in ('language', 'voice', 'rate')}
+                if not body:
+                    raise HttpError(400, "Send the PDF as the request body")
+                document = await self._extract(body, language_name(params['language']))
+            await self._synthesize(writer, document, **params)
+        else:
+            raise HttpError(404, f"No such endpoint: {path}")
+
+    def _synthesis_params(self, query, headers, body):
+        if headers.get('content-type', '').startswith('application/json'):
+            try:
+                params = json.loads(body.decode('utf-8'))
+            except ValueError as e:
+                raise HttpError(400, f"Invalid JSON: {e}")
+            if not isinstance(params, dict):
+                raise HttpError(400, "Expected a JSON object")
+        else:
+            params = dict(query, text=body.decode('utf-8', 'replace'))
+        text = params.get('text') or ''
+        if not text.strip():
+            raise HttpError(400, "No text to convert")
+        return {'text': text, 'language': params.get('language'), 'voice': params.get('voice'),
+                'rate': params.get('rate')}
+
+    async def _send_json(self, writer, status, payload, close=False):
+        body = json.dumps(payload).encode('utf-8')
+        head = [f"HTTP/1.1 {status} {REASONS.get(status, '')}", "Content-Type: application/json",
+                f"Content-Length: {len(body)}"]
+        if close:
+            head.append("Connection: close")
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+
+    async def _send_file(self, writer, path, source):
+        """Stream a cached WAV with chunked transfer encoding"""
+        head = ["HTTP/1.1 200 OK", "Content-Type: audio/wav", "Transfer-Encoding: chunked",
+                f"X-Voicify-Source: {source}"]
+        file = open(path, 'rb')
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1'))
+        try:
+            with file:
+                while True:
+                    block = file.read(SEND_BLOCK_BYTES)
+                    if not block:
+                        break
+                    writer.write(b'%x\r\n' % len(block) + block + b'\r\n')
+                    self.counters['bytes_sent'] += len(block)
+                    # Backpressure: a slow client is not buffered for in memory
+                    await writer.drain()
+            writer.write(b'0\r\n\r\n')
+            await writer.drain()
+        except ConnectionError:
+            raise
+        except Exception as e:
+            raise ResponseAborted(str(e)) from e
+
+    # --- Conversions ---
+
+    async def _synthesize(self, writer, document, language=None, voice=None, rate=None):
+        try:
+            rate = int(rate) if rate not in (None, '') else 150
+        except ValueError:
+            raise HttpError(400, f"Invalid rate: {rate}")
+        conversion = self.core.plan_conversion(document, language_name(language), voice or 'female', rate)
+        key = conversion.key
+        cache = self.core.audio_cache
+        # Held until the response is sent, so the entry cannot be evicted under it
+        cache.pin(key)
+        try:
+            path = cache.get(key)
+            source = 'cache'
+            if path:
+                self.counters['cache_hits'] += 1
+            else:
+                source = 'coalesced' if key in self._inflight else 'converted'
+                path = await self._shared(key, lambda: self._convert(conversion))
+            await self._send_file(writer, path, source)
+        finally:
+            cache.unpin(key)
+
+    async def _shared(self, key, start):
+        """Await the in-flight task for key, starting it if there is none"""
+        task = self._inflight.get(key)
+        if task is not None:
+            self.counters['coalesced'] += 1
+        else:
+            task = asyncio.ensure_future(start())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # A client that disconnects does not cancel the work for the others
+        return await asyncio.shield(task)
+
+    async def _run_job(self, submit):
+        """Wait for a free slot, submit a core job and await its result"""
+        if self.queued >= self.max_queue:
+            self.counters['rejected'] += 1
+            raise HttpError(503, f"Queue full ({self.queued} waiting)")
+        self.queued += 1
+        self.peak_queued = max(self.peak_queued, self.queued)
+        try:
+            await self._slots.acquire()
+        finally:
+            self.queued -= 1
+        self.active += 1
+        try:
+            job = submit()
+            return await asyncio.wrap_future(job.future)
+        finally:
+            self.active -= 1
+            self._slots.release()
+
+    async def _convert(self, conversion):
+        self.counters['conversions'] += 1
+        jobs = []
+
+        def submit():
+            jobs.append(self.core.start_conversion(conversion, description="Service request"))
+            return jobs[0]
+
+        try:
+            path = await self._run_job(submit)
+        finally:
+            if jobs:
+                self.core.forget_job(jobs[0].id)
+        # The job pins its result for finish_conversion(); the waiting
+        # responses hold pins of their own
+        self.core.audio_cache.unpin(conversion.key)
+        return path
+
+    async def _extract(self, data, language):
+        """TextDocument of a PDF upload; identical uploads share one extraction"""
+        digest = hashlib.sha256(data).hexdigest()
+
+        async def extract():
+            self.counters['extractions'] += 1
+            with self.core.workspace.acquire(f'upload-{digest[:16]}') as scratch:
+                pdf_path = scratch.file('upload.pdf')
+                with open(pdf_path, 'wb') as file:
+                    file.write(data)
+                document, _ = await self._run_job(lambda: self.core.extract_pdf(pdf_path, language))
+            if document.is_blank():
+                raise HttpError(400, "No text found in the PDF")
+            return document
+
+        return await self._shared(('pdf', digest, language), extract)
+
+    def metrics(self):
+        responses = self.counters['responses']
+        return {
+            'uptime_seconds': round(time.time() - self.started_at, 3),
+            'queue_depth': self.queued,
+            'peak_queue_depth': self.peak_queued,
+            'active': self.active,
+            'in_flight': len(self._inflight),
+            'max_concurrent': self.max_concurrent,
+            'max_queue': self.max_queue,
+            **self.counters,
+            'mean_response_seconds': self.response_seconds / responses if responses else 0.0,
+            'cache': self.core.audio_cache.stats(),
+            'stages': stage_metrics.rows(),
+        }
+
+
+async def serve(host, port, max_concurrent, max_queue, core=None):
+    core = core or VoicifyCore(max_workers=max(4, max_concurrent + 1))
+    try:
+        job = core.load_voices()
+        core.set_voices(await asyncio.wrap_future(job.future))
+    except Exception as e:
+        core.voices_failed(str(e))
+    service = SynthesisService(core, max_concurrent, max_queue)
+    server = await service.start(host, port)
+    print(f"Serving on http://{host}:{server.sockets[0].getsockname()[1]}", flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        core.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve speech synthesis over HTTP on this machine.")
+    parser.add_argument('--host', default='127.0.0.1', help="address to listen on (default: 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=8765, help="port to listen on; 0 picks a free one (default: 8765)")
+    parser.add_argument('--max-concurrent', type=int, default=2, help="conversions run at once (default: 2)")
+    parser.add_argument('--max-queue', type=int, default=64,
+                        help="conversions waiting for a slot before requests are refused (default: 64)")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.max_concurrent, args.max_queue))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,58 @@
+import json
+import os
+import sys
+import time
+
+# Optional dependencies that should not be imported before the window shows
+HEAVY_MODULES = ('pyttsx3', 'gtts', 'numpy', 'pydub', 'PyPDF2', 'pytesseract', 'PIL')
+
+
+class StartupTimer:
+    """Named timestamps for the app's cold start.
+
+    Times are seconds since the timer was created, which happens when
+    main.py imports this module before anything else. Each mark also records
+    which HEAVY_MODULES were loaded by then, so CI can catch an eager import.
+
+    VOICIFY_STARTUP_REPORT names a JSON file (or '-' for stdout) the report
+    is written to once startup completes; with VOICIFY_STARTUP_EXIT=1 the
+    app closes right after, for time-to-window checks.
+    """
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.marks = {}
+
+    def mark(self, name):
+        # Only the first occurrence of a mark counts
+        if name not in self.marks:
+            self.marks[name] = {
+                'seconds': round(time.perf_counter() - self.origin, 4),
+                'heavy_modules': [module for module in HEAVY_MODULES if module in sys.modules],
+            }
+
+    def report(self):
+        return {'marks': dict(self.marks), 'python': sys.version.split()[0], 'platform': sys.platform}
+
+    @property
+    def report_path(self):
+        return os.environ.get('VOICIFY_STARTUP_REPORT')
+
+    @property
+    def exit_after_report(self):
+        return os.environ.get('VOICIFY_STARTUP_EXIT') == '1'
+
+    def write_report(self, path=None):
+        path = path or self.report_path
+        if not path:
+            return None
+        report = self.report()
+        if path == '-':
+            print(json.dumps(report, indent=2))
+        else:
+            with open(path, 'w', encoding='utf-8') as file:
+                json.dump(report, file, indent=2)
+        return report
+
+
+startup_timer = StartupTimer()
@@ -0,0 +1,235 @@
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from audio import decode_artifact
+from chunking import render_chunk
+from jobs import JobCancelled
+
+_END = object()
+
+
+class StreamClosed(Exception):
+    pass
+
+
+class ChunkStream:
+    """Bounded, ordered hand-off of synthesized chunks to a playback consumer.
+
+    put() blocks while the queue is full (backpressure on synthesis) and get()
+    blocks while it is empty. Waits by the consumer after playback has started
+    are counted as underruns, i.e. audible gaps.
+    """
+
+    def __init__(self, maxsize=4):
+        self.maxsize = maxsize
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._cancelled = threading.Event()
+        self._error = None
+        self.started_at = time.perf_counter()
+        self.first_audio_at = None
+        self.chunks_in = 0
+        self.chunks_out = 0
+        self.backpressure_waits = 0
+        self.backpressure_seconds = 0.0
+        self.underruns = 0
+        self.underrun_seconds = 0.0
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+        # Unblock a producer waiting on a full queue
+        try:
+            while True:
+                self._queue.get_nowait()
+        except queue.Empty:
+            pass
+
+    def put(self, item):
+        blocked = self._queue.full()
+        waited_from = time.perf_counter()
+        while True:
+            if self.cancelled:
+                raise StreamClosed("Stream was cancelled")
+            try:
+                self._queue.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        if blocked:
+            self.backpressure_waits += 1
+            self.backpressure_seconds += time.perf_counter() - waited_from
+        self.chunks_in += 1
+
+    def close(self, error=None):
+        """Mark the end of the stream; error is re-raised to the consumer"""
+        self._error = error
+        while not self.cancelled:
+            try:
+                self._queue.put(_END, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+
+    def get(self):
+        """Return the next chunk, or raise StreamClosed at the end"""
+        underrun = self.chunks_out > 0 and self._queue.empty()
+        waited_from = time.perf_counter()
+        while True:
+            if self.cancelled:
+                raise StreamClosed("Stream was cancelled")
+            try:
+                item = self._queue.get(timeout=0.1)
+                break
+            except queue.Empty:
+                continue
+        if item is _END:
+            if self._error is not None:
+                raise self._error
+            raise StreamClosed("End of stream")
+        if underrun:
+            self.underruns += 1
+            self.underrun_seconds += time.perf_counter() - waited_from
+        if self.first_audio_at is None:
+            self.first_audio_at = time.perf_counter()
+        self.chunks_out += 1
+        return item
+
+    def __iter__(self):
+        while True:
+            try:
+                yield self.get()
+            except StreamClosed:
+                return
+
+    def stats(self):
+        return {
+            'time_to_first_audio': (self.first_audio_at - self.started_at) if self.first_audio_at else None,
+            'chunks_in': self.chunks_in,
+            'chunks_out': self.chunks_out,
+            'queue_size': self.maxsize,
+            'backpressure_waits': self.backpressure_waits,
+            'backpressure_seconds': self.backpressure_seconds,
+            'underruns': self.underruns,
+            'underrun_seconds': self.underrun_seconds,
+        }
+
+
+def stream_chunks(job, chunks, synthesize_chunk, cache, key_for, stream, max_workers=4, on_chunk=None,
+                  transform=None, consume=None):
+    """Synthesize chunks and feed them to stream strictly in order.
+
+    Each chunk is decoded to PCMAudio as it is queued. At most max_workers
+    chunks are rendered ahead of the next one to be queued, so a slow
+    listener throttles synthesis instead of letting rendered audio pile up.
+    Returns the decoded chunks in order; on_chunk(index) is called as each
+    one is queued. transform(pcm) is applied to each decoded chunk first.
+    With consume(pcm), each queued chunk is passed on instead of returned.
+    """
+    total = len(chunks)
+    pcms = [None] * total if consume is None else None
+    futures = {}
+    next_submit = 0
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="tts-stream") as executor:
+            try:
+                for index in range(total):
+                    while next_submit < total and next_submit < index + max(1, max_workers):
+                        futures[next_submit] = executor.submit(
+                            render_chunk, chunks[next_submit], next_submit,
+                            synthesize_chunk, cache, key_for
+                        )
+                        next_submit += 1
+                    future = futures.pop(index)
+                    while not wait([future], timeout=0.1).done:
+                        job.check_cancelled()
+                    pcm = decode_artifact(future.result())
+                    if transform:
+                        pcm = transform(pcm)
+                    stream.put(pcm)
+                    if consume is None:
+                        pcms[index] = pcm
+                    else:
+                        consume(pcm)
+                    if on_chunk:
+                        on_chunk(index)
+                    job.report((index + 1) * 100 // total)
+            except BaseException:
+                for future in futures.values():
+                    future.cancel()
+                raise
+    except StreamClosed:
+        raise JobCancelled("Playback stream was cancelled")
+    except JobCancelled:
+        stream.cancel()
+        raise
+    except BaseException as e:
+        stream.close(e if isinstance(e, Exception) else None)
+        raise
+    stream.close()
+    return pcms
+
+
+def stream_scheduled(job, scheduler, start, stream, transform=None, generation=None):
+    """Feed stream in order from chunk start on, taking the chunks from a
+    scheduler.SynthesisScheduler.
+
+    The scheduler is told how far the listener got, so its look-ahead window
+    moves along with playback; generation is the one the seek to start
+    returned. Progress is the share of the whole document rendered,
+    prefetched chunks included.
+    """
+    total = len(scheduler.chunks)
+    try:
+        for index in range(start, total):
+            scheduler.advance(index, generation)
+            pcm = decode_artifact(scheduler.get(index, job, generation))
+            if transform:
+                pcm = transform(pcm)
+            stream.put(pcm)
+            job.report(scheduler.stats()['done'] * 100 // total)
+    except StreamClosed:
+        raise JobCancelled("Playback stream was cancelled")
+    except JobCancelled:
+        stream.cancel()
+        raise
+    except BaseException as e:
+        stream.close(e if isinstance(e, Exception) else None)
+        raise
+    stream.close()
+
+
+class StreamPlayer(threading.Thread):
+    """Consumer thread that plays chunks from a ChunkStream as they arrive"""
+
+    def __init__(self, stream, play_chunk, on_finished=None):
+        super().__init__(daemon=True, name="tts-stream-player")
+        self.stream = stream
+        self.play_chunk = play_chunk
+        self.on_finished = on_finished
+        self.error = None
+
+    def stop(self):
+        """Stop playback now, including chunks already queued or playing"""
+        self.stream.cancel()
+        abort = getattr(self.play_chunk, 'abort', None)
+        if abort:
+            abort()
+
+    def run(self):
+        try:
+            for pcm in self.stream:
+                self.play_chunk(pcm)
+        except Exception as e:
+            self.error = e
+            self.stream.cancel()
+        finally:
+            close = getattr(self.play_chunk, 'close', None)
+            if close:
+                close()
+        if self.on_finished:
+            self.on_finished(self.stream.stats())
@@ -0,0 +1,177 @@
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from audio import ArtifactDecoder, WavAssembler, concatenate, decode_artifact, decode_artifacts
+from cache import cache_key
+from chunking import split_into_chunks, synthesize_chunks, render_chunk
+from document import TextDocument
+from streaming import stream_chunks
+
+# Supported languages for gTTS with their codes
+SUPPORTED_LANGUAGES = {
+    "English": "en",
+    "Spanish": "es",
+    "French": "fr",
+    "German": "de",
+    "Italian": "it",
+    "Portuguese": "pt",
+    "Russian": "ru",
+    "Japanese": "ja",
+    "Korean": "ko",
+    "Chinese (Simplified)": "zh-CN"
+}
+
+
+class _Assembly:
+    """Writes ordered artifacts into a WAV at output as they are consumed.
+
+    Each chunk is decoded (and post-processed) when its turn comes and
+    appended to the file, so the document is never held in memory.
+    """
+
+    def __init__(self, output, post=None):
+        self.assembler = WavAssembler(output)
+        self.post = post
+        self.decoder = ArtifactDecoder(self.assembler.append) if post is None else None
+
+    def consume(self, index, artifact):
+        if self.decoder is not None:
+            self.decoder.feed(artifact)
+        else:
+            self.assembler.append(self.post.process(decode_artifact(artifact)))
+
+    def finish(self):
+        if self.decoder is not None:
+            self.decoder.flush()
+        return self.assembler.finish()
+
+    def close(self):
+        self.assembler.close()
+
+
+def synthesize_document(job, text, backend, lang_code, voice_id, rate,
+                        cache, max_workers=4, max_chars=400, stream=None, journal=None, post=None,
+                        output=None):
+    """Chunk text at sentence boundaries, synthesize the chunks with backend
+    and return the whole document as PCMAudio. text is a str or a
+    TextDocument; a document is chunked a paragraph at a time. A list is
+    taken as chunks already split, e.g. the plan of a resumed journal.
+
+    Each chunk is cached on its own, so after an edit only the chunks whose
+    text changed go back to the engine. With output, the chunks are decoded
+    in order as they finish and written straight into a WAV at that path,
+    which is returned instead; memory use then stays flat however long the
+    document is. With a ChunkStream, chunks are also handed to the stream in
+    order as soon as they are ready. With a JobJournal, the chunk plan and
+    every finished chunk are recorded so an interrupted conversion can be
+    resumed. With a dsp.PostProcessor, the decoded chunks are time-stretched,
+    trimmed and loudness-normalized before they are joined (or streamed).
+    """
+    if isinstance(text, TextDocument):
+        chunks = text.chunks(max_chars)
+    elif isinstance(text, list):
+        chunks = text
+    else:
+        chunks = split_into_chunks(text, max_chars)
+    if not chunks:
+        raise Exception("No text to convert")
+
+    synthesize_chunk = backend.chunk_synthesizer(lang_code, voice_id, rate)
+    max_workers = backend.max_workers(max_workers)
+    on_chunk = None
+    if journal is not None:
+        journal.begin(chunks)
+        on_chunk = journal.chunk_done
+
+    def key_for(chunk):
+        return cache_key(chunk, lang_code, voice_id, rate, backend.name)
+
+    transform = post.process if post is not None else None
+    if output is not None:
+        assembly = _Assembly(output, post)
+        try:
+            if stream is not None:
+                # Streamed chunks are already decoded and processed
+                stream_chunks(job, chunks, synthesize_chunk, cache, key_for, stream, max_workers, on_chunk,
+                              transform, assembly.assembler.append)
+            else:
+                synthesize_chunks(job, chunks, synthesize_chunk, cache, key_for, max_workers, on_chunk,
+                                  assembly.consume)
+            job.check_cancelled()
+            audio = assembly.finish()
+        except BaseException:
+            assembly.close()
+            raise
+    elif stream is not None:
+        pcms = stream_chunks(job, chunks, synthesize_chunk, cache, key_for, stream, max_workers, on_chunk,
+                             transform)
+        job.check_cancelled()
+        audio = concatenate(pcms)
+    else:
+        artifacts = synthesize_chunks(job, chunks, synthesize_chunk, cache, key_for, max_workers, on_chunk)
+        job.check_cancelled()
+        if post is not None:
+            # Chunks are decoded one by one so they can be processed as a batch
+            audio = concatenate(post.process_batch([decode_artifact(artifact) for artifact in artifacts]))
+        else:
+            audio = decode_artifacts(artifacts)
+    if journal is not None:
+        journal.finish()
+    return audio
+
+
+def synthesize_pages(job, pages, backend, lang_code, voice_id, rate,
+                     cache, max_workers=4, max_chars=400, post=None, output=None):
+    """Like synthesize_document, but consumes (index, text) pages lazily.
+
+    Chunks of each page are queued for synthesis as soon as the page arrives,
+    so rendering overlaps extraction of the pages that follow (see
+    pdf_extract.iter_pdf_pages). With output, the audio is assembled into a
+    WAV at that path as chunks finish, and the path is returned.
+    """
+    synthesize_chunk = backend.chunk_synthesizer(lang_code, voice_id, rate)
+
+    def key_for(chunk):
+        return cache_key(chunk, lang_code, voice_id, rate, backend.name)
+
+    assembly = _Assembly(output, post) if output is not None else None
+    futures = []
+    collected = 0
+    artifacts = []
+    with ThreadPoolExecutor(max_workers=backend.max_workers(max_workers), thread_name_prefix="tts-page") as executor:
+        try:
+            for _, page_text in pages:
+                job.check_cancelled()
+                for chunk in split_into_chunks(page_text, max_chars):
+                    futures.append(executor.submit(
+                        render_chunk, chunk, len(futures), synthesize_chunk, cache, key_for
+                    ))
+                # Pages can be many; chunks that are ready are assembled
+                # while later pages are still being extracted
+                while assembly is not None and collected < len(futures) and futures[collected].done():
+                    assembly.consume(collected, futures[collected].result())
+                    futures[collected] = None
+                    collected += 1
+            if not futures:
+                raise Exception("No text to convert")
+            for done in range(collected, len(futures)):
+                future = futures[done]
+                while not wait([future], timeout=0.1).done:
+                    job.check_cancelled()
+                if assembly is not None:
+                    assembly.consume(done, future.result())
+                    futures[done] = None
+                else:
+                    artifacts.append(future.result())
+                job.report((done + 1) * 100 // len(futures))
+        except BaseException:
+            for future in futures:
+                if future is not None:
+                    future.cancel()
+            if assembly is not None:
+                assembly.close()
+            raise
+    if assembly is not None:
+        return assembly.finish()
+    if post is not None:
+        return concatenate(post.process_batch([decode_artifact(artifact) for artifact in artifacts]))
+    return decode_artifacts(artifacts)
@@ -0,0 +1,92 @@
+import pytest
+
+from audio import MappedAudio
+from backends import Pyttsx3Backend, backend_for_language, get_backend
+from cache import AudioCache
+from engine_pool import EnginePool
+from jobs import Job
+from synthesis import synthesize_document
+
+TEXT = "The first sentence. The second one is longer than the first.\n\nA new paragraph starts here."
+
+
+@pytest.fixture
+def stub():
+    return get_backend('stub')
+
+
+def test_stub_is_deterministic(stub):
+    assert stub.render("Hello.", 'en') == stub.render("Hello.", 'en')
+    assert stub.render("Hello.", 'en')[:4] == b'RIFF'
+    assert stub.render("Hello.", 'en') != stub.render("Hello.", 'fr')
+    assert stub.render("Hello.", 'en', 'voice') != stub.render("Hello.", 'en')
+
+
+def test_stub_length_follows_text_and_rate(stub):
+    short = len(stub.render_pcm("ab", 'en'))
+    assert len(stub.render_pcm("abcd", 'en')) == 2 * short
+    assert len(stub.render_pcm("ab", 'en', rate=300)) == short // 2
+
+
+def test_preferred_backend(monkeypatch):
+    monkeypatch.delenv('VOICIFY_BACKEND', raising=False)
+    assert backend_for_language('en').name == 'pyttsx3'
+    assert backend_for_language('fr').name == 'gtts'
+    assert backend_for_language('fr', 'stub').name == 'stub'
+    monkeypatch.setenv('VOICIFY_BACKEND', 'stub')
+    assert backend_for_language('fr').name == 'stub'
+    with pytest.raises(Exception):
+        backend_for_language('fr', 'pyttsx3')
+
+
+def test_system_languages_do_not_change_the_registry(monkeypatch):
+    monkeypatch.delenv('VOICIFY_BACKEND', raising=False)
+    assert backend_for_language('fr', system_languages=('fr',)).name == 'pyttsx3'
+    assert get_backend('pyttsx3').languages == ('en',)
+    assert backend_for_language('fr').name == 'gtts'
+
+
+def test_document_is_rendered_once_then_cached(stub, tmp_path, monkeypatch):
+    cache = AudioCache(str(tmp_path / 'cache'))
+    rendered = []
+    render = stub.render
+    monkeypatch.setattr(stub, 'render', lambda text, *args: rendered.append(text) or render(text, *args))
+
+    first = synthesize_document(Job(1), TEXT, stub, 'en', None, None, cache, max_workers=3, max_chars=30)
+    chunk_count = len(rendered)
+    assert chunk_count > 2
+    second = synthesize_document(Job(2), TEXT, stub, 'en', None, None, cache, max_workers=3, max_chars=30)
+    assert len(rendered) == chunk_count
+    assert first.data == second.data
+    assert first.data == synthesize_document(Job(3), TEXT, stub, 'en', None, None, None, max_chars=30).data
+
+
+def test_assembled_file_matches_in_memory_result(stub, tmp_path):
+    in_memory = synthesize_document(Job(1), TEXT, stub, 'en', None, None, None, max_chars=30)
+    path = synthesize_document(Job(2), TEXT, stub, 'en', None, None, None, max_chars=30,
+                               output=str(tmp_path / 'out.wav'))
+    mapped = MappedAudio(path)
+    try:
+        assert bytes(mapped.data) == bytes(in_memory.data)
+        assert mapped.params == in_memory.params
+    finally:
+        mapped.close()
+
+
+def test_engine_pool_renders_like_the_backend(stub):
+    pool = EnginePool('stub', max_processes=2)
+    try:
+        assert pool.render("Hello there.", 'en') == stub.render("Hello there.", 'en')
+        assert pool.stats()['cold_starts'] == 1
+    finally:
+        pool.shutdown()
+
+
+def test_pooled_backends_are_per_instance():
+    first, second = EnginePool('pyttsx3'), EnginePool('pyttsx3')
+    pooled = Pyttsx3Backend(first), Pyttsx3Backend(second)
+    assert [backend.pool for backend in pooled] == [first, second]
+    assert all(backend.lane is None for backend in pooled)
+    # The registered instance still renders in-process, on its lane
+    assert get_backend('pyttsx3').pool is None
+    assert get_backend('pyttsx3').lane == 'pyttsx3'
@@ -0,0 +1,86 @@
+import os
+
+import pytest
+
+from cache import AudioCache, cache_key
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return AudioCache(str(tmp_path / 'cache'), max_bytes=300)
+
+
+def test_key_covers_every_setting():
+    base = cache_key("Hello.", 'en', 'voice', 150, 'stub')
+    assert base == cache_key("Hello.", 'en', 'voice', 150, 'stub')
+    assert len({
+        base,
+        cache_key("Hello!", 'en', 'voice', 150, 'stub'),
+        cache_key("Hello.", 'fr', 'voice', 150, 'stub'),
+        cache_key("Hello.", 'en', 'other', 150, 'stub'),
+        cache_key("Hello.", 'en', 'voice', 200, 'stub'),
+        cache_key("Hello.", 'en', 'voice', 150, 'gtts'),
+        cache_key("Hello.", 'en', 'voice', 150, 'stub', 'dsp:1.2'),
+    }) == 7
+
+
+def test_round_trip_and_counters(cache):
+    assert cache.get('a') is None
+    path = cache.put_bytes('a', b'x' * 10)
+    assert cache.get('a') == path
+    assert cache.get_bytes('a') == b'x' * 10
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries'], stats['bytes']) == (2, 1, 1, 10)
+
+
+def test_evicts_least_recently_used(cache):
+    for key in 'abc':
+        cache.put_bytes(key, b'x' * 100)
+    # Touching 'a' makes 'b' the oldest
+    assert cache.get('a')
+    cache.put_bytes('d', b'x' * 100)
+    assert cache.get('b') is None
+    assert all(cache.get(key) for key in 'acd')
+    assert cache.stats()['evictions'] == 1
+    assert not os.path.exists(cache.path_for('b'))
+
+
+def test_recency_survives_restart(tmp_path):
+    directory = str(tmp_path / 'cache')
+    cache = AudioCache(directory, max_bytes=1000)
+    for n, key in enumerate('ab'):
+        path = cache.put_bytes(key, b'x' * 100)
+        os.utime(path, (1000 + n, 1000 + n))
+    reopened = AudioCache(directory, max_bytes=150)
+    assert reopened.get('a') is None
+    assert reopened.get('b')
+
+
+def test_put_moves_or_copies_the_file(cache, tmp_path):
+    source = tmp_path / 'audio.wav'
+    source.write_bytes(b'x' * 10)
+    assert cache.put('a', str(source), move=False) == cache.path_for('a')
+    assert source.exists()
+    assert cache.put('b', str(source)) == cache.path_for('b')
+    assert not source.exists()
+    assert cache.get_bytes('a') == cache.get_bytes('b') == b'x' * 10
+    # Writing a key again replaces the entry instead of counting it twice
+    cache.put_bytes('a', b'y' * 20)
+    assert cache.get_bytes('a') == b'y' * 20
+    assert cache.stats()['bytes'] == 30
+
+
+def test_entry_removed_behind_the_cache_is_a_miss(cache):
+    path = cache.put_bytes('a', b'x' * 10)
+    os.remove(path)
+    assert cache.get('a') is None
+    assert cache.stats()['bytes'] == 0
+
+
+def test_clear_removes_everything(cache):
+    for key in 'ab':
+        cache.put_bytes(key, b'x' * 10)
+    cache.clear()
+    assert cache.stats()['entries'] == 0
+    assert cache.get('a') is None
+    assert not os.path.exists(cache.path_for('b'))
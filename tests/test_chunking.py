@@ -0,0 +1,81 @@
+import threading
+
+import pytest
+
+from backends import get_backend
+from cache import AudioCache, cache_key
+from chunking import split_into_chunks, split_sentences, synthesize_chunks
+from jobs import Job, JobCancelled
+
+
+def key_for(chunk):
+    return cache_key(chunk, 'en', None, None, 'stub')
+
+
+def test_split_sentences_on_western_and_cjk_punctuation():
+    assert split_sentences("One. Two!  Three? Four") == ["One.", "Two!", "Three?", "Four"]
+    assert split_sentences("你好。再见！") == ["你好。", "再见！"]
+
+
+def test_chunks_pack_sentences_up_to_the_limit():
+    text = "First sentence here. Second sentence here. Third one."
+    assert split_into_chunks(text, 45) == ["First sentence here. Second sentence here.", "Third one."]
+    assert all(len(chunk) <= 20 for chunk in split_into_chunks(text, 20))
+
+
+def test_long_sentences_are_cut_at_words():
+    sentence = " ".join(["word"] * 30) + "."
+    chunks = split_into_chunks(sentence, 50)
+    assert all(len(chunk) <= 50 for chunk in chunks)
+    assert " ".join(chunks) == sentence
+    assert split_into_chunks("x" * 25, 10) == ["x" * 10, "x" * 10, "x" * 5]
+
+
+def test_paragraphs_are_chunked_independently():
+    first = "A short paragraph."
+    second = "Another paragraph follows."
+    # Editing one paragraph leaves the other's chunks (and cache keys) alone
+    assert split_into_chunks(f"{first}\n\n{second}") == [first, second]
+    assert split_into_chunks(f"{first} Edited.\n\n{second}")[-1] == second
+
+
+def test_synthesize_chunks_keeps_order_and_uses_the_cache(tmp_path):
+    synthesize = get_backend('stub').chunk_synthesizer('en')
+    chunks = [f"Chunk number {n}." for n in range(10)]
+    cache = AudioCache(str(tmp_path / 'cache'))
+    rendered = []
+    lock = threading.Lock()
+
+    def recording(chunk):
+        with lock:
+            rendered.append(chunk)
+        return synthesize(chunk)
+
+    artifacts = synthesize_chunks(Job(1), chunks, recording, cache, key_for, max_workers=4)
+    assert artifacts == [synthesize(chunk) for chunk in chunks]
+    assert sorted(rendered) == sorted(chunks)
+    # A second run renders nothing
+    assert synthesize_chunks(Job(2), chunks, recording, cache, key_for) == artifacts
+    assert len(rendered) == len(chunks)
+
+
+def test_synthesize_chunks_consumes_in_order():
+    synthesize = get_backend('stub').chunk_synthesizer('en')
+    chunks = [f"Chunk number {n}." for n in range(12)]
+    consumed = []
+    result = synthesize_chunks(Job(1), chunks, synthesize, None, key_for, max_workers=4,
+                               consume=lambda index, artifact: consumed.append(index))
+    assert result is None
+    assert consumed == list(range(len(chunks)))
+
+
+def test_failed_chunk_fails_the_job():
+    with pytest.raises(Exception, match="chunk 2"):
+        synthesize_chunks(Job(1), ["One.", "Two."], lambda chunk: b'' if chunk == "Two." else b'x', None, key_for)
+
+
+def test_cancelled_job_stops_synthesis():
+    job = Job(1)
+    job.cancel()
+    with pytest.raises(JobCancelled):
+        synthesize_chunks(job, ["One.", "Two."], get_backend('stub').chunk_synthesizer('en'), None, key_for)
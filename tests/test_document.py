@@ -0,0 +1,97 @@
+import pytest
+
+import document
+from chunking import split_into_chunks
+from document import TextDocument
+
+TEXT = "First line.\nSecond line is here.\n\nA new paragraph. It has two sentences."
+
+
+@pytest.fixture
+def small_pages(monkeypatch):
+    # Small pages so edits and reads cross page boundaries
+    monkeypatch.setattr(document, 'PAGE_CHARS', 8)
+
+
+def test_edits_match_a_plain_string(small_pages):
+    doc = TextDocument.from_pages(TEXT.split('\n', 1))
+    expected = TEXT
+    for position, removed, inserted in [(5, 0, "XYZ"), (0, 4, ""), (20, 10, "new\ntext"), (len(TEXT) - 8, 0, "!")]:
+        doc.replace(position, position + removed, inserted)
+        expected = expected[:position] + inserted + expected[position + removed:]
+        assert doc.text() == expected
+        assert len(doc) == len(expected)
+    assert doc.text(3, 17) == expected[3:17]
+
+
+def test_line_positions(small_pages):
+    doc = TextDocument(TEXT)
+    lines = TEXT.split('\n')
+    assert doc.line_count == len(lines)
+    position = 0
+    for number, line in enumerate(lines):
+        assert doc.line_start(number) == position
+        assert doc.line_end(number) == position + len(line)
+        assert doc.line(number) == line
+        assert doc.line_of(position) == number
+        assert doc.line_of(position + len(line)) == number
+        position += len(line) + 1
+
+
+def test_typing_undoes_a_word_at_a_time():
+    doc = TextDocument("Hi ")
+    for char in "there you":
+        doc.insert(len(doc), char)
+    assert doc.undo() == len("Hi there ")
+    assert doc.text() == "Hi there "
+    doc.undo()
+    assert doc.text() == "Hi "
+    assert not doc.can_undo
+    doc.redo()
+    doc.redo()
+    assert doc.text() == "Hi there you"
+    assert not doc.can_redo
+
+
+def test_backspace_undoes_in_one_step():
+    doc = TextDocument("Hello world")
+    for position in range(len(doc), 6, -1):
+        doc.delete(position - 1, position)
+    assert doc.text() == "Hello "
+    doc.undo()
+    assert doc.text() == "Hello world"
+
+
+def test_grouped_edits_undo_together():
+    doc = TextDocument("Hello world")
+    with doc.grouped():
+        doc.delete(0, 5)
+        doc.insert(0, "Goodbye")
+    assert doc.text() == "Goodbye world"
+    doc.undo()
+    assert doc.text() == "Hello world"
+    doc.redo()
+    assert doc.text() == "Goodbye world"
+
+
+def test_new_edit_clears_redo_and_set_text_clears_history():
+    doc = TextDocument("abc")
+    doc.insert(3, "\n")
+    doc.undo()
+    doc.insert(0, "x")
+    assert not doc.can_redo
+    doc.set_text("fresh")
+    assert not doc.can_undo
+    assert doc.undo() is None
+
+
+def test_chunk_positions_match_split_into_chunks(small_pages):
+    paragraph = "This sentence is here. " * 30
+    text = "\n\n".join([paragraph, "Short one.", paragraph.upper(), "  \n  Last.\n"])
+    doc = TextDocument.from_pages([text[:500], text[500:]], separator='')
+    assert doc.text() == text
+    positions = doc.chunk_positions(120)
+    assert [chunk for _, chunk in positions] == split_into_chunks(text, 120)
+    for position, chunk in positions:
+        # Each chunk comes from the paragraph starting at its position
+        assert chunk.split()[0] in text[position:position + 200]
@@ -0,0 +1,106 @@
+import os
+import sys
+
+import pytest
+
+import gtts_client
+from backends import get_backend
+from gtts_client import GTTSClient, GTTSError
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+import gtts_standin  # noqa: E402
+
+# Requests are built by gTTS
+pytest.importorskip('gtts')
+
+
+class ScriptedRolls:
+    """Stands in for the server's random module: replays rolls, then succeeds"""
+
+    def __init__(self, *rolls):
+        self.rolls = list(rolls)
+
+    def random(self):
+        return self.rolls.pop(0) if self.rolls else 1.0
+
+
+@pytest.fixture
+def server():
+    server = gtts_standin.StandInServer(throttle=0.5, errors=0.25, retry_after=0.05).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(server):
+    client = GTTSClient(server.url, max_concurrency=2, backoff_base=0.01, backoff_max=0.05, rate=100)
+    yield client
+    client.close()
+
+
+def test_returns_the_server_audio(server, client, monkeypatch):
+    monkeypatch.setattr(gtts_standin, 'random', ScriptedRolls())
+    audio = client.synthesize("Hello there.", 'en')
+    assert audio == get_backend('stub').render("Hello there.", 'en')
+    stats = client.stats()
+    assert stats['requests'] == 1
+    assert stats['retries'] == 0
+    assert stats['failures'] == 0
+
+
+def test_throttling_is_retried_and_slows_the_client(server, client, monkeypatch):
+    # Below `throttle`, the server answers 429 with Retry-After
+    monkeypatch.setattr(gtts_standin, 'random', ScriptedRolls(0.1, 0.1))
+    assert client.synthesize("Hello there.", 'en')
+    stats = client.stats()
+    assert stats['requests'] == 3
+    assert stats['throttled'] == 2
+    assert stats['retries'] == 2
+    assert stats['current_rate'] < 100
+    assert server.requests == 3
+
+
+def test_server_errors_are_retried(server, client, monkeypatch):
+    # Between `throttle` and `throttle + errors`, the server answers 503
+    monkeypatch.setattr(gtts_standin, 'random', ScriptedRolls(0.6))
+    assert client.synthesize("Hello there.", 'en')
+    stats = client.stats()
+    assert stats['retries'] == 1
+    assert stats['throttled'] == 0
+    assert stats['current_rate'] > 50
+
+
+def test_gives_up_after_max_retries(server, monkeypatch):
+    monkeypatch.setattr(gtts_standin, 'random', ScriptedRolls(*[0.6] * 10))
+    client = GTTSClient(server.url, max_retries=2, backoff_base=0.01, rate=100)
+    with pytest.raises(GTTSError) as error:
+        client.synthesize("Hello there.", 'en')
+    assert error.value.status == 503
+    assert client.stats()['requests'] == 3
+    assert client.stats()['failures'] == 1
+    client.close()
+
+
+def test_client_errors_are_not_retried(server, client, monkeypatch):
+    monkeypatch.setattr(gtts_standin, 'random', ScriptedRolls())
+    requests = gtts_client.prepare_requests
+    monkeypatch.setattr(gtts_client, 'prepare_requests', lambda text, lang_code, slow=False: [
+        (path, b"f.req=%5B%5D&", headers) for path, _, headers in requests(text, lang_code, slow)
+    ])
+    with pytest.raises(GTTSError) as error:
+        client.synthesize("Hello there.", 'en')
+    assert error.value.status == 400
+    assert not error.value.retryable
+    assert client.stats()['requests'] == 1
+    assert client.stats()['failures'] == 1
+
+
+def test_connections_are_kept_alive(server, client, monkeypatch):
+    monkeypatch.setattr(gtts_standin, 'random', ScriptedRolls())
+    for n in range(5):
+        client.synthesize(f"Sentence number {n}.", 'en')
+    assert client.stats()['connections_opened'] == 1
+    assert server.connections == 1
+    assert server.requests == 5
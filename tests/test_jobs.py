@@ -0,0 +1,90 @@
+import threading
+import time
+
+import pytest
+
+from jobs import JobCancelled, JobManager
+
+
+@pytest.fixture
+def manager():
+    manager = JobManager(max_workers=2)
+    yield manager
+    manager.shutdown(wait=True)
+
+
+def test_result_and_callbacks(manager):
+    finished = []
+    job = manager.submit(lambda job, a, b: a + b, 2, 3, on_finished=lambda job_id, result: finished.append(result))
+    assert job.future.result(timeout=5) == 5
+    assert finished == [5]
+    assert manager.active_count() == 0
+
+
+def test_failure_reports_message(manager):
+    failed = []
+
+    def fail(job):
+        raise Exception("engine broke")
+
+    job = manager.submit(fail, on_failed=lambda job_id, message: failed.append(message))
+    with pytest.raises(Exception, match="engine broke"):
+        job.future.result(timeout=5)
+    assert failed == ["engine broke"]
+
+
+def test_cancel_running_job(manager):
+    started = threading.Event()
+    cancelled = []
+
+    def work(job):
+        started.set()
+        while True:
+            job.report(50)
+            time.sleep(0.01)
+
+    job = manager.submit(work, on_cancelled=cancelled.append)
+    assert started.wait(5)
+    manager.cancel(job.id)
+    with pytest.raises(JobCancelled):
+        job.future.result(timeout=5)
+    assert cancelled == [job.id]
+    assert manager.active_count() == 0
+
+
+def test_cancel_queued_job_never_runs(manager):
+    release = threading.Event()
+    ran = []
+    cancelled = []
+    blocker = manager.submit(lambda job: release.wait(5), lane='engine')
+    queued = manager.submit(lambda job: ran.append(job.id), lane='engine', on_cancelled=cancelled.append)
+    manager.cancel(queued.id)
+    release.set()
+    blocker.future.result(timeout=5)
+    time.sleep(0.05)
+    assert ran == []
+    assert cancelled == [queued.id]
+    assert manager.active_count() == 0
+
+
+def test_lane_runs_in_order_on_one_thread(manager):
+    seen = []
+
+    def record(job, n):
+        seen.append((n, threading.current_thread().name))
+        time.sleep(0.01)
+
+    jobs = [manager.submit(record, n, lane='pyttsx3') for n in range(6)]
+    for job in jobs:
+        job.future.result(timeout=5)
+    assert [n for n, _ in seen] == list(range(6))
+    assert len({name for _, name in seen}) == 1
+    assert seen[0][1].startswith('tts-pyttsx3')
+
+
+def test_lanes_do_not_block_the_pool(manager):
+    release = threading.Event()
+    blocked = manager.submit(lambda job: release.wait(5), lane='engine')
+    assert manager.submit(lambda job: 'free').future.result(timeout=5) == 'free'
+    release.set()
+    blocked.future.result(timeout=5)
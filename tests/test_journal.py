@@ -0,0 +1,136 @@
+import os
+import threading
+import time
+
+import pytest
+
+from backends import get_backend
+from cache import AudioCache, cache_key
+from core import VoicifyCore
+from journal import JobJournal
+from scheduler import SynthesisScheduler
+
+CHUNKS = ["The first chunk.", "The second chunk.", "The third chunk."]
+
+
+def journal(directory, key='doc', **settings):
+    return JobJournal(str(directory), key, "English: The first chunk", 'en', 'stub', **settings)
+
+
+def test_begin_and_chunk_done_round_trip(tmp_path):
+    written = journal(tmp_path, rate=150, post={'rate_factor': 1.5})
+    written.begin(CHUNKS)
+    written.chunk_done(0)
+    written.chunk_done(2)
+    written.chunk_done(2)
+    loaded = JobJournal.load(str(tmp_path), 'doc')
+    assert loaded.chunks == CHUNKS
+    assert loaded.completed == {0, 2}
+    assert loaded.remaining == 1
+    assert (loaded.description, loaded.lang_code, loaded.backend, loaded.rate) == (
+        "English: The first chunk", 'en', 'stub', 150)
+    assert loaded.post == {'rate_factor': 1.5}
+
+
+def test_begin_keeps_progress_of_the_same_plan_only(tmp_path):
+    first = journal(tmp_path)
+    first.begin(CHUNKS)
+    first.chunk_done(1)
+    again = JobJournal.load(str(tmp_path), 'doc')
+    again.begin(CHUNKS)
+    assert again.completed == {1}
+    again.begin(CHUNKS[:2])
+    assert JobJournal.load(str(tmp_path), 'doc').completed == set()
+
+
+def test_load_ignores_a_torn_log_and_missing_plans(tmp_path):
+    written = journal(tmp_path)
+    written.begin(CHUNKS)
+    with open(written.log_path, 'a') as log:
+        log.write('1\n7\n2')
+    # 7 is out of range, '2' without its newline may be torn but is whole
+    assert JobJournal.load(str(tmp_path), 'doc').completed == {1, 2}
+    assert JobJournal.load(str(tmp_path), 'other') is None
+    written.finish()
+    assert JobJournal.load(str(tmp_path), 'doc') is None
+    assert os.listdir(tmp_path) == []
+
+
+def test_pending_is_most_recent_first(tmp_path):
+    for age, key in enumerate(['new', 'middle', 'old']):
+        written = journal(tmp_path, key)
+        written.begin(CHUNKS)
+        then = time.time() - age * 60
+        os.utime(written.plan_path, (then, then))
+        os.utime(written.log_path, (then, then))
+    assert [pending.key for pending in JobJournal.pending(str(tmp_path))] == ['new', 'middle', 'old']
+
+
+def test_pending_expires_and_caps_old_journals(tmp_path):
+    for age, key in enumerate(['a', 'b', 'c', 'd']):
+        written = journal(tmp_path, key)
+        written.begin(CHUNKS)
+        then = time.time() - age * 3600
+        os.utime(written.plan_path, (then, then))
+        os.utime(written.log_path, (then, then))
+    # A log whose plan is gone
+    open(os.path.join(tmp_path, 'orphan.log'), 'w').close()
+    pending = JobJournal.pending(str(tmp_path), max_age=2.5 * 3600, limit=2)
+    assert [journal.key for journal in pending] == ['a', 'b']
+    assert sorted(os.listdir(tmp_path)) == ['a.json', 'a.log', 'b.json', 'b.log']
+
+
+def test_scheduler_journals_chunks_as_they_render(tmp_path):
+    stub = get_backend('stub')
+    written = journal(tmp_path / 'journal')
+    written.begin(CHUNKS)
+    scheduler = SynthesisScheduler(
+        CHUNKS, stub.chunk_synthesizer('en'), AudioCache(str(tmp_path / 'cache')),
+        lambda chunk: cache_key(chunk, 'en', None, None, 'stub'), max_workers=2, prefetch=False,
+        on_rendered=written.chunk_done,
+    ).start()
+    try:
+        scheduler.seek(0)
+        scheduler.get(0)
+    finally:
+        scheduler.close()
+    assert 0 in JobJournal.load(str(tmp_path / 'journal'), 'doc').completed
+
+
+@pytest.fixture
+def core(tmp_path, monkeypatch):
+    monkeypatch.setenv('VOICIFY_BACKEND', 'stub')
+    core = VoicifyCore(temp_dir=str(tmp_path / 'tmp'), cache_dir=str(tmp_path / 'cache'), engine_processes=0)
+    yield core
+    core.close()
+
+
+def cancelled_conversion(core, monkeypatch, discard):
+    started = threading.Event()
+    stub = get_backend('stub')
+    render = stub.render
+
+    def slow_render(*args, **kwargs):
+        started.set()
+        time.sleep(0.1)
+        return render(*args, **kwargs)
+
+    monkeypatch.setattr(stub, 'render', slow_render)
+    stopped = threading.Event()
+    conversion = core.plan_conversion(" ".join(f"Sentence {n} of many." for n in range(200)), 'English')
+    job = core.start_conversion(conversion, description="Long text", on_cancelled=lambda job_id: stopped.set())
+    assert started.wait(5)
+    core.cancel(job.id, discard=discard)
+    assert stopped.wait(5)
+    core.forget_job(job.id)
+    return conversion
+
+
+def test_cancelled_conversion_can_be_resumed(core, monkeypatch):
+    conversion = cancelled_conversion(core, monkeypatch, discard=False)
+    assert [journal.key for journal in core.pending_conversions()] == [conversion.key]
+
+
+def test_discarded_conversion_is_not_offered_again(core, monkeypatch):
+    cancelled_conversion(core, monkeypatch, discard=True)
+    assert core.pending_conversions() == []
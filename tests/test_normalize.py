@@ -0,0 +1,87 @@
+from normalize import PageNormalizer
+
+
+def normalize(pages, lang_code='en'):
+    normalizer = PageNormalizer(lang_code)
+    cleaned = [text for _, text in normalizer.normalize(enumerate(pages))]
+    return cleaned, normalizer.stats()
+
+
+def book(pages=6):
+    return [
+        f"The Running Title\n\nBody text of page {n} goes on for a while.\nAnd a second line here.\n\n{n + 1}"
+        for n in range(pages)
+    ]
+
+
+def test_removes_running_headers_and_page_numbers():
+    cleaned, stats = normalize(book())
+    assert all("Running Title" not in text for text in cleaned)
+    assert cleaned[3] == "Body text of page 3 goes on for a while.\nAnd a second line here."
+    assert stats['headers_footers'] == 6
+    assert stats['page_numbers'] == 6
+    assert stats['chars_saved'] > 0
+
+
+def test_keeps_a_heading_seen_once():
+    pages = book()
+    pages[0] = "Chapter One\n\n" + pages[0]
+    cleaned, _ = normalize(pages)
+    assert cleaned[0].startswith("Chapter One")
+
+
+def test_keeps_short_words_that_look_like_roman_numerals():
+    pages = book()
+    pages[2] = "I\nthink this page is fine.\nMore text follows here.\nmix"
+    cleaned, stats = normalize(pages)
+    assert cleaned[2] == "I\nthink this page is fine.\nMore text follows here.\nmix"
+    assert stats['page_numbers'] == 5
+
+
+def test_joins_words_hyphenated_across_lines():
+    cleaned, stats = normalize(["A long and diffi-\ncult sentence about inter-\nnational synthesis."])
+    assert cleaned[0] == "A long and difficult sentence about international synthesis."
+    assert stats['hyphenations'] == 2
+
+
+def test_keeps_the_hyphen_of_compounds():
+    cleaned, _ = normalize(["A well-\nknown author, very self-\naware."])
+    assert cleaned[0] == "A well-known author, very self-aware."
+
+
+def test_joins_a_word_hyphenated_across_pages():
+    cleaned, _ = normalize(["The end of the page is a hyphen-\n", "ated word and more."])
+    assert cleaned[0] == "The end of the page is a hyphenated"
+    assert cleaned[1] == "word and more."
+
+
+def test_expands_abbreviations():
+    cleaned, stats = normalize(["See Fig. 2, e.g. the diagram, and apples etc.\n\nNo. I won't, but No. 5 will."])
+    assert cleaned[0] == (
+        "See Figure 2, for example the diagram, and apples et cetera.\n\n"
+        "No. I won't, but number 5 will."
+    )
+    assert stats['abbreviations'] == 4
+
+
+def test_keeps_paragraphs_that_differ_only_in_numbers():
+    steps = "Step 1: open the box carefully.\n\nStep 2: open the box carefully.\n\nStep 3: open the box carefully."
+    money = "1500 dollars in 2019 were spent on it.\n\n2300 dollars in 2020 were spent on it."
+    cleaned, stats = normalize([steps, money])
+    assert cleaned == [steps, money]
+    assert stats['duplicates'] == 0
+
+
+def test_keeps_a_paragraph_repeated_within_a_page():
+    page = "This paragraph is said twice.\n\nThis paragraph is said twice."
+    cleaned, _ = normalize([page])
+    assert cleaned == [page]
+
+
+def test_drops_a_paragraph_repeated_across_a_page_break():
+    cleaned, stats = normalize([
+        "First paragraph of the page.\n\nA paragraph the extractor repeats.",
+        "A paragraph  the extractor\nrepeats.\n\nThe story goes on.",
+    ])
+    assert cleaned == ["First paragraph of the page.\n\nA paragraph the extractor repeats.", "The story goes on."]
+    assert stats['duplicates'] == 1
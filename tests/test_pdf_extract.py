@@ -0,0 +1,46 @@
+import pytest
+
+import pdf_extract
+from ocr import OCRUnavailable
+from pdf_extract import PageCache, iter_pdf_pages
+
+PAGES = ["", "Page two has text.", "   ", "Page four has text."]
+
+
+@pytest.fixture
+def pdf(tmp_path, monkeypatch):
+    path = tmp_path / 'book.pdf'
+    path.write_bytes(b'%PDF-1.4')
+    monkeypatch.setattr(pdf_extract, 'count_pages', lambda pdf_path: len(PAGES))
+    monkeypatch.setattr(pdf_extract, 'extract_page_range', lambda pdf_path, start, stop: PAGES[start:stop])
+    return str(path)
+
+
+def test_ocrs_pages_without_a_text_layer(pdf, tmp_path, monkeypatch):
+    monkeypatch.setattr(pdf_extract, 'ocr_page', lambda pdf_path, index, ocr_lang: f"Scanned page {index + 1}.")
+    cache = PageCache(str(tmp_path / 'pages'))
+    pages = list(iter_pdf_pages(pdf, cache, max_workers=1, ocr_lang='eng'))
+    assert pages == [(0, "Scanned page 1."), (1, PAGES[1]), (2, "Scanned page 3."), (3, PAGES[3])]
+    assert cache.get(pdf_extract.document_key(pdf), 0, kind='ocr') == "Scanned page 1."
+
+
+def test_missing_tesseract_leaves_pages_empty(pdf, tmp_path, monkeypatch):
+    def unavailable(pdf_path, index, ocr_lang):
+        raise OCRUnavailable("Tesseract OCR is not installed or not on PATH")
+
+    monkeypatch.setattr(pdf_extract, 'ocr_page', unavailable)
+    cache = PageCache(str(tmp_path / 'pages'))
+    with pytest.warns(RuntimeWarning, match="not installed"):
+        pages = list(iter_pdf_pages(pdf, cache, max_workers=1, ocr_lang='eng'))
+    assert pages == [(0, ""), (1, PAGES[1]), (2, ""), (3, PAGES[3])]
+    # Nothing is cached, so installing Tesseract later still OCRs the page
+    assert cache.get(pdf_extract.document_key(pdf), 0, kind='ocr') is None
+
+
+def test_other_ocr_errors_fail_the_page(pdf, monkeypatch):
+    def broken(pdf_path, index, ocr_lang):
+        raise Exception("image is corrupt")
+
+    monkeypatch.setattr(pdf_extract, 'ocr_page', broken)
+    with pytest.raises(Exception, match="OCR failed on page 1"):
+        list(iter_pdf_pages(pdf, max_workers=1, ocr_lang='eng'))
@@ -0,0 +1,167 @@
+import threading
+from collections import Counter
+
+import pytest
+
+from backends import get_backend
+from cache import AudioCache, cache_key
+from core import VoicifyCore
+from jobs import JobCancelled
+from scheduler import SynthesisScheduler
+from streaming import ChunkStream, StreamClosed
+
+CHUNKS = [f"Paragraph number {n}." for n in range(8)]
+
+
+def key_for(chunk):
+    return cache_key(chunk, 'en', None, None, 'stub')
+
+
+class Recorder:
+    """Stub synthesis that records the chunks rendered, optionally held
+    until released"""
+
+    def __init__(self, hold=False):
+        self.synthesize = get_backend('stub').chunk_synthesizer('en')
+        self.order = []
+        self.renders = Counter()
+        self.started = threading.Event()
+        self.release = threading.Event()
+        if not hold:
+            self.release.set()
+        self._lock = threading.Lock()
+
+    def __call__(self, chunk):
+        with self._lock:
+            self.order.append(CHUNKS.index(chunk))
+            self.renders[chunk] += 1
+        self.started.set()
+        assert self.release.wait(5)
+        return self.synthesize(chunk)
+
+
+def scheduler_for(tmp_path, recorder, **kwargs):
+    return SynthesisScheduler(CHUNKS, recorder, AudioCache(str(tmp_path / 'cache')), key_for, **kwargs)
+
+
+def test_chunks_render_in_priority_order(tmp_path):
+    recorder = Recorder()
+    rendered = threading.Semaphore(0)
+    scheduler = scheduler_for(tmp_path, recorder, max_workers=1, lookahead=1,
+                              on_rendered=lambda index: rendered.release())
+    # Queued before any worker runs, so the order is the heap's alone
+    generation = scheduler.seek(3, visible=2)
+    scheduler.start()
+    try:
+        # Waiting with get() would promote the chunk waited for
+        for _ in range(5):
+            assert rendered.acquire(timeout=5)
+        # Visible, then the look-ahead paragraph, then prefetch; nothing
+        # behind the reading position
+        assert recorder.order == [3, 4, 5, 6, 7]
+        scheduler.complete(generation=generation)
+    finally:
+        scheduler.close()
+    assert recorder.order == [3, 4, 5, 6, 7, 0, 1, 2]
+
+
+def test_seek_drops_queued_work(tmp_path):
+    recorder = Recorder(hold=True)
+    scheduler = scheduler_for(tmp_path, recorder, max_workers=1, prefetch=False, lookahead=len(CHUNKS))
+    scheduler.seek(0)
+    scheduler.start()
+    try:
+        assert recorder.started.wait(5)
+        generation = scheduler.seek(5, visible=3)
+        recorder.release.set()
+        for index in (5, 6, 7):
+            scheduler.get(index, generation=generation)
+        stats = scheduler.stats()
+    finally:
+        scheduler.close()
+    # Chunk 0 was running and still finished; 1-4 were dropped
+    assert recorder.order == [0, 5, 6, 7]
+    assert stats['dropped'] == 4
+    assert stats['seeks'] == 2
+
+
+def test_stale_generation_is_refused(tmp_path):
+    recorder = Recorder()
+    scheduler = scheduler_for(tmp_path, recorder, max_workers=2)
+    old = scheduler.seek(0)
+    new = scheduler.seek(4)
+    scheduler.start()
+    try:
+        with pytest.raises(JobCancelled):
+            scheduler.get(0, generation=old)
+        with pytest.raises(JobCancelled):
+            scheduler.complete(generation=old)
+        # The replaced reader cannot move the window either
+        scheduler.advance(6, old)
+        assert scheduler.position == 4
+        assert scheduler.get(4, generation=new)
+    finally:
+        scheduler.close()
+
+
+def test_complete_renders_each_chunk_once(tmp_path):
+    recorder = Recorder()
+    scheduler = scheduler_for(tmp_path, recorder, max_workers=3)
+    generation = scheduler.seek(4)
+    scheduler.start()
+    try:
+        scheduler.get(4, generation=generation)
+        scheduler.complete(generation=generation)
+        # Everything is in the cache now; reading it again renders nothing
+        artifacts = [scheduler.get(index, generation=generation) for index in range(len(CHUNKS))]
+        stats = scheduler.stats()
+    finally:
+        scheduler.close()
+    assert all(artifacts)
+    assert recorder.renders == Counter(CHUNKS)
+    assert stats['rendered'] == len(CHUNKS)
+    assert stats['done'] == len(CHUNKS)
+
+
+@pytest.fixture
+def core(tmp_path, monkeypatch):
+    monkeypatch.setenv('VOICIFY_BACKEND', 'stub')
+    core = VoicifyCore(temp_dir=str(tmp_path / 'tmp'), cache_dir=str(tmp_path / 'cache'), engine_processes=0)
+    yield core
+    core.close()
+
+
+def run(start, *args, **kwargs):
+    finished = threading.Event()
+    results = []
+
+    def on_finished(job_id, path):
+        results.append(path)
+        finished.set()
+
+    start(*args, on_finished=on_finished, on_failed=lambda *_: finished.set(), **kwargs)
+    assert finished.wait(10)
+    assert results
+    return results[0]
+
+
+def test_reading_a_cached_result_starts_at_the_cursor(core, monkeypatch):
+    text = "\n\n".join(CHUNKS)
+    conversion = core.plan_conversion(text, 'English')
+    cached_path = run(core.start_conversion, conversion)
+    assert core.use_cached(conversion) == cached_path
+    # The cached result is used as it is, not assembled again
+    monkeypatch.setattr(core, '_synthesize_result', None)
+
+    stream = ChunkStream(maxsize=len(CHUNKS))
+    position = text.index(CHUNKS[5])
+    path = run(core.start_reading, conversion, stream, position=position)
+    pcms = []
+    try:
+        while True:
+            pcms.append(stream.get())
+    except StreamClosed:
+        pass
+    stub = get_backend('stub')
+    assert [pcm.data for pcm in pcms] == [stub.render_pcm(chunk, 'en') for chunk in CHUNKS[5:]]
+    assert path == cached_path
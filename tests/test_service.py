@@ -0,0 +1,141 @@
+import asyncio
+import http.client
+import json
+import socket
+import threading
+import time
+
+import pytest
+
+from backends import get_backend
+from core import VoicifyCore
+from service import SynthesisService
+
+
+@pytest.fixture
+def core(tmp_path, monkeypatch):
+    monkeypatch.setenv('VOICIFY_BACKEND', 'stub')
+    core = VoicifyCore(temp_dir=str(tmp_path / 'tmp'), cache_dir=str(tmp_path / 'cache'), engine_processes=0)
+    yield core
+    core.close()
+
+
+@pytest.fixture
+def slow_stub(monkeypatch):
+    """Stub renders take long enough for requests to overlap"""
+    stub = get_backend('stub')
+    render = stub.render
+
+    def slow_render(*args, **kwargs):
+        time.sleep(0.3)
+        return render(*args, **kwargs)
+
+    monkeypatch.setattr(stub, 'render', slow_render)
+
+
+@pytest.fixture
+def start_service(core):
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    servers = []
+
+    def start(**options):
+        service = SynthesisService(core, **options)
+        server = asyncio.run_coroutine_threadsafe(service.start(port=0), loop).result(5)
+        servers.append(server)
+        return service, server.sockets[0].getsockname()[1]
+
+    yield start
+
+    async def shutdown():
+        for server in servers:
+            server.close()
+        # Connection handlers still waiting for another request
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    asyncio.run_coroutine_threadsafe(shutdown(), loop).result(5)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+    loop.close()
+
+
+def post(port, text, language='en'):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    connection.request('POST', '/synthesize', json.dumps({'text': text, 'language': language}),
+                       {'Content-Type': 'application/json'})
+    response = connection.getresponse()
+    body = response.read()
+    connection.close()
+    return response, body
+
+
+def in_parallel(calls):
+    results = [None] * len(calls)
+
+    def run(index, call):
+        results[index] = call()
+
+    threads = [threading.Thread(target=run, args=(index, call)) for index, call in enumerate(calls)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+    return results
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_streams_wav_chunked_then_serves_from_cache(start_service):
+    service, port = start_service()
+    response, body = post(port, "Hello from the service.")
+    assert response.status == 200
+    assert response.getheader('Transfer-Encoding') == 'chunked'
+    assert response.getheader('X-Voicify-Source') == 'converted'
+    assert body[:4] == b'RIFF'
+    again, cached = post(port, "Hello from the service.")
+    assert again.getheader('X-Voicify-Source') == 'cache'
+    assert cached == body
+
+
+def test_identical_requests_share_one_conversion(start_service, slow_stub):
+    service, port = start_service()
+    results = in_parallel([lambda: post(port, "Everyone asks for this.")] * 4)
+    assert all(response.status == 200 for response, _ in results)
+    assert len({body for _, body in results}) == 1
+    assert service.counters['conversions'] == 1
+    assert service.counters['coalesced'] == 3
+
+
+def test_rejects_requests_beyond_the_queue(start_service, slow_stub):
+    service, port = start_service(max_concurrent=1, max_queue=1)
+    first = threading.Thread(target=post, args=(port, "The first text."))
+    first.start()
+    wait_for(lambda: service.active == 1)
+    second = threading.Thread(target=post, args=(port, "The second text."))
+    second.start()
+    wait_for(lambda: service.queued == 1)
+    response, body = post(port, "The third text.")
+    assert response.status == 503
+    assert 'Queue full' in json.loads(body)['error']
+    first.join(30)
+    second.join(30)
+    assert service.counters['rejected'] == 1
+
+
+@pytest.mark.parametrize('length', ['ten', '-5'])
+def test_rejects_a_malformed_content_length(start_service, length):
+    service, port = start_service()
+    with socket.create_connection(('127.0.0.1', port), timeout=5) as connection:
+        connection.sendall(f"POST /synthesize HTTP/1.1\r\nContent-Length: {length}\r\n\r\n".encode('latin-1'))
+        reply = connection.makefile('rb').read()
+    assert reply.startswith(b'HTTP/1.1 400 ')
+    assert b'Content-Length' in reply
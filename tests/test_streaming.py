@@ -0,0 +1,162 @@
+import threading
+import time
+
+import pytest
+
+from audio import PCMAudio
+from backends import get_backend
+from jobs import Job, JobCancelled
+from playback import ChunkSinkPlayer, NullSink
+from streaming import ChunkStream, StreamClosed, StreamPlayer, stream_chunks
+
+
+def tone(seconds=0.1, sample_rate=16000):
+    return PCMAudio(b'\1\0' * int(seconds * sample_rate), sample_rate)
+
+
+def drain(stream, delay=0.0):
+    items = []
+    try:
+        while True:
+            items.append(stream.get())
+            time.sleep(delay)
+    except StreamClosed:
+        return items
+
+
+def test_put_blocks_when_full():
+    stream = ChunkStream(maxsize=2)
+    stream.put(1)
+    stream.put(2)
+    done = threading.Event()
+
+    def producer():
+        stream.put(3)
+        done.set()
+
+    threading.Thread(target=producer, daemon=True).start()
+    assert not done.wait(0.2)
+    assert stream.get() == 1
+    assert done.wait(2)
+    assert stream.stats()['backpressure_waits'] == 1
+
+
+def test_underruns_count_waits_after_playback_started():
+    stream = ChunkStream(maxsize=4)
+    stream.put(1)
+    assert stream.get() == 1
+
+    def late_producer():
+        time.sleep(0.15)
+        stream.put(2)
+        stream.close()
+
+    threading.Thread(target=late_producer, daemon=True).start()
+    assert drain(stream) == [2]
+    stats = stream.stats()
+    assert stats['underruns'] == 1
+    assert stats['underrun_seconds'] >= 0.1
+    assert stats['time_to_first_audio'] is not None
+
+
+def test_close_passes_error_to_consumer():
+    stream = ChunkStream()
+    stream.close(ValueError("render failed"))
+    with pytest.raises(ValueError):
+        stream.get()
+
+
+def test_cancel_unblocks_producer_and_consumer():
+    stream = ChunkStream(maxsize=1)
+    stream.put(1)
+    thread = threading.Thread(target=lambda: stream.put(2), daemon=True)
+    thread.start()
+    time.sleep(0.05)
+    stream.cancel()
+    thread.join(2)
+    assert not thread.is_alive()
+    with pytest.raises(StreamClosed):
+        stream.put(3)
+    with pytest.raises(StreamClosed):
+        stream.get()
+
+
+def test_stream_chunks_in_order_with_slow_consumer():
+    stub = get_backend('stub')
+    chunks = [f"Chunk number {n}." for n in range(12)]
+    stream = ChunkStream(maxsize=2)
+    consumer = []
+    thread = threading.Thread(target=lambda: consumer.extend(drain(stream, 0.01)))
+    thread.start()
+    pcms = stream_chunks(Job(1), chunks, stub.chunk_synthesizer('en'), None, None, stream, max_workers=4)
+    thread.join(5)
+    expected = [stub.render_pcm(chunk, 'en') for chunk in chunks]
+    assert [pcm.data for pcm in pcms] == expected
+    assert [pcm.data for pcm in consumer] == expected
+    assert stream.stats()['backpressure_waits'] > 0
+
+
+def test_cancelling_the_job_cancels_the_stream():
+    started = threading.Event()
+
+    def slow_chunk(text):
+        started.set()
+        time.sleep(0.05)
+        return get_backend('stub').render(text, 'en')
+
+    job = Job(1)
+    stream = ChunkStream(maxsize=2)
+    errors = []
+
+    def run():
+        try:
+            stream_chunks(job, [f"Chunk {n}." for n in range(50)], slow_chunk, None, None, stream, max_workers=2)
+        except JobCancelled as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    assert started.wait(2)
+    job.cancel()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert len(errors) == 1
+    assert stream.cancelled
+
+
+def test_closing_the_stream_cancels_synthesis():
+    stream = ChunkStream(maxsize=1)
+    stub = get_backend('stub')
+    stream.cancel()
+    with pytest.raises(JobCancelled):
+        stream_chunks(Job(1), ["One.", "Two.", "Three."], stub.chunk_synthesizer('en'), None, None, stream)
+
+
+def test_stream_player_plays_everything_to_the_sink():
+    sink = NullSink()
+    stream = ChunkStream(maxsize=2)
+    finished = []
+    player = StreamPlayer(stream, ChunkSinkPlayer(lambda: sink), on_finished=finished.append)
+    player.start()
+    for _ in range(5):
+        stream.put(tone())
+    stream.close()
+    player.join(5)
+    assert sink.bytes_written == 5 * len(tone().data)
+    assert finished[0]['chunks_out'] == 5
+
+
+def test_stream_player_stop_cuts_off_queued_audio():
+    sink = NullSink(realtime=True)
+    stream = ChunkStream(maxsize=4)
+    player = StreamPlayer(stream, ChunkSinkPlayer(lambda: sink))
+    player.start()
+    for _ in range(3):
+        stream.put(tone(1.0))
+    time.sleep(0.2)
+    player.stop()
+    player.join(2)
+    assert not player.is_alive()
+    assert sink.bytes_written < len(tone(1.0).data)
+    with pytest.raises(StreamClosed):
+        stream.put(tone())
@@ -0,0 +1,106 @@
+import os
+
+import pytest
+
+from cache import AudioCache
+from workspace import Workspace
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return AudioCache(str(tmp_path / 'cache'), max_bytes=300)
+
+
+def test_pinned_entries_survive_eviction(cache):
+    cache.put_bytes('a', b'x' * 100)
+    cache.pin('a')
+    cache.pin('a')
+    for key in 'bcd':
+        cache.put_bytes(key, b'x' * 100)
+    assert cache.get('a')
+    assert cache.get('b') is None
+    # Pins are counted: one unpin leaves it protected
+    cache.unpin('a')
+    cache.put_bytes('e', b'x' * 100)
+    assert cache.get('a')
+    cache.unpin('a')
+    for key in 'fgh':
+        cache.put_bytes(key, b'x' * 100)
+    assert cache.get('a') is None
+
+
+def test_pins_are_shared_between_instances(tmp_path):
+    directory = str(tmp_path / 'shared')
+    first = AudioCache(directory, max_bytes=250)
+    second = AudioCache(directory, max_bytes=250)
+    first.put_bytes('a', b'x' * 100)
+    first.pin('a')
+    second._load()
+    for key in 'bc':
+        second.put_bytes(key, b'x' * 100)
+    assert os.path.exists(first.path_for('a'))
+    first.unpin('a')
+
+
+def test_pins_of_exited_instances_are_ignored(cache, monkeypatch):
+    cache.put_bytes('a', b'x' * 100)
+    os.makedirs(cache._pin_dir('a'))
+    # A marker left by a process that is no longer running
+    open(os.path.join(cache._pin_dir('a'), '999999'), 'w').close()
+    monkeypatch.setattr('cache.pid_alive', lambda pid: pid != 999999)
+    for key in 'bcd':
+        cache.put_bytes(key, b'x' * 100)
+    assert cache.get('a') is None
+    assert not os.path.exists(cache._pin_dir('a'))
+
+
+def test_instances_work_in_their_own_directories(tmp_path):
+    first = Workspace(str(tmp_path))
+    second = Workspace(str(tmp_path))
+    assert first.path != second.path
+    with first.acquire('job') as job, second.acquire('job') as other:
+        assert job.path != other.path
+    first.close()
+    assert not os.path.exists(first.path)
+    assert os.path.isdir(second.path)
+    second.close()
+
+
+def test_job_directories_are_reference_counted(tmp_path):
+    workspace = Workspace(str(tmp_path))
+    job = workspace.acquire('job')
+    with open(job.file('audio.wav'), 'wb') as file:
+        file.write(b'data')
+    # Held again while its file is played
+    workspace.acquire('job')
+    job.release()
+    assert os.path.exists(job.file('audio.wav'))
+    assert workspace.active() == {'job': 1}
+    job.release()
+    assert not os.path.exists(job.path)
+    assert workspace.active() == {}
+    workspace.close()
+
+
+def test_commit_moves_a_finished_file_out(tmp_path):
+    workspace = Workspace(str(tmp_path / 'tmp'))
+    destination = str(tmp_path / 'result.wav')
+    with workspace.acquire('job') as job:
+        with open(job.file('audio.wav'), 'wb') as file:
+            file.write(b'data')
+        assert job.commit('audio.wav', destination) == destination
+    with open(destination, 'rb') as file:
+        assert file.read() == b'data'
+    workspace.close()
+
+
+def test_directories_of_exited_instances_are_removed(tmp_path, monkeypatch):
+    stale = tmp_path / '999999-abc'
+    stale.mkdir()
+    unrelated = tmp_path / 'notes'
+    unrelated.mkdir()
+    monkeypatch.setattr('workspace.pid_alive', lambda pid: pid != 999999)
+    workspace = Workspace(str(tmp_path))
+    assert not stale.exists()
+    assert unrelated.exists()
+    workspace.close()
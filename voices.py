@@ -0,0 +1,182 @@
+import hashlib
+import json
+import os
+import sys
+
+from synthesis import SUPPORTED_LANGUAGES
+from workspace import scratch_path
+
+CATALOG_VERSION = 1
+
+# Where the system keeps installed voices; listing these is far cheaper than
+# starting a speech engine, so they decide whether a saved catalog is current
+SAPI_VOICE_KEYS = (
+    r'SOFTWARE\Microsoft\Speech\Voices\Tokens',
+    r'SOFTWARE\Microsoft\Speech_OneCore\Voices\Tokens',
+)
+VOICE_DIRS = (
+    '/usr/share/espeak-ng-data/voices',
+    '/usr/share/espeak-ng-data/lang',
+    '/usr/lib/x86_64-linux-gnu/espeak-ng-data/voices',
+    '/usr/lib/x86_64-linux-gnu/espeak-ng-data/lang',
+    '/usr/share/espeak-data/voices',
+    '/System/Library/Speech/Voices',
+    '/Library/Speech/Voices',
+    os.path.expanduser('~/Library/Speech/Voices'),
+)
+
+# Names of common voices that do not report a gender (SAPI5 among them)
+MALE_NAMES = {
+    'david', 'james', 'mark', 'george', 'richard', 'sean', 'ravi', 'pablo', 'raul', 'jorge',
+    'paul', 'claude', 'stefan', 'cosimo', 'daniel', 'pavel', 'ichiro', 'heami', 'kangkang',
+    'alex', 'fred', 'thomas', 'diego', 'luca', 'yuri', 'otoya', 'hattori',
+}
+FEMALE_NAMES = {
+    'zira', 'heather', 'susan', 'hazel', 'linda', 'catherine', 'helena', 'laura', 'sabina',
+    'hortense', 'julie', 'hedda', 'katja', 'elsa', 'maria', 'irina', 'ayumi', 'haruka',
+    'sayaka', 'huihui', 'yaoyao', 'samantha', 'victoria', 'karen', 'moira', 'tessa',
+    'monica', 'paulina', 'amelie', 'anna', 'alice', 'joana', 'milena', 'kyoko', 'yuna',
+    'tingting', 'sinji',
+}
+
+# Language names as they appear in voice descriptions, e.g. SAPI5's
+# "Microsoft Zira Desktop - English (United States)"
+LANGUAGE_NAMES = {name.split(' (')[0].lower(): code for name, code in SUPPORTED_LANGUAGES.items()}
+
+
+def installed_voices_fingerprint():
+    """Hash of the installed voice set, or None where it cannot be told cheaply"""
+    entries = []
+    if sys.platform == 'win32':
+        import winreg
+        for path in SAPI_VOICE_KEYS:
+            try:
+                key = winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, path)
+            except OSError:
+                continue
+            with key:
+                entries += [f"{path}\\{winreg.EnumKey(key, index)}" for index in range(winreg.QueryInfoKey(key)[0])]
+    else:
+        for directory in VOICE_DIRS:
+            for root, dirs, files in os.walk(directory):
+                dirs.sort()
+                entries += [os.path.join(root, name) for name in sorted(files)]
+    if not entries:
+        return None
+    return hashlib.sha256('\n'.join(entries).encode('utf-8')).hexdigest()
+
+
+def normalize_language(language):
+    """'en_US', b'\\x05en-us' or 'en' -> 'en-us'; None when unusable"""
+    if isinstance(language, bytes):
+        # eSpeak prefixes the code with a priority byte
+        language = language[1:].decode('ascii', 'ignore')
+    language = (language or '').strip().replace('_', '-').lower()
+    return language or None
+
+
+def primary_language(lang_code):
+    return lang_code.split('-')[0].lower()
+
+
+def voice_gender(voice):
+    """'male', 'female' or None from the reported gender, else the name"""
+    gender = str(getattr(voice, 'gender', None) or '').lower()
+    if 'female' in gender:
+        return 'female'
+    if 'male' in gender:
+        return 'male'
+    words = set((voice.name or '').lower().replace('-', ' ').split())
+    if words & MALE_NAMES:
+        return 'male'
+    if words & FEMALE_NAMES:
+        return 'female'
+    return None
+
+
+def voice_languages(voice):
+    languages = [code for code in map(normalize_language, getattr(voice, 'languages', None) or []) if code]
+    if not languages:
+        # SAPI5 voices only name their language in the description
+        description = (voice.name or '').lower()
+        languages = [code.lower() for name, code in LANGUAGE_NAMES.items() if name in description]
+    return languages
+
+
+def describe_voice(voice, backend='pyttsx3'):
+    """Catalog entry for a pyttsx3 Voice"""
+    age = getattr(voice, 'age', None)
+    return {
+        'id': voice.id,
+        'name': voice.name,
+        'languages': voice_languages(voice),
+        'gender': voice_gender(voice),
+        'age': age if isinstance(age, int) else None,
+        'backend': backend,
+    }
+
+
+class VoiceCatalog:
+    """Installed system voices indexed by (language, gender).
+
+    Saved to disk with the fingerprint of the installed voice set, so later
+    launches read the file instead of starting the engine to enumerate
+    voices, until voices are installed or removed.
+    """
+
+    def __init__(self, voices=(), fingerprint=None):
+        self.voices = list(voices)
+        self.fingerprint = fingerprint
+        # primary language ('' when unknown) -> gender (None for any) -> entries
+        self._index = {}
+        for entry in self.voices:
+            for language in {primary_language(code) for code in entry['languages']} or {''}:
+                by_gender = self._index.setdefault(language, {})
+                by_gender.setdefault(None, []).append(entry)
+                if entry['gender']:
+                    by_gender.setdefault(entry['gender'], []).append(entry)
+
+    @classmethod
+    def from_engine_voices(cls, voices, fingerprint=None, backend='pyttsx3'):
+        return cls([describe_voice(voice, backend) for voice in voices], fingerprint)
+
+    @classmethod
+    def load(cls, path, fingerprint):
+        """The saved catalog, or None when missing or the voices changed since"""
+        if fingerprint is None:
+            return None
+        try:
+            with open(path, encoding='utf-8') as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if data.get('version') != CATALOG_VERSION or data.get('fingerprint') != fingerprint:
+            return None
+        return cls(data['voices'], fingerprint)
+
+    def save(self, path):
+        tmp_path = scratch_path(path)
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump({'version': CATALOG_VERSION, 'fingerprint': self.fingerprint, 'voices': self.voices}, file)
+        os.replace(tmp_path, path)
+
+    def find(self, lang_code, gender=None):
+        """Best voice entry for a language and gender, or None.
+
+        Falls back to any gender, then to voices that do not report a
+        language. A voice tagged with the exact regional code wins.
+        """
+        for language in (primary_language(lang_code), ''):
+            by_gender = self._index.get(language)
+            if not by_gender:
+                continue
+            candidates = by_gender.get(gender) or by_gender[None]
+            for entry in candidates:
+                if lang_code.lower() in entry['languages']:
+                    return entry
+            return candidates[0]
+        return None
+
+    def languages(self, lang_codes):
+        """Those of lang_codes that some voice speaks"""
+        return [code for code in lang_codes if primary_language(code) in self._index]
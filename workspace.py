@@ -0,0 +1,130 @@
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+
+# Instance directories are named <pid>-<random>
+INSTANCE_DIR = re.compile(r'^(\d+)-')
+
+
+def pid_alive(pid):
+    """Whether a process with this id is running"""
+    if pid == os.getpid():
+        return True
+    if sys.platform == 'win32':
+        import ctypes
+
+        # os.kill(pid, 0) would terminate the process on Windows
+        PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+        STILL_ACTIVE = 259
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            return False
+        try:
+            code = ctypes.c_ulong()
+            return bool(kernel32.GetExitCodeProcess(handle, ctypes.byref(code))) and code.value == STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+
+def scratch_path(path):
+    """Temporary name next to path, unique to this process and thread.
+
+    Write there and os.replace() onto path, so readers never see a partial
+    file and writers in other threads or app instances never collide.
+    """
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+class JobWorkspace:
+    """Scratch directory of one job, removed when its last user releases it"""
+
+    def __init__(self, workspace, name, path):
+        self.workspace = workspace
+        self.name = name
+        self.path = path
+
+    def file(self, name):
+        return os.path.join(self.path, name)
+
+    def commit(self, name, destination):
+        """Atomically move a finished file out of the workspace"""
+        os.replace(self.file(name), destination)
+        return destination
+
+    def release(self):
+        self.workspace.release(self.name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class Workspace:
+    """Private scratch space of one app instance under a shared root.
+
+    Each instance works in its own <root>/<pid>-<random> directory and each
+    job in a subdirectory of that, so parallel jobs and app instances never
+    write to the same path. Job directories are reference counted: acquire()
+    the same name again to keep it alive (e.g. while a file in it is being
+    played) and it is removed when the count drops to zero. close() removes
+    only this instance's directory; directories left by instances that are
+    no longer running are removed by the next one to start.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.remove_stale()
+        self.path = tempfile.mkdtemp(prefix=f'{os.getpid()}-', dir=root)
+        self._refs = {}
+        self._lock = threading.Lock()
+
+    def remove_stale(self):
+        for name in os.listdir(self.root):
+            match = INSTANCE_DIR.match(name)
+            path = os.path.join(self.root, name)
+            if match and os.path.isdir(path) and not pid_alive(int(match.group(1))):
+                shutil.rmtree(path, ignore_errors=True)
+
+    def acquire(self, name):
+        """Return the JobWorkspace for name, creating it on first use"""
+        path = os.path.join(self.path, name)
+        with self._lock:
+            if name not in self._refs:
+                os.makedirs(path, exist_ok=True)
+            self._refs[name] = self._refs.get(name, 0) + 1
+        return JobWorkspace(self, name, path)
+
+    def release(self, name):
+        with self._lock:
+            count = self._refs.get(name, 0) - 1
+            if count > 0:
+                self._refs[name] = count
+                return
+            self._refs.pop(name, None)
+            # Under the lock, so a concurrent acquire() cannot lose its directory
+            shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+
+    def active(self):
+        with self._lock:
+            return dict(self._refs)
+
+    def close(self):
+        with self._lock:
+            self._refs.clear()
+        shutil.rmtree(self.path, ignore_errors=True)